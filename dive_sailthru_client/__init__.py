@@ -1,2 +1,50 @@
 from __future__ import absolute_import, unicode_literals
-# from dive_sailthru_client.client import DiveSailthruClient
+import importlib
+import sys
+
+# Modules with no third party dependencies are imported right away. Names from modules
+# that need sailthru-client, requests and simplejson (or email, sqlite3, multiprocessing) are
+# resolved lazily (PEP 562), so that importing the package, or just the classifier, does
+# not pull in the HTTP stack: only touching e.g. dive_sailthru_client.DiveSailthruClient
+# does. Python < 3.7 has no module __getattr__; there, import those names from their
+# modules (from dive_sailthru_client.client import DiveSailthruClient).
+from .classification import DiveEmailTypes, RuleClassifier  # noqa: F401
+from .classification import infer_dive_email_type, infer_dive_publication, infer_list_publication  # noqa: F401
+from .clickmap import ClickmapAggregator  # noqa: F401
+from .filters import CampaignFilter  # noqa: F401
+from .lists import ListCatalog  # noqa: F401
+from .profiling import RequestProfiler  # noqa: F401
+from .timeseries import ClickTimeSeries, StatsTable  # noqa: F401
+from .workers import ClientFactory  # noqa: F401
+
+_LAZY_ATTRIBUTES = {
+    'AccountPool': 'accounts',
+    'CampaignIndex': 'campaign_index',
+    'DiveSailthruClient': 'client',
+    'reclassify_archives': 'reclassify',
+    'SailthruApiError': 'errors',
+    'SailthruUserEmailError': 'errors',
+    'SuppressionCache': 'bulk',
+    'StatsHistory': 'history',
+}
+
+# str() for Python 2, where unicode names in __all__ break "import *"
+__all__ = sorted(str(name) for name in [
+    'CampaignFilter', 'ClickmapAggregator', 'ClickTimeSeries', 'ClientFactory', 'DiveEmailTypes',
+    'infer_dive_email_type', 'infer_dive_publication', 'infer_list_publication', 'ListCatalog', 'RequestProfiler',
+    'RuleClassifier', 'StatsTable',
+] + (list(_LAZY_ATTRIBUTES) if sys.version_info >= (3, 7) else []))
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = getattr(importlib.import_module('.' + module_name, __name__), name)
+    # cache on the package so later lookups skip __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
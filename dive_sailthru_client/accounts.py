@@ -0,0 +1,237 @@
+from __future__ import absolute_import
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.utils import mktime_tz, parsedate_tz
+import collections
+import heapq
+import math
+import threading
+import time
+from .client import DiveSailthruClient
+from .filters import CampaignFilter
+from .transport import HttpTransport
+from .workers import register_after_fork
+
+
+class RateLimiter(object):
+    """
+    Thread-safe request rate limiter for one account.
+
+    Spaces requests at most rate per second, allowing bursts of up to burst requests after
+    a quiet spell. It also honors Sailthru's own limits: when a response says no requests
+    are left (X-Rate-Limit-Remaining: 0), further requests to that endpoint wait until the
+    reset time the response gave.
+    """
+
+    def __init__(self, rate=None, burst=1):
+        """
+        :param rate: requests per second, or None for no limit of our own
+        :param burst: how many requests may go out back to back
+        """
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._next_slot = 0.0  # time.monotonic() when the next request may go, ignoring bursts
+        self._paused_until = {}  # (method, url) -> time.monotonic()
+
+    def acquire(self, method, url):
+        """ Block until a request to url may be sent """
+        with self._lock:
+            now = time.monotonic()
+            wait = self._paused_until.get((method, url), now) - now
+            if self.rate:
+                interval = 1.0 / self.rate
+                self._next_slot = max(self._next_slot, now - (self.burst - 1) * interval)
+                wait = max(wait, self._next_slot - now)
+                self._next_slot += interval
+        if wait > 0:
+            time.sleep(wait)
+
+    def update(self, method, url, rate_limit_headers):
+        """
+        :param rate_limit_headers: SailthruResponse.get_rate_limit_headers() of a response
+        """
+        if rate_limit_headers and rate_limit_headers['remaining'] <= 0:
+            # reset is epoch seconds, on the server's clock
+            paused_until = time.monotonic() + max(0, rate_limit_headers['reset'] - time.time())
+            with self._lock:
+                self._paused_until[(method, url)] = paused_until
+
+
+class RateLimitedTransport(object):
+    """
+    Wraps a (usually shared) transport so requests through it go out no faster than its
+    RateLimiter allows.
+    """
+
+    def __init__(self, transport, limiter):
+        self.transport = transport
+        self.limiter = limiter
+
+    def request(self, url, data, method, file_data=None, headers=None, request_timeout=10):
+        method = method.upper()
+        self.limiter.acquire(method, url)
+        response = self.transport.request(url, data, method, file_data, headers, request_timeout)
+        self.limiter.update(method, url, response.get_rate_limit_headers())
+        return response
+
+
+def _run_lane(queue):
+    """ Run queued (future, func, args) calls one after another until the queue is empty """
+    while True:
+        try:
+            future, func, args = queue.popleft()
+        except IndexError:
+            return
+        if not future.set_running_or_notify_cancel():
+            continue
+        try:
+            result = func(*args)
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+
+def _campaign_send_time(campaign):
+    send_time = parsedate_tz(campaign.get('start_time') or campaign.get('schedule_time') or '')
+    return mktime_tz(send_time) if send_time else 0
+
+
+class AccountPool(object):
+    """
+    DiveSailthruClients for several Sailthru accounts (e.g. one per business unit) that
+    share one connection pool and one pool of worker threads, with a rate limit per account.
+
+    Rate limited requests wait in the worker thread that makes them, so each account only
+    gets a share of the workers (max_in_flight). A tightly limited account then can't tie up
+    every thread while the others' requests queue behind it.
+
+        pool = AccountPool({
+            'dive': {'api_key': DIVE_KEY, 'secret': DIVE_SECRET},
+            'events': {'api_key': EVENTS_KEY, 'secret': EVENTS_SECRET, 'rate_limit': 2},
+        }, rate_limit=5)
+        campaigns = pool.get_campaigns_in_range(start_date, end_date)  # every account, tagged
+        stats = pool.map(lambda account, client: client.get_campaign_stats(blast_ids[account]))
+        pool.client('dive').get_primary_lists()
+    """
+
+    def __init__(self, accounts, rate_limit=None, burst=1, max_workers=8, transport=None, max_in_flight=None,
+                 **client_kwargs):
+        """
+        :param dict accounts: account name -> {'api_key': ..., 'secret': ...}, optionally with
+            its own 'rate_limit' and 'burst'
+        :param rate_limit: default requests per second per account (None for no limit)
+        :param burst: default burst size per account, see RateLimiter
+        :param max_workers: worker threads shared by all accounts
+        :param transport: transport shared by all accounts. Defaults to a new HttpTransport
+            with a connection for every worker.
+        :param max_in_flight: how many of one account's requests may run at once, defaults to
+            an equal share of max_workers among the accounts in a call
+        :param client_kwargs: passed on to every DiveSailthruClient (request_timeout, classifier, ...)
+        """
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight
+        self.transport = transport if transport is not None else HttpTransport(pool_maxsize=max_workers)
+        self.clients = {}
+        for account, settings in accounts.items():
+            limiter = RateLimiter(settings.get('rate_limit', rate_limit), settings.get('burst', burst))
+            self.clients[account] = DiveSailthruClient(
+                settings['api_key'], settings['secret'],
+                transport=RateLimitedTransport(self.transport, limiter), **client_kwargs)
+        self._executor = None
+        self._lock = threading.Lock()
+        register_after_fork(self)
+
+    def _after_fork(self):
+        # the parent's worker threads don't exist in the child
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def accounts(self):
+        return sorted(self.clients)
+
+    def client(self, account):
+        """ :rtype: DiveSailthruClient """
+        return self.clients[account]
+
+    def map(self, func, accounts=None):
+        """
+        Call func(account, client) for each account in parallel.
+
+        :param accounts: account names, defaults to all
+        :return: account name -> func's return value. If any call raised, the first
+            exception (in account order) is raised once all calls have finished.
+        :rtype: dict
+        """
+        accounts = self.accounts() if accounts is None else accounts
+        futures = [(account, self.executor.submit(func, account, self.clients[account])) for account in accounts]
+        return dict((account, future.result()) for account, future in futures)
+
+    def _submit_per_account(self, calls_by_account):
+        """
+        Run each account's calls with at most max_in_flight of them at a time, starting the
+        accounts' first calls round robin so that none waits for another's backlog.
+
+        :param calls_by_account: list of (account, list of (func, args))
+        :return: one list of Futures per account, in the order of the calls
+        """
+        max_in_flight = self.max_in_flight or int(math.ceil(float(self.max_workers) / max(len(calls_by_account), 1)))
+        queues = []
+        futures = []
+        for account, calls in calls_by_account:
+            queue = collections.deque((Future(), func, args) for func, args in calls)
+            futures.append([future for future, _, _ in queue])
+            queues.append(queue)
+        for lane in range(max_in_flight):
+            for queue in queues:
+                if lane < len(queue):
+                    self.executor.submit(_run_lane, queue)
+        return futures
+
+    def get_campaigns_in_range(self, start_date, end_date, list_name=None, accounts=None, **filters):
+        """
+        DiveSailthruClient.get_campaigns_in_range for several accounts at once. Every
+        account's date windows are fetched in parallel, and the results are merged in send
+        time order with each campaign tagged with its account name under key 'account'.
+
+        :param accounts: account names, defaults to all
+        :param filters: email_types, publications, min_sent_count and fields, as for
+            DiveSailthruClient.get_campaigns_in_range. Keep the send time fields if you pick
+            fields and want the merged order.
+        :rtype: list[dict]
+        """
+        accounts = self.accounts() if accounts is None else accounts
+        campaign_filter = CampaignFilter(**filters)
+        futures = self._submit_per_account([
+            (account, [(self.clients[account]._get_campaigns_page, (page_start, page_end, list_name, campaign_filter))
+                       for page_start, page_end in self.clients[account]._iter_date_windows(start_date, end_date)])
+            for account in accounts])
+        campaigns_by_account = []
+        for account, account_futures in zip(accounts, futures):
+            campaigns = []
+            for future in account_futures:
+                for c in future.result():
+                    c['account'] = account
+                    campaigns.append(c)
+            campaigns_by_account.append(campaigns)
+        return list(heapq.merge(*campaigns_by_account, key=_campaign_send_time))
+
+    def close(self):
+        """ Stop the worker threads """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,147 @@
+from __future__ import absolute_import
+from collections import namedtuple
+import json
+import os
+import threading
+from sailthru.sailthru_error import SailthruClientError
+from .errors import SailthruApiError, SailthruSuppressedUserError, SailthruUserEmailError
+
+# UserResult.status values
+OK = 'ok'
+RETRYABLE = 'retryable'  # connection errors, timeouts, rate limiting, Sailthru internal errors
+USER_EMAIL = 'user_email'  # permanent: the address is invalid, opted out, a hardbounce, ...
+SUPPRESSED = 'suppressed'  # skipped without calling the API, see SuppressionCache
+API_ERROR = 'api_error'  # anything else, e.g. bad parameters; sending again won't help
+
+
+def error_status(error):
+    """
+    :param error: exception raised by an API call, or None
+    :return: the UserResult status for it
+    :rtype: string
+    """
+    if error is None:
+        return OK
+    if isinstance(error, SailthruSuppressedUserError):
+        return SUPPRESSED
+    if isinstance(error, SailthruUserEmailError):
+        return USER_EMAIL
+    if isinstance(error, SailthruApiError):
+        return RETRYABLE if error.retryable else API_ERROR
+    if isinstance(error, SailthruClientError):
+        # raised by the transport: the request never got a response
+        return RETRYABLE
+    return API_ERROR
+
+
+# Transport error messages that mean the connection was never made, so the request can't
+# have reached Sailthru (the same test as DiveSailthruClient.api_get's retries)
+_NOT_CONNECTED_ERRORS = ('ConnectTimeoutError', 'NewConnectionError', 'NameResolutionError')
+
+
+def request_not_received(error):
+    """
+    Whether error proves the request never took effect at Sailthru: the connection could not
+    be made, or Sailthru turned it away for the rate limit. Only then is it safe to repeat a
+    request that isn't idempotent, like a 'send'. A read timeout or dropped connection may
+    come after Sailthru accepted the request, and so may an internal error.
+
+    :param error: exception raised by an API call, or None
+    :rtype: bool
+    """
+    if isinstance(error, SailthruUserEmailError):
+        return False
+    if isinstance(error, SailthruApiError):
+        return error.code == 43
+    if isinstance(error, SailthruClientError):
+        return any(name in str(error) for name in _NOT_CONNECTED_ERRORS)
+    return False
+
+
+class UserResult(namedtuple('UserResult', ['user_id', 'data', 'error'])):
+    """
+    One entry per user in the results of the bulk user helpers on DiveSailthruClient.
+      user_id: the id as passed in
+      data: the API response json (for the job path, the job result) or None on error
+      error: the SailthruClientError (e.g. SailthruUserEmailError) raised for this user, or None
+    """
+    __slots__ = ()
+
+    @property
+    def status(self):
+        """ One of OK, RETRYABLE, USER_EMAIL, SUPPRESSED or API_ERROR """
+        return error_status(self.error)
+
+
+def partition_results(results):
+    """
+    Group UserResults by status.
+
+    :return: status -> list of UserResult, with every status present
+    :rtype: dict
+    """
+    partitions = dict((status, []) for status in (OK, RETRYABLE, USER_EMAIL, SUPPRESSED, API_ERROR))
+    for result in results:
+        partitions[result.status].append(result)
+    return partitions
+
+
+class SuppressionCache(object):
+    """
+    Addresses known to be permanently undeliverable (the USER_EMAIL_ERROR_CODES errors), so
+    the bulk helpers can skip them instead of spending API calls on them.
+
+        suppressions = SuppressionCache('suppressed.jsonl')
+        results = sailthru_client.send_many('welcome', emails, suppressions=suppressions)
+
+    The bulk helpers add every address that fails with a SailthruUserEmailError. With a path,
+    the cache is loaded from and appended to that JSON lines file, so it carries over between
+    runs. Ids are compared case-insensitively. Safe to share between threads.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._codes = {}
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._codes[self._normalize(entry['user_id'])] = entry['code']
+
+    @staticmethod
+    def _normalize(user_id):
+        return user_id.strip().lower() if hasattr(user_id, 'lower') else user_id
+
+    def __contains__(self, user_id):
+        return self._normalize(user_id) in self._codes
+
+    def __len__(self):
+        return len(self._codes)
+
+    def code(self, user_id):
+        """ :return: the error code the user was suppressed for, or None """
+        return self._codes.get(self._normalize(user_id))
+
+    def add(self, user_id, code):
+        normalized = self._normalize(user_id)
+        with self._lock:
+            if normalized in self._codes:
+                return
+            self._codes[normalized] = code
+            if self.path is not None:
+                with open(self.path, 'a') as f:
+                    f.write('%s\n' % json.dumps({'user_id': user_id, 'code': code}))
+
+
+def chunks(items, size):
+    """ Yield successive lists of at most size items from the iterable items """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,171 @@
+from __future__ import absolute_import
+from email.utils import parsedate_tz
+import datetime
+
+
+# Names of the pre-aggregated counters, in the order they are stored.
+#   campaigns: number of campaigns
+#   count, open_total, click_total, optout: summed from the campaign's stats['total']
+#   bounces: hardbounce + softbounce from the campaign's stats['total']
+COUNTER_NAMES = ('campaigns', 'count', 'open_total', 'click_total', 'optout', 'bounces')
+
+
+def campaign_send_day(campaign):
+    """
+    The day a campaign was sent, in the timezone Sailthru reported it in.
+
+    :param dict campaign: campaign dict as returned by get_campaigns_in_range
+    :return: the day of start_time (or schedule_time if it never started), or None if neither is set
+    :rtype: datetime.date|None
+    """
+    send_time = campaign.get('start_time') or campaign.get('schedule_time')
+    if not send_time:
+        return None
+    parsed = parsedate_tz(send_time)  # e.g. 'Thu, 06 Aug 2015 15:28:17 -0400'
+    if parsed is None:
+        return None
+    return datetime.date(parsed[0], parsed[1], parsed[2])
+
+
+def campaign_counters(campaign):
+    """
+    :return: the values of COUNTER_NAMES for a single campaign
+    :rtype: tuple[int]
+    """
+    total = (campaign.get('stats') or {}).get('total') or {}
+    return (
+        1,
+        total.get('count', 0),
+        total.get('open_total', 0),
+        total.get('click_total', 0),
+        total.get('optout', 0),
+        total.get('hardbounce', 0) + total.get('softbounce', 0),
+    )
+
+
+class CampaignIndex(object):
+    """
+    In-memory index of campaigns keyed by publication (dive_brand), dive_email_type and
+    send day, holding pre-aggregated counters (see COUNTER_NAMES) for each key.
+
+    Campaigns can be added as pages of results arrive, and queries only touch the
+    aggregated buckets, never the campaigns themselves:
+
+        index = CampaignIndex()
+        index.add_many(sailthru_client.iter_campaigns_in_range(start_date, end_date))
+        index.totals(publication='Utility Dive', email_type=DiveEmailTypes.Blast,
+                     start_date=datetime.date.today() - datetime.timedelta(days=90))
+
+    Adding a campaign whose blast_id is already indexed replaces its previous counters,
+    so re-fetching a range with fresher stats does not double count.
+    """
+
+    def __init__(self):
+        # (publication, email_type) -> {day: [counters in COUNTER_NAMES order]}
+        self._buckets = {}
+        # blast_id -> (publication, email_type, day, counters) of what we added for it
+        self._contributions = {}
+
+    def __len__(self):
+        return len(self._contributions)
+
+    def __contains__(self, blast_id):
+        return blast_id in self._contributions
+
+    def add(self, campaign):
+        """
+        Add (or replace) one campaign. The campaign must already be annotated with
+        dive_email_type and dive_brand, as get_campaigns_in_range does.
+        """
+        blast_id = campaign.get('blast_id')
+        if blast_id in self._contributions:
+            self._apply(self._contributions.pop(blast_id), -1)
+        contribution = (
+            campaign.get('dive_brand'),
+            campaign.get('dive_email_type'),
+            campaign_send_day(campaign),
+            campaign_counters(campaign),
+        )
+        self._apply(contribution, 1)
+        if blast_id is not None:
+            self._contributions[blast_id] = contribution
+
+    def add_many(self, campaigns):
+        """
+        Add campaigns from any iterable (e.g. iter_campaigns_in_range) as they are produced.
+
+        :return: number of campaigns added
+        :rtype: int
+        """
+        added = 0
+        for campaign in campaigns:
+            self.add(campaign)
+            added += 1
+        return added
+
+    def _apply(self, contribution, sign):
+        publication, email_type, day, counters = contribution
+        days = self._buckets.setdefault((publication, email_type), {})
+        bucket = days.get(day)
+        if bucket is None:
+            bucket = days[day] = [0] * len(COUNTER_NAMES)
+        for i, value in enumerate(counters):
+            bucket[i] += sign * value
+        if sign < 0 and bucket[0] == 0:
+            del days[day]
+            if not days:
+                del self._buckets[(publication, email_type)]
+
+    def _matching_days(self, publication, email_type, start_date, end_date):
+        """ Yield (day, counters) for every bucket matching the filters (None matches everything) """
+        for (bucket_publication, bucket_email_type), days in self._buckets.items():
+            if publication is not None and bucket_publication != publication:
+                continue
+            if email_type is not None and bucket_email_type != email_type:
+                continue
+            for day, counters in days.items():
+                if start_date is not None and (day is None or day < start_date):
+                    continue
+                if end_date is not None and (day is None or day >= end_date):
+                    continue
+                yield day, counters
+
+    def totals(self, publication=None, email_type=None, start_date=None, end_date=None):
+        """
+        Sum the counters of all campaigns matching the given filters.
+
+        :param publication: only campaigns with this dive_brand
+        :param email_type: only campaigns with this dive_email_type (one of DiveEmailTypes)
+        :param datetime.date start_date: only campaigns sent on or after this day
+        :param datetime.date end_date: only campaigns sent before this day
+        :return: dict of counter name to total, e.g. {'campaigns': 12, 'count': 250000, ...}
+        :rtype: dict
+        """
+        totals = [0] * len(COUNTER_NAMES)
+        for _, counters in self._matching_days(publication, email_type, start_date, end_date):
+            for i, value in enumerate(counters):
+                totals[i] += value
+        return dict(zip(COUNTER_NAMES, totals))
+
+    def totals_by_day(self, publication=None, email_type=None, start_date=None, end_date=None):
+        """
+        Like totals() but broken down by send day.
+
+        :return: dict of datetime.date to a dict of counter name to total
+        :rtype: dict
+        """
+        by_day = {}
+        for day, counters in self._matching_days(publication, email_type, start_date, end_date):
+            day_totals = by_day.setdefault(day, [0] * len(COUNTER_NAMES))
+            for i, value in enumerate(counters):
+                day_totals[i] += value
+        return dict((day, dict(zip(COUNTER_NAMES, day_totals))) for day, day_totals in by_day.items())
+
+    def publications(self):
+        """ :return: all publications with indexed campaigns (including None for unknown ones) """
+        return set(publication for publication, _ in self._buckets)
+
+    def email_types(self, publication=None):
+        """ :return: all email types with indexed campaigns, optionally for one publication """
+        return set(email_type for bucket_publication, email_type in self._buckets
+                   if publication is None or bucket_publication == publication)
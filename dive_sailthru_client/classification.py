@@ -0,0 +1,402 @@
+from __future__ import absolute_import
+# NOTE: this module must stay free of sailthru/requests imports so that code that only
+# needs DiveEmailTypes or the classifier (serverless handlers, CLI tools) can import it
+# without paying for the HTTP stack.
+import itertools
+import json
+import re
+
+
+class DiveEmailTypes:
+    """
+    Provides standard email types we use.
+    """
+    Blast = "blast"
+    TwoThirdBlast = "twothirdblast"
+    HalfBlast = "halfblast"
+    ThirdBlast = "thirdblast"
+    QuarterBlast = "quarterblast"
+    WelcomeSeries = "welcome"
+    Newsletter = "newsletter"
+    Weekender = "weekender"
+    Unknown = "unknown"
+    BreakingNews = "breaking"
+    Spotlight = "spotlight"
+    Audience = "audience"  # e.g. Dive-iversary, "Update your profile"
+
+
+# Any campaign sent to a blast list, or labelled or named as a blast. Shared by the blast rules.
+_BLAST = {'any': [
+    {'labels': {'has': 'Blast'}},
+    {'name': {'contains': '-blast-'}},
+    {'name': {'contains': 'blast='}},
+    {'list': {'icontains': 'blast list'}},
+]}
+
+# The rules we use to classify campaigns. Can be replaced with a JSON file of the same shape,
+# see RuleClassifier.
+#
+# 'email_types' rules are tried in order and the first whose 'when' condition matches gives the
+# campaign's dive_email_type (WARNING! Order matters), or 'default_email_type' if none match.
+# 'publications' rules are tried in order too: the first one listing the campaign's email type
+# whose (optional) 'when' matches gives the publication, which is the list name with the (optional)
+# 'strip' regex removed. If none match the publication is None.
+#
+# Conditions are {'any': [conditions]}, {'all': [conditions]}, {'not': condition} or a test of one
+# campaign field: {field: {op: value}}. Fields are 'name', 'list', 'subject' and 'labels'. Ops are
+# 'contains', 'startswith', 'endswith' and 'equals', their case insensitive versions 'icontains',
+# 'istartswith', 'iendswith' and 'iequals' (which compare the lower-cased field and value), and
+# 'has' for labels.
+DEFAULT_RULES = {
+    'email_types': [
+        # Note that spotlight's name also starts with "Issue: " and it's sent to the blast
+        # list so it must appear near the top
+        {'type': DiveEmailTypes.Spotlight, 'when': {'labels': {'has': 'spotlight-newsletter'}}},
+        {'type': DiveEmailTypes.WelcomeSeries, 'when': {'any': [
+            {'labels': {'has': 'Welcome Series'}},
+            {'all': [{'list': {'contains': 'Welcome'}}, {'name': {'icontains': ' days '}}]},
+        ]}},
+        {'type': DiveEmailTypes.Audience, 'when': {'any': [
+            {'subject': {'contains': 'Dive-iversary'}},
+            {'list': {'contains': 'Dive-iversary'}},
+            {'list': {'icontains': 'update profile'}},
+            {'all': [{'list': {'icontains': 'linkedin'}}, {'name': {'icontains': 'linkedin'}}]},
+            {'list': {'icontains': 'sepa upload'}},
+            {'list': {'icontains': 'simple k12'}},
+            {'list': {'icontains': 'esna list'}},
+        ]}},
+        {'type': DiveEmailTypes.BreakingNews, 'when': {'any': [
+            {'subject': {'startswith': 'BREAKING'}},
+            {'labels': {'has': 'Breaking'}},
+        ]}},
+        {'type': DiveEmailTypes.Weekender, 'when': {'any': [
+            {'all': [{'list': {'endswith': 'Weekender'}}, {'not': {'list': {'contains': '+'}}}]},
+            {'name': {'startswith': 'Newsletter Weekly Roundup'}},
+        ]}},
+        {'type': DiveEmailTypes.Newsletter, 'when': {'all': [
+            {'list': {'equals': 'Supply Chain Dive: Operations'}},
+            {'any': [{'name': {'contains': 'Issue'}}, {'name': {'contains': 'SCD: Ops v2'}}]},
+        ]}},
+        {'type': DiveEmailTypes.QuarterBlast, 'when': {'all': [_BLAST, {'any': [
+            {'name': {'contains': 'QuarterBlast'}},
+            {'list': {'contains': 'Quarters Blast List'}},
+            {'list': {'contains': 'Quarter Blast List'}},
+        ]}]}},
+        # Must go before standard third blast
+        {'type': DiveEmailTypes.TwoThirdBlast, 'when': {'all': [_BLAST, {'any': [
+            {'name': {'contains': 'twothirdblast'}},
+            {'list': {'icontains': 'two thirds blast list'}},
+            {'list': {'icontains': 'two third blast list'}},
+        ]}]}},
+        {'type': DiveEmailTypes.ThirdBlast, 'when': {'all': [_BLAST, {'any': [
+            {'name': {'contains': 'ThirdBlast'}},
+            {'list': {'contains': 'Thirds Blast List'}},
+            {'list': {'contains': 'Third Blast List'}},
+        ]}]}},
+        # Put this after the other split blasts to catch any legacy split blast lists that may
+        # not have "Half" in name
+        {'type': DiveEmailTypes.HalfBlast, 'when': {'all': [_BLAST, {'any': [
+            {'name': {'contains': 'HalfBlast'}},
+            {'list': {'contains': 'Half Blast List'}},
+            {'list': {'endswith': ' - Group A'}},
+            {'list': {'endswith': ' - Group B'}},
+        ]}]}},
+        {'type': DiveEmailTypes.Blast, 'when': _BLAST},
+        {'type': DiveEmailTypes.Newsletter, 'when': {'any': [
+            {'labels': {'has': 'newsletter'}},
+            {'name': {'startswith': 'Issue: '}},
+        ]}},
+    ],
+    'default_email_type': DiveEmailTypes.Unknown,
+    'publications': [
+        # The Utility Dive Spotlight goes out to a special
+        # blast list: "Utility Dive and sub pubs Blast List"
+        # This regex handles that as well as normal blast lists
+        {'types': [DiveEmailTypes.Blast, DiveEmailTypes.HalfBlast, DiveEmailTypes.Spotlight],
+         'when': {'list': {'iendswith': 'blast list'}},
+         'strip': r'( and sub pubs)? [Bb]last [Ll]ist$'},
+        {'types': [DiveEmailTypes.HalfBlast, DiveEmailTypes.QuarterBlast, DiveEmailTypes.ThirdBlast,
+                   DiveEmailTypes.TwoThirdBlast],
+         'when': {'list': {'contains': 'Group'}},
+         'strip': r'(?i)( (Half|(TWO )?Thirds?|Quarters?))? Blast List - Group [A-D]$'},
+        {'types': [DiveEmailTypes.Weekender],
+         'when': {'list': {'iendswith': 'weekender'}},
+         'strip': r' [Ww]eekender$'},
+        {'types': [DiveEmailTypes.Newsletter]},
+    ],
+}
+
+_TEXT_FIELDS = ('name', 'list', 'subject')
+_TEXT_OPS = ('contains', 'startswith', 'endswith', 'equals')
+
+
+class RuleError(ValueError):
+    """ Raised for a malformed classification rule table """
+    pass
+
+
+def _to_dnf(condition, predicates, negate=False):
+    """
+    Turn a condition into disjunctive normal form: a list of (required, forbidden) pairs of
+    predicate bit masks, any of which must be satisfied. New predicates are numbered in the
+    predicates dict, which maps (field, lower, op, value) to their bit.
+    """
+    if not isinstance(condition, dict) or len(condition) != 1:
+        raise RuleError("A condition must be a dict with exactly one key, got %r" % (condition,))
+    (key, value), = condition.items()
+    if key == 'not':
+        return _to_dnf(value, predicates, not negate)
+    if key in ('any', 'all'):
+        sub_terms = [_to_dnf(sub_condition, predicates, negate) for sub_condition in value]
+        if (key == 'any') != negate:  # any, or not(all) by De Morgan
+            return [term for terms in sub_terms for term in terms]
+        terms = []
+        for combination in itertools.product(*sub_terms):
+            required = forbidden = 0
+            for term_required, term_forbidden in combination:
+                required |= term_required
+                forbidden |= term_forbidden
+            if not required & forbidden:  # drop contradictions
+                terms.append((required, forbidden))
+        return terms
+    predicate = _parse_predicate(key, value)
+    bit = predicates.setdefault(predicate, 1 << len(predicates))
+    return [(0, bit)] if negate else [(bit, 0)]
+
+
+def _parse_predicate(field, test):
+    if not isinstance(test, dict) or len(test) != 1:
+        raise RuleError("Field test for %r must be a dict like {'contains': 'x'}, got %r" % (field, test))
+    (op, value), = test.items()
+    if not value:
+        raise RuleError("Empty value in test %r for field %r" % (test, field))
+    if field == 'labels':
+        if op != 'has':
+            raise RuleError("labels only supports the 'has' test, got %r" % op)
+        return ('labels', False, 'has', value)
+    if field not in _TEXT_FIELDS:
+        raise RuleError("Unknown campaign field %r (expected one of %s or labels)" % (field, ', '.join(_TEXT_FIELDS)))
+    lower = op.startswith('i') and op[1:] in _TEXT_OPS
+    if lower:
+        op, value = op[1:], value.lower()
+    if op not in _TEXT_OPS:
+        raise RuleError("Unknown test %r for field %r" % (op, field))
+    return (field, lower, op, value)
+
+
+class _FieldMatcher(object):
+    """
+    Evaluates every predicate on one field (or its lower-cased version) at once. Each distinct
+    needle is looked for once, however many rules use it, and the tests that hold are returned
+    as predicate bits.
+    """
+
+    def __init__(self, tests):
+        """ :param tests: list of (op, needle, bit) """
+        contains_bits = {}
+        positional_tests = {}
+        for op, needle, bit in tests:
+            if op == 'contains':
+                contains_bits[needle] = contains_bits.get(needle, 0) | bit
+            else:
+                positional_tests.setdefault(needle, []).append((op, bit))
+        self.contains = sorted(contains_bits.items())
+        self.positional = sorted((needle, tuple(needle_tests)) for needle, needle_tests in positional_tests.items())
+
+    def bits(self, text):
+        bits = 0
+        for needle, needle_bits in self.contains:
+            if needle in text:
+                bits |= needle_bits
+        for needle, needle_tests in self.positional:
+            for op, bit in needle_tests:
+                if (op == 'startswith' and text.startswith(needle)) or \
+                        (op == 'endswith' and text.endswith(needle)) or \
+                        (op == 'equals' and text == needle):
+                    bits |= bit
+        return bits
+
+
+class RuleClassifier(object):
+    """
+    Classifies campaigns (dive_email_type and publication) with a rule table like DEFAULT_RULES.
+
+    The table is compiled once: every distinct test (field, op, value) becomes one bit and every
+    condition a list of (required bits, forbidden bits) terms. Classifying a campaign runs each
+    distinct test once, however many rules share it, then walks the terms in rule order with
+    integer masks, so the first matching rule wins as before.
+
+        classifier = RuleClassifier.from_file('rules.json')
+        sailthru_client = DiveSailthruClient(api_key, secret, classifier=classifier)
+    """
+
+    # List names repeat across campaigns, and so do combinations of predicate bits, so both
+    # lookups are memoized (up to this many entries each)
+    cache_size = 10000
+
+    def __init__(self, rules=None):
+        rules = DEFAULT_RULES if rules is None else rules
+        predicates = {}
+        try:
+            # Flattened to one (required, forbidden, email type) entry per DNF term, in rule
+            # order, so the first matching entry is the first matching rule.
+            self.email_type_terms = [
+                (required, forbidden, rule['type'])
+                for rule in rules['email_types'] for required, forbidden in _to_dnf(rule['when'], predicates)]
+            self.default_email_type = rules.get('default_email_type', DiveEmailTypes.Unknown)
+            self.publication_terms = [
+                (required, forbidden, frozenset(rule['types']), re.compile(rule['strip']) if rule.get('strip') else None)
+                for rule in rules.get('publications', [])
+                for required, forbidden in (_to_dnf(rule['when'], predicates) if 'when' in rule else [(0, 0)])]
+        except KeyError as e:
+            raise RuleError("Rule is missing required key %s" % e)
+
+        self.label_bits = {}
+        tests_by_field = {}
+        for (field, lower, op, value), bit in predicates.items():
+            if field == 'labels':
+                self.label_bits[value] = self.label_bits.get(value, 0) | bit
+            else:
+                tests_by_field.setdefault((field, lower), []).append((op, value, bit))
+        self.field_matchers = dict(
+            (field, [(lower, _FieldMatcher(tests_by_field[(field, lower)]))
+                     for lower in (False, True) if (field, lower) in tests_by_field])
+            for field in _TEXT_FIELDS)
+        self._list_bits_cache = {}
+        self._email_type_cache = {}
+
+    @classmethod
+    def from_file(cls, path):
+        """ Load a rule table from a JSON file with the same shape as DEFAULT_RULES """
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def _field_bits(self, field, text):
+        bits = 0
+        for lower, matcher in self.field_matchers[field]:
+            bits |= matcher.bits(text.lower() if lower else text)
+        return bits
+
+    def _bits(self, campaign):
+        list_name = campaign.get('list') or ''
+        bits = self._list_bits_cache.get(list_name)
+        if bits is None:
+            bits = self._field_bits('list', list_name)
+            if len(self._list_bits_cache) >= self.cache_size:
+                self._list_bits_cache = {}
+            self._list_bits_cache[list_name] = bits
+        bits |= self._field_bits('name', campaign.get('name') or '')
+        if self.field_matchers['subject']:
+            subject = (campaign.get('subject') or '').encode('utf-8', errors='replace').decode('ascii', 'replace')
+            bits |= self._field_bits('subject', subject)
+        if self.label_bits:
+            label_bits = self.label_bits
+            for label in campaign.get('labels') or ():
+                if label in label_bits:
+                    bits |= label_bits[label]
+        return bits
+
+    def _email_type(self, bits):
+        email_type = self._email_type_cache.get(bits)
+        if email_type is None:
+            email_type = self.default_email_type
+            for required, forbidden, term_email_type in self.email_type_terms:
+                if bits & required == required and not bits & forbidden:
+                    email_type = term_email_type
+                    break
+            if len(self._email_type_cache) >= self.cache_size:
+                self._email_type_cache = {}
+            self._email_type_cache[bits] = email_type
+        return email_type
+
+    def _publication(self, email_type, list_name, bits):
+        for required, forbidden, types, strip in self.publication_terms:
+            if email_type in types and bits & required == required and not bits & forbidden:
+                return strip.sub('', list_name) if strip is not None else list_name
+        return None
+
+    def email_type(self, campaign):
+        """
+        :param dict campaign: A dict representing metadata for one email send
+        :return: A string that corresponds to one of the DiveEmailTypes options.
+        :rtype: string
+        """
+        return self._email_type(self._bits(campaign))
+
+    def publication(self, campaign):
+        """
+        :param dict campaign: A dict of campaign metadata. Uses its dive_email_type if present,
+            otherwise infers it.
+        :return: String representing publication name or None.
+        :rtype: string|None
+        """
+        bits = self._bits(campaign)
+        email_type = campaign['dive_email_type'] if 'dive_email_type' in campaign else self._email_type(bits)
+        return self._publication(email_type, campaign.get('list') or '', bits)
+
+    def classify(self, campaign):
+        """
+        Email type and publication in one pass (ignoring any dive_email_type already present).
+
+        :return: (dive_email_type, publication)
+        :rtype: tuple
+        """
+        bits = self._bits(campaign)
+        email_type = self._email_type(bits)
+        return email_type, self._publication(email_type, campaign.get('list') or '', bits)
+
+
+_default_classifier = None
+
+
+def get_default_classifier():
+    """ :return: the RuleClassifier for DEFAULT_RULES, compiled on first use """
+    global _default_classifier
+    if _default_classifier is None:
+        _default_classifier = RuleClassifier()
+    return _default_classifier
+
+
+def infer_dive_email_type(campaign):
+    """
+    Industry Dive specific function to try to figure out how to
+    categorize a given campaign/blast in terms we understand.
+    See DEFAULT_RULES for the rules.
+
+    :param dict campaign: A dict representing metadata for one email send
+        ("blast" in Sailthru langauge).
+    :return: A string that corresponds to one of the DiveEmailTypes
+        options.
+    :rtype: string
+    """
+    return get_default_classifier().email_type(campaign)
+
+
+def infer_dive_publication(campaign):
+    """
+    Guesses the Dive newsletter's publication based on its dive_email_type and list name
+    See DEFAULT_RULES for the rules.
+
+    :param dict campaign: A dict of campaign metadata.
+    :return: String representing publication name (like "Healthcare Dive" or "Education Dive: Higher Ed")
+        or None.
+    :rtype: string|None
+    """
+    return get_default_classifier().publication(campaign)
+
+
+def infer_list_publication(list_name):
+    """
+    Guesses the publication a mailing list belongs to from its name alone, by stripping the
+    blast list and weekender suffixes we use (the same ones infer_dive_publication strips).
+    Other list names (like newsletter lists) are returned unchanged.
+
+    :param string list_name: A Sailthru list name like "Utility Dive Blast List"
+    :return: String representing publication name (like "Utility Dive") or None for an empty name.
+    :rtype: string|None
+    """
+    if not list_name:
+        return None
+    publication = re.sub(r'( (Half|(TWO )?Thirds?|Quarters?))? Blast List - Group [A-D]$', '', list_name, flags=re.I)
+    publication = re.sub(r'( and sub pubs)? [Bb]last [Ll]ist$', '', publication)
+    return re.sub(r' [Ww]eekender$', '', publication)
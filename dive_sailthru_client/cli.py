@@ -0,0 +1,474 @@
+"""
+dive-sailthru: bulk extraction of campaigns, campaign stats and list exports.
+
+Every command splits its work into units (30 day windows, blast ids or list names), fetches
+units in parallel (--workers) and records finished units in a checkpoint file
+(--checkpoint). Rerunning the same command with the same checkpoint skips finished units and
+continues where a killed run stopped.
+
+Examples:
+    dive-sailthru campaigns --start 2023-01-01 --end 2024-01-01 -o campaigns.jsonl --checkpoint campaigns.ckpt
+    dive-sailthru stats --start 2023-01-01 --end 2024-01-01 --clickmap --workers 16 -o stats.jsonl \
+        --checkpoint stats.ckpt
+    dive-sailthru export-lists "Utility Dive" "HR Dive" --field email --var company --download-dir exports/
+
+The reclassify command works offline: it rewrites campaign archives (e.g. campaigns command
+output) with dive_email_type/dive_brand from new classification rules, on all CPUs:
+    dive-sailthru reclassify archive/*.jsonl.gz --rules rules.json --output-dir reclassified/
+
+Credentials come from --api-key/--api-secret or the SAILTHRU_API_KEY/SAILTHRU_API_SECRET env vars.
+"""
+from __future__ import absolute_import, print_function
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import datetime
+import itertools
+import json
+import os
+import sys
+import time
+
+
+class CheckpointMismatchError(Exception):
+    pass
+
+
+class Checkpoint(object):
+    """
+    Progress of one run: which units are done, and how far the output file had been written
+    when each was (so output written for a unit that was never marked done can be cut off on
+    resume).
+
+    The checkpoint file is JSON lines: a header with the command and its arguments, then one
+    line appended per finished unit, so recording a unit costs one short write however long
+    the run. A line cut off by a kill is ignored (and overwritten) on resume. Larger state
+    that is computed once, like the stats command's campaign list, goes in a file next to
+    it (see store) that the log only points to.
+    """
+
+    def __init__(self, path, command, params):
+        self.path = path
+        self.done = set()
+        self.output_offset = 0
+        self._log = None
+        self._values = {}
+        self._stored = set()  # names store() saved for this run; other side files are stale
+        if not path:
+            return
+        if os.path.exists(path):
+            self._resume(command, params)
+        else:
+            self._replace(path, json.dumps({'command': command, 'params': params}) + '\n')
+        self._log = open(path, 'a')
+
+    def _resume(self, command, params):
+        with open(self.path, 'rb') as f:
+            lines = f.read().split(b'\n')
+        # everything after the last newline is a line the previous run didn't finish writing
+        complete_size = sum(len(line) + 1 for line in lines[:-1])
+        saved = json.loads(lines[0].decode('utf-8'))
+        if len(lines) == 1:
+            raise CheckpointMismatchError("%s is not a checkpoint in the current format; delete it" % self.path)
+        if saved.get('command') != command or saved.get('params') != params:
+            raise CheckpointMismatchError(
+                "Checkpoint %s was written by a run with different arguments (%s %s); "
+                "delete it or use another --checkpoint" % (self.path, saved['command'], json.dumps(saved['params'])))
+        for line in lines[1:-1]:
+            entry = json.loads(line.decode('utf-8'))
+            if 'stored' in entry:
+                self._stored.add(entry['stored'])
+            else:
+                self.done.add(entry['unit'])
+                self.output_offset = entry['output_offset']
+        with open(self.path, 'r+b') as f:
+            f.truncate(complete_size)
+
+    @staticmethod
+    def _replace(path, content):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, path)  # atomic, so a kill never leaves half a file
+
+    @property
+    def is_resumed(self):
+        return bool(self.done)
+
+    def load(self, name):
+        """ :return: the value stored under name by this run (or the run it resumes), or None """
+        if name not in self._values and name in self._stored:
+            with open('%s.%s' % (self.path, name)) as f:
+                self._values[name] = json.load(f)
+        return self._values.get(name)
+
+    def store(self, name, value):
+        """ Save a JSON value once for the rest of the run, in a file next to the checkpoint """
+        self._values[name] = value
+        if self._log is not None:
+            self._replace('%s.%s' % (self.path, name), json.dumps(value))
+            self._append({'stored': name})
+
+    def mark_done(self, unit, output_offset):
+        self.done.add(unit)
+        self.output_offset = output_offset
+        if self._log is not None:
+            self._append({'unit': unit, 'output_offset': output_offset})
+
+    def _append(self, entry):
+        self._log.write(json.dumps(entry) + '\n')
+        self._log.flush()
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+class JsonLinesWriter(object):
+    """ Writes records as JSON lines to a file (or stdout for '-') """
+
+    def __init__(self, path, resume_offset=0):
+        if path == '-':
+            self.file = getattr(sys.stdout, 'buffer', sys.stdout)
+            self.seekable = False
+            return
+        self.file = open(path, 'r+b' if resume_offset else 'wb')
+        self.seekable = True
+        # drop anything written after the last checkpointed unit
+        self.file.seek(resume_offset)
+        self.file.truncate()
+
+    def write(self, unit, records):
+        for record in records:
+            self.file.write(json.dumps(record, sort_keys=True).encode('utf-8'))
+            self.file.write(b'\n')
+        self.file.flush()
+
+    def offset(self):
+        return self.file.tell() if self.seekable else 0
+
+    def close(self):
+        if self.seekable:
+            self.file.close()
+
+
+class ParquetWriter(object):
+    """
+    Writes each unit's records to its own file in a directory (parquet files cannot be
+    appended to). Nested values (stats breakdowns, label lists) are stored as JSON strings.
+    Requires pyarrow.
+    """
+
+    def __init__(self, path, resume_offset=0):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit("--format parquet requires pyarrow: pip install 'dive_sailthru_client[parquet]'")
+        self.pyarrow = pyarrow
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def write(self, unit, records):
+        rows = [dict((key, json.dumps(value, sort_keys=True) if isinstance(value, (dict, list)) else value)
+                     for key, value in record.items())
+                for record in records]
+        # Campaigns don't all have the same keys (abtest*, copy_blast_id, suppress_list, ...),
+        # so the columns are every key of every row, with nulls where a row lacks one
+        keys = sorted(set(key for row in rows for key in row))
+        table = self.pyarrow.Table.from_pydict(dict((key, [row.get(key) for row in rows]) for key in keys))
+        file_name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in str(unit)) + '.parquet'
+        self.pyarrow.parquet.write_table(table, os.path.join(self.path, file_name))
+
+    def offset(self):
+        return 0
+
+    def close(self):
+        pass
+
+
+class Progress(object):
+    """ Progress display on stderr: a redrawn line on a terminal, one line per unit otherwise """
+
+    def __init__(self, label, total, done=0, stream=None, quiet=False):
+        self.label = label
+        self.total = total
+        self.done = done
+        self.records = 0
+        self.stream = stream or sys.stderr
+        self.quiet = quiet
+        self.start_time = time.time()
+        self.interactive = hasattr(self.stream, 'isatty') and self.stream.isatty()
+        if done and not quiet:
+            self._print("resuming, %d of %d %s already done" % (done, total, label), newline=True)
+
+    def _print(self, message, newline=False):
+        if self.interactive and not newline:
+            self.stream.write('\r\033[K' + message)
+        else:
+            self.stream.write(message + '\n')
+        self.stream.flush()
+
+    def update(self, unit, record_count):
+        self.done += 1
+        self.records += record_count
+        if self.quiet:
+            return
+        elapsed = time.time() - self.start_time
+        self._print("%s: %d/%d done, %d records, %.0fs elapsed (last: %s)" %
+                    (self.label, self.done, self.total, self.records, elapsed, unit))
+
+    def finish(self):
+        if self.interactive and not self.quiet:
+            self.stream.write('\n')
+
+
+def run_units(units, fetch, writer, checkpoint, workers, progress):
+    """
+    Fetch every unit not yet in the checkpoint with fetch(unit) -> list of records, using up to
+    workers threads. Records are written (from this thread only) as each unit completes and
+    the unit is then marked done in the checkpoint.
+    """
+    pending = [unit for unit in units if unit not in checkpoint.done]
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = dict((executor.submit(fetch, unit), unit) for unit in pending)
+    try:
+        for future in as_completed(futures):
+            unit = futures[future]
+            records = future.result()
+            writer.write(unit, records)
+            checkpoint.mark_done(unit, writer.offset())
+            progress.update(unit, len(records))
+    finally:
+        # on errors or ctrl-c don't start any more units; finished ones are checkpointed
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+        progress.finish()
+
+
+def _date_windows(sailthru_client, start_date, end_date):
+    return ['%s/%s' % (window_start.isoformat(), window_end.isoformat())
+            for window_start, window_end in sailthru_client._iter_date_windows(start_date, end_date)]
+
+
+def _parse_window(window):
+    return tuple(_parse_date(d) for d in window.split('/'))
+
+
+def _parse_date(value):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected a YYYY-MM-DD date, got %r" % value)
+
+
+def _campaign_filter(args, fields=None):
+    # imported here so that --help and argument errors stay fast
+    from .filters import CampaignFilter
+    return CampaignFilter(email_types=args.email_type, publications=args.publication,
+                          min_sent_count=args.min_sent_count, fields=fields)
+
+
+def command_campaigns(sailthru_client, args, checkpoint, writer):
+    campaign_filter = _campaign_filter(args, fields=args.field)
+
+    def fetch(window):
+        window_start, window_end = _parse_window(window)
+        return sailthru_client._get_campaigns_page(window_start, window_end, args.list, campaign_filter=campaign_filter)
+
+    windows = _date_windows(sailthru_client, args.start, args.end)
+    progress = Progress('windows', len(windows), len(checkpoint.done & set(windows)), quiet=args.quiet)
+    run_units(windows, fetch, writer, checkpoint, args.workers, progress)
+
+
+def command_stats(sailthru_client, args, checkpoint, writer):
+    # The campaign list is fetched once and kept with the checkpoint, so a resumed run goes
+    # straight back to fetching stats.
+    campaign_rows = checkpoint.load('campaigns')
+    if campaign_rows is None:
+        windows = _date_windows(sailthru_client, args.start, args.end)
+        campaign_filter = _campaign_filter(args)
+        executor = ThreadPoolExecutor(max_workers=args.workers)
+        try:
+            pages = executor.map(lambda window: sailthru_client._get_campaigns_page(
+                *_parse_window(window), list_name=args.list, campaign_filter=campaign_filter), windows)
+            campaign_rows = []
+            seen_blast_ids = set()
+            for c in itertools.chain.from_iterable(pages):
+                # a blast sent on the day one window ends and the next starts is in both pages
+                if c['blast_id'] not in seen_blast_ids:
+                    seen_blast_ids.add(c['blast_id'])
+                    campaign_rows.append([c['blast_id'], c.get('dive_brand'), c.get('dive_email_type')])
+        finally:
+            executor.shutdown(wait=True)
+        checkpoint.store('campaigns', campaign_rows)
+    campaigns = dict((blast_id, (brand, email_type)) for blast_id, brand, email_type in campaign_rows)
+
+    def fetch(blast_id):
+        stats = sailthru_client.get_campaign_stats(
+            blast_id, include_clickmap=args.clickmap, include_subject=args.subject,
+            include_click_times=args.click_times, include_urls=args.urls, include_device=args.device)
+        stats['blast_id'] = blast_id
+        stats['dive_brand'], stats['dive_email_type'] = campaigns[blast_id]
+        return [stats]
+
+    blast_ids = [c[0] for c in campaign_rows]
+    progress = Progress('blasts', len(blast_ids), len(checkpoint.done & set(blast_ids)), quiet=args.quiet)
+    run_units(blast_ids, fetch, writer, checkpoint, args.workers, progress)
+
+
+def command_reclassify(args):
+    # imported here so that the other commands don't pay for it
+    from .reclassify import reclassify_archives
+    rules = None
+    if args.rules:
+        with open(args.rules) as f:
+            rules = json.load(f)
+    report = reclassify_archives(args.archives, args.output_dir, rules=rules, processes=args.processes)
+    print("%d campaigns: %d changed email type, %d changed publication" % (
+        report['campaigns'], report['email_type_changed'], report['publication_changed']), file=sys.stderr)
+    for (old_type, new_type), count in sorted(report['transitions'].items(), key=lambda item: -item[1]):
+        print("  %s -> %s: %d" % (old_type, new_type, count), file=sys.stderr)
+    return 0
+
+
+def command_export_lists(sailthru_client, args, checkpoint, writer):
+    def fetch(list_name):
+        job_result = sailthru_client.export_list(list_name, fields=args.field, sailthru_vars=args.var)
+        if args.download_dir and job_result.get('export_url'):
+            job_result['local_path'] = _download(sailthru_client, job_result['export_url'],
+                                                 os.path.join(args.download_dir, job_result['filename']))
+        return [job_result]
+
+    if args.download_dir and not os.path.isdir(args.download_dir):
+        os.makedirs(args.download_dir)
+    progress = Progress('lists', len(args.lists), len(checkpoint.done & set(args.lists)), quiet=args.quiet)
+    run_units(args.lists, fetch, writer, checkpoint, args.workers, progress)
+
+
+def _download(sailthru_client, url, path):
+    response = sailthru_client.transport.session.get(url, stream=True, timeout=sailthru_client.request_timeout)
+    response.raise_for_status()
+    tmp_path = path + '.part'
+    with open(tmp_path, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=1024 * 1024):
+            f.write(chunk)
+    os.replace(tmp_path, path)
+    return path
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='dive-sailthru', description='Bulk extraction from the Sailthru API.')
+    parser.add_argument('--api-key', default=os.getenv('SAILTHRU_API_KEY'),
+                        help='defaults to the SAILTHRU_API_KEY env var')
+    parser.add_argument('--api-secret', default=os.getenv('SAILTHRU_API_SECRET'),
+                        help='defaults to the SAILTHRU_API_SECRET env var')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    def add_command(name, func, help_text):
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.set_defaults(func=func)
+        subparser.add_argument('-o', '--output', default='-',
+                               help="JSON lines file (default stdout), or directory for --format parquet")
+        subparser.add_argument('--format', choices=('jsonl', 'parquet'), default='jsonl')
+        subparser.add_argument('--workers', type=int, default=4, help='parallel API requests (default 4)')
+        subparser.add_argument('--checkpoint', help='checkpoint file to resume from and record progress in')
+        subparser.add_argument('-q', '--quiet', action='store_true', help='no progress display')
+        subparser.add_argument('--profile', metavar='FILE',
+                               help='write per-action request timings (JSON) to FILE and print a summary at the end')
+        return subparser
+
+    def add_range_arguments(subparser):
+        subparser.add_argument('--start', type=_parse_date, required=True, help='YYYY-MM-DD')
+        subparser.add_argument('--end', type=_parse_date, required=True, help='YYYY-MM-DD (exclusive)')
+        subparser.add_argument('--list', help='only campaigns sent to this list')
+        subparser.add_argument('--email-type', action='append', help='only campaigns of this dive_email_type (repeatable)')
+        subparser.add_argument('--publication', action='append', help='only campaigns of this publication (repeatable)')
+        subparser.add_argument('--min-sent-count', type=int, help='only campaigns sent to at least this many addresses')
+
+    campaigns = add_command('campaigns', command_campaigns, 'sent campaigns in a date range')
+    add_range_arguments(campaigns)
+    campaigns.add_argument('--field', action='append', help='only output this campaign field (repeatable)')
+
+    stats = add_command('stats', command_stats, 'stats for every campaign sent in a date range')
+    add_range_arguments(stats)
+    stats.add_argument('--clickmap', action='store_true')
+    stats.add_argument('--click-times', action='store_true')
+    stats.add_argument('--urls', action='store_true')
+    stats.add_argument('--device', action='store_true')
+    stats.add_argument('--subject', action='store_true')
+
+    export_lists = add_command('export-lists', command_export_lists, 'export_list_data jobs for lists')
+    export_lists.add_argument('lists', nargs='+', metavar='LIST')
+    export_lists.add_argument('--field', action='append', help='user field to export (repeatable)')
+    export_lists.add_argument('--var', action='append', help='user var to export (repeatable)')
+    export_lists.add_argument('--download-dir', help='also download each exported CSV into this directory')
+
+    reclassify = subparsers.add_parser('reclassify', help='recompute dive_email_type/dive_brand in campaign archives')
+    reclassify.set_defaults(func=command_reclassify)
+    reclassify.add_argument('archives', nargs='+', metavar='ARCHIVE', help='JSON lines file (.jsonl or .jsonl.gz)')
+    reclassify.add_argument('--output-dir', required=True, help='where to write the reclassified archives')
+    reclassify.add_argument('--rules', help='JSON rule table (default: the built in rules)')
+    reclassify.add_argument('--processes', type=int, help='worker processes (default: one per CPU)')
+    return parser
+
+
+# Arguments that don't change what a run extracts, so they may differ when resuming
+_RUNTIME_ARGUMENTS = ('api_key', 'api_secret', 'func', 'workers', 'checkpoint', 'quiet', 'profile')
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'reclassify':
+        return args.func(args)
+    if not args.api_key or not args.api_secret:
+        parser.error("an API key and secret are required (--api-key/--api-secret or SAILTHRU_API_KEY/SAILTHRU_API_SECRET)")
+    if args.checkpoint and args.output == '-':
+        parser.error("--checkpoint needs an --output file to resume into")
+    if args.format == 'parquet' and args.output == '-':
+        parser.error("--format parquet needs an --output directory")
+
+    params = dict((key, value.isoformat() if isinstance(value, datetime.date) else value)
+                  for key, value in vars(args).items() if key not in _RUNTIME_ARGUMENTS)
+    try:
+        checkpoint = Checkpoint(args.checkpoint, args.command, params)
+    except CheckpointMismatchError as e:
+        parser.error(str(e))
+    if args.format == 'jsonl' and checkpoint.output_offset and (
+            not os.path.exists(args.output) or os.path.getsize(args.output) < checkpoint.output_offset):
+        checkpoint.close()
+        parser.error("Checkpoint %s says %d bytes of %s were already written, but the file is missing or shorter; "
+                     "restore it, or delete the checkpoint to start over" %
+                     (args.checkpoint, checkpoint.output_offset, args.output))
+
+    # imported here so that --help and argument errors don't pay for the HTTP stack
+    from .client import DiveSailthruClient
+    from .profiling import RequestProfiler
+    from .transport import HttpTransport
+    profiler = RequestProfiler() if args.profile else None
+    sailthru_client = DiveSailthruClient(args.api_key, args.api_secret,
+                                         transport=HttpTransport(pool_maxsize=args.workers), profiler=profiler)
+    writer_class = ParquetWriter if args.format == 'parquet' else JsonLinesWriter
+    writer = writer_class(args.output, resume_offset=checkpoint.output_offset)
+    try:
+        args.func(sailthru_client, args, checkpoint, writer)
+    except KeyboardInterrupt:
+        if args.checkpoint:
+            print("\ninterrupted; rerun the same command to resume from %s" % args.checkpoint, file=sys.stderr)
+        return 130
+    finally:
+        writer.close()
+        checkpoint.close()
+        if profiler is not None:
+            profiler.dump(args.profile)
+            if not args.quiet:
+                print(profiler.format_report(), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
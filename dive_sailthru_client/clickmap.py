@@ -0,0 +1,161 @@
+from __future__ import absolute_import
+from array import array
+import heapq
+
+
+class SpaceSaving(object):
+    """
+    Space-Saving heavy hitter sketch (Metwally et al.): counts at most capacity keys. When a
+    new key arrives and the sketch is full, the key with the smallest count is replaced and
+    the newcomer inherits that count, so a reported count overestimates the true one by at
+    most the smallest monitored count. Any key whose true share of the total is above
+    1/capacity is guaranteed to be monitored.
+    """
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.counts = {}
+        # lazy min-heap of (count, key); entries whose count is out of date are skipped
+        self._heap = []
+
+    def add(self, key, count=1):
+        counts = self.counts
+        if key in counts:
+            counts[key] += count
+        elif len(counts) < self.capacity:
+            counts[key] = count
+        else:
+            min_count, min_key = self._pop_min()
+            del counts[min_key]
+            counts[key] = min_count + count
+        heapq.heappush(self._heap, (counts[key], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(c, k) for k, c in counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self):
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self.counts.get(key) == count:
+                return count, key
+
+    def top(self, k):
+        """ :return: list of (key, count), largest first """
+        return heapq.nlargest(k, self.counts.items(), key=lambda item: item[1])
+
+
+class ClickmapAggregator(object):
+    """
+    Aggregates the clickmap/urls sections of get_campaign_stats results over many blasts,
+    streamed in one at a time, into running click totals by url, by link position (ix) and
+    by publication.
+
+        aggregator = ClickmapAggregator()
+        for campaign in campaigns:
+            stats = sailthru_client.get_campaign_stats(campaign['blast_id'], include_clickmap=True)
+            aggregator.add(stats, publication=campaign['dive_brand'])
+        aggregator.top_urls(10, publication='Utility Dive')
+
+    Urls are interned to integer ids so the totals are plain int arrays. To bound memory over
+    very many distinct urls, pass sketch_size: url totals are then kept in Space-Saving
+    sketches of that many urls each (approximate counts, exact for the heavy hitters).
+    """
+
+    def __init__(self, sketch_size=None):
+        self.sketch_size = sketch_size
+        self.blast_count = 0
+        self._url_ids = {}
+        self._urls = []
+        self._url_totals = array('q')  # indexed by url id (exact mode only)
+        self._url_totals_by_publication = {}  # publication -> {url id: clicks} or SpaceSaving
+        self._ix_totals = {}
+        self._ix_totals_by_publication = {}
+        if sketch_size:
+            self._url_sketch = SpaceSaving(sketch_size)
+
+    def url_id(self, url):
+        """ Intern url, returning its integer id """
+        url_id = self._url_ids.get(url)
+        if url_id is None:
+            url_id = self._url_ids[url] = len(self._urls)
+            self._urls.append(url)
+            self._url_totals.append(0)
+        return url_id
+
+    def url(self, url_id):
+        return self._urls[url_id]
+
+    @staticmethod
+    def _url_clicks(stats):
+        """ Yield (url, ix, clicks) from a stats result, preferring the clickmap over urls """
+        clickmap = stats.get('clickmap')
+        if clickmap:
+            for link in clickmap:
+                yield link['url'], int(link['ix']), int(link['count'])
+        else:
+            # urls has per-url totals but no positions; its 'count' is the send count, not clicks
+            for url, url_stats in (stats.get('urls') or {}).items():
+                yield url, None, int(url_stats.get('click_total', 0))
+
+    def add(self, stats, publication=None):
+        """
+        Add one blast's stats.
+
+        :param dict stats: get_campaign_stats result with include_clickmap and/or include_urls
+        :param publication: the blast's publication (dive_brand), for per-publication totals
+        """
+        self.blast_count += 1
+        ix_by_publication = self._ix_totals_by_publication.setdefault(publication, {})
+        if self.sketch_size:
+            by_publication = self._url_totals_by_publication.get(publication)
+            if by_publication is None:
+                by_publication = self._url_totals_by_publication[publication] = SpaceSaving(self.sketch_size)
+        else:
+            by_publication = self._url_totals_by_publication.setdefault(publication, {})
+
+        for url, ix, clicks in self._url_clicks(stats):
+            if self.sketch_size:
+                self._url_sketch.add(url, clicks)
+                by_publication.add(url, clicks)
+            else:
+                url_id = self.url_id(url)
+                self._url_totals[url_id] += clicks
+                by_publication[url_id] = by_publication.get(url_id, 0) + clicks
+            if ix is not None:
+                self._ix_totals[ix] = self._ix_totals.get(ix, 0) + clicks
+                ix_by_publication[ix] = ix_by_publication.get(ix, 0) + clicks
+
+    def add_many(self, stats_and_publications):
+        """ Add (stats, publication) pairs from any iterable, e.g. a generator fetching stats """
+        for stats, publication in stats_and_publications:
+            self.add(stats, publication)
+
+    def top_urls(self, k=10, publication=None):
+        """
+        :param publication: only count clicks from this publication's blasts
+        :return: the k most clicked urls as (url, clicks), most clicks first
+        :rtype: list[tuple]
+        """
+        if self.sketch_size:
+            sketch = self._url_sketch if publication is None else self._url_totals_by_publication.get(publication)
+            return sketch.top(k) if sketch is not None else []
+        if publication is None:
+            totals = self._url_totals
+            url_ids = heapq.nlargest(k, range(len(totals)), key=totals.__getitem__)
+            return [(self._urls[url_id], totals[url_id]) for url_id in url_ids]
+        totals = self._url_totals_by_publication.get(publication, {})
+        return [(self._urls[url_id], clicks)
+                for url_id, clicks in heapq.nlargest(k, totals.items(), key=lambda item: item[1])]
+
+    def top_positions(self, k=10, publication=None):
+        """
+        :return: the k most clicked link positions as (ix, clicks), most clicks first
+        :rtype: list[tuple]
+        """
+        totals = self._ix_totals if publication is None else self._ix_totals_by_publication.get(publication, {})
+        return heapq.nlargest(k, totals.items(), key=lambda item: item[1])
+
+    def publications(self):
+        return set(self._url_totals_by_publication)
@@ -1,34 +1,70 @@
 from __future__ import absolute_import
 from sailthru.sailthru_client import SailthruClient
-from .errors import SailthruApiError, SailthruUserEmailError
+from .errors import SailthruApiError, SailthruSuppressedUserError, SailthruUserEmailError
+# DiveEmailTypes is re-exported here for backwards compatibility
+from .classification import DiveEmailTypes, get_default_classifier  # noqa: F401
 # We need the SailthruClientError to be able to handle retries in api_get
 from sailthru.sailthru_error import SailthruClientError
+from .transport import HttpTransport, _request_params
+from .bulk import RETRYABLE, UserResult, chunks, request_not_received
+from .timeseries import compact_campaign_stats
+from .filters import CampaignFilter
 # other libraries
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import collections
 import datetime
+import io
+import itertools
+import json
 import time
-import re
 import six.moves
 
 # TODO: enforce structure on returned dicts -- make all keys present even if
 # value is zero. Maybe replace with class.
 
 
-class DiveEmailTypes:
+def _ab_test_links(campaign):
+    """ The blast ids an A/B test blast points at (its final blast, its copy) """
+    return set(campaign[key] for key in ('final_blast_id', 'copy_blast_id') if campaign.get(key))
+
+
+def _unique_blasts(campaigns, collapse_ab_tests=True):
     """
-    Provides standard email types we use.
+    Yield the campaigns with a blast_id not seen before. With collapse_ab_tests, an A/B test's
+    final blast (blast_id == final_blast_id) and the copy its copy_blast_id names count as
+    one campaign, the final, whatever order they come in; the test's segments are kept.
+
+    Until a test's final is seen there is no telling whether one of its other blasts is the
+    copy, so those are held back until then (or until campaigns runs out). Blasts that are
+    not part of an A/B test are yielded right away.
     """
-    Blast = "blast"
-    TwoThirdBlast = "twothirdblast"
-    HalfBlast = "halfblast"
-    ThirdBlast = "thirdblast"
-    QuarterBlast = "quarterblast"
-    WelcomeSeries = "welcome"
-    Newsletter = "newsletter"
-    Weekender = "weekender"
-    Unknown = "unknown"
-    BreakingNews = "breaking"
-    Spotlight = "spotlight"
-    Audience = "audience"  # e.g. Dive-iversary, "Update your profile"
+    seen_blast_ids = set()
+    finals = {}  # blast_id -> copy_blast_id of the final blasts seen so far
+    held = collections.OrderedDict()  # blast_id -> A/B test blast waiting for its final
+    for c in campaigns:
+        blast_id = c['blast_id']
+        if blast_id in seen_blast_ids:
+            continue
+        seen_blast_ids.add(blast_id)
+        links = _ab_test_links(c) if collapse_ab_tests else set()
+        if not links:
+            yield c
+        elif c.get('final_blast_id') == blast_id:
+            finals[blast_id] = c.get('copy_blast_id')
+            yield c
+            for held_id, held_c in list(held.items()):
+                if blast_id in _ab_test_links(held_c):
+                    del held[held_id]
+                    if held_id != finals[blast_id]:
+                        yield held_c
+        else:
+            linked_finals = links.intersection(finals)
+            if not linked_finals:
+                held[blast_id] = c
+            elif all(finals[final_id] != blast_id for final_id in linked_finals):
+                yield c
+    for c in held.values():
+        yield c
 
 
 class DiveSailthruClient(SailthruClient):
@@ -37,11 +73,29 @@ class DiveSailthruClient(SailthruClient):
 
     This includes dive publication (misnamed as key dive_brand), dive email type,
     and easier ways to query campaigns.
+
+    One client can be shared by many threads: the only state it changes per request is
+    last_rate_limit_info (single dict assignments, which are atomic), and its HttpTransport
+    is thread-safe. Forked worker processes can keep using a client created before the
+    fork; its transport builds a fresh connection pool in the child. Clients can also be
+    pickled for spawned processes, or use workers.ClientFactory to build one per worker.
     """
 
-    def __init__(self, api_key, secret, api_url=None, request_timeout=60):
-        """ override init to set default request_timeout to a more reasonable 60 seconds """
+    def __init__(self, api_key, secret, api_url=None, request_timeout=60, transport=None, classifier=None,
+                 profiler=None):
+        """
+        override init to set default request_timeout to a more reasonable 60 seconds
+
+        :param transport: Optional HttpTransport to send requests through. Defaults to a new
+            pooled HttpTransport; pass one in to share connections between clients.
+        :param classifier: Optional classification.RuleClassifier used to set dive_email_type
+            and dive_brand. Defaults to the built in rules (classification.DEFAULT_RULES).
+        :param profiler: Optional profiling.RequestProfiler to record every request's timing in.
+        """
         super().__init__(api_key, secret, api_url, request_timeout)
+        self.transport = transport if transport is not None else HttpTransport()
+        self.classifier = classifier if classifier is not None else get_default_classifier()
+        self.profiler = profiler
 
     def get_primary_lists(self):
         """
@@ -52,10 +106,11 @@ class DiveSailthruClient(SailthruClient):
         """
         return self.api_get('list', {"primary": 1}).json['lists']
 
-    def _infer_dive_email_type(self, campaign):   # noqa: C901 - yeah it's complicated, I'm not proud!
+    def _infer_dive_email_type(self, campaign):
         """
         Industry Dive specific function to try to figure out how to
         categorize a given campaign/blast in terms we understand.
+        See classification.DEFAULT_RULES for the default rules.
 
         :param dict campaign: A dict representing metadata for one email send
             ("blast" in Sailthru langauge).
@@ -63,85 +118,19 @@ class DiveSailthruClient(SailthruClient):
             options.
         :rtype: string
         """
-        labels = campaign.get('labels', [])
-        name = campaign.get('name', '')
-        list_name = campaign.get('list', '')
-        subject = campaign.get('subject', '').encode('utf-8', errors='replace').decode('ascii', 'replace')
-        # WARNING! Order matters below
-        if "spotlight-newsletter" in labels:
-            # Note that spotlight's name also starts with "Issue: " and it's sent to the blast
-            # list so it must appear near the top
-            return DiveEmailTypes.Spotlight
-        elif "Welcome Series" in labels or \
-                ("Welcome" in list_name and " days " in name.lower()):
-            return DiveEmailTypes.WelcomeSeries
-        elif "Dive-iversary" in subject or "Dive-iversary" in list_name:
-            return DiveEmailTypes.Audience
-        elif "update profile" in list_name.lower():
-            return DiveEmailTypes.Audience
-        elif "linkedin" in list_name.lower() and "linkedin" in name.lower():
-            return DiveEmailTypes.Audience
-        elif "sepa upload" in list_name.lower() or "simple k12" in list_name.lower() or "esna list" in list_name.lower():
-            return DiveEmailTypes.Audience
-        elif subject.startswith("BREAKING") or "Breaking" in labels:
-            return DiveEmailTypes.BreakingNews
-        elif (list_name.endswith("Weekender") and ("+" not in list_name)) or \
-                name.startswith("Newsletter Weekly Roundup"):
-            return DiveEmailTypes.Weekender
-        elif list_name == "Supply Chain Dive: Operations" and ("Issue" in name or "SCD: Ops v2" in name):
-            return DiveEmailTypes.Newsletter
-        elif "Blast" in labels or '-blast-' in name or "blast=" in name or "blast list" in list_name.lower():
-            if "QuarterBlast" in name or "Quarters Blast List" in list_name or "Quarter Blast List" in list_name:
-                return DiveEmailTypes.QuarterBlast
-            elif "twothirdblast" in name or "two thirds blast list" in list_name.lower() or "two third blast list" in list_name.lower():
-                # Must go before standard third blast
-                return DiveEmailTypes.TwoThirdBlast
-            elif "ThirdBlast" in name or "Thirds Blast List" in list_name or "Third Blast List" in list_name:
-                return DiveEmailTypes.ThirdBlast
-            elif "HalfBlast" in name or "Half Blast List" in list_name \
-                     or list_name.endswith(' - Group A') or list_name.endswith(' - Group B'):
-                # Put this last to catch any legacy split blast lists that may not have "Half" in name
-                return DiveEmailTypes.HalfBlast
-            else:
-                return DiveEmailTypes.Blast
-        elif "newsletter" in labels or name.startswith("Issue: "):
-            return DiveEmailTypes.Newsletter
-        else:
-            return DiveEmailTypes.Unknown
+        return self.classifier.email_type(campaign)
 
     def _infer_dive_publication(self, campaign):
         """
-        Guesses the Dive newsletter's publication based on its dive_email_type and list name
+        Guesses the Dive newsletter's publication based on its dive_email_type and list name.
+        See classification.DEFAULT_RULES for the default rules.
 
         :param dict campaign: A dict of campaign metadata.
         :return: String representing publication name (like "Healthcare Dive" or "Education Dive: Higher Ed")
             or None.
         :rtype: string|None
         """
-
-        # This function requires a dive_email_type, so if 'dive_email_type' is already a key
-        # in the campaign then use it, otherwise call it here.
-        if 'dive_email_type' in list(campaign.keys()):
-            dive_email_type = campaign['dive_email_type']
-        else:
-            dive_email_type = self._infer_dive_email_type(campaign)
-
-        list_name = campaign.get('list', '')
-        if (dive_email_type in [DiveEmailTypes.Blast, DiveEmailTypes.HalfBlast, DiveEmailTypes.Spotlight]) and \
-           list_name.lower().endswith("blast list"):
-            # The Utility Dive Spotlight goes out to a special
-            # blast list: "Utility Dive and sub pubs Blast List"
-            # This regex handles that as well as normal blast lists
-            return re.sub(r'( and sub pubs)? [Bb]last [Ll]ist$', '', list_name)
-        if (dive_email_type in (DiveEmailTypes.HalfBlast, DiveEmailTypes.QuarterBlast, DiveEmailTypes.ThirdBlast, DiveEmailTypes.TwoThirdBlast) and
-            "Group" in list_name):
-            return re.sub(r'( (Half|(TWO )?Thirds?|Quarters?))? Blast List - Group [A-D]$', '', list_name, flags=re.I)
-        if dive_email_type == DiveEmailTypes.Weekender and list_name.lower().endswith("weekender"):
-            return re.sub(r' [Ww]eekender$', '', list_name)
-        if dive_email_type == DiveEmailTypes.Newsletter:
-            return list_name
-
-        return None
+        return self.classifier.publication(campaign)
 
     def raise_exception_if_error(self, response):
         """
@@ -151,14 +140,15 @@ class DiveSailthruClient(SailthruClient):
             api_error = response.get_error()
             if api_error.code in list(SailthruUserEmailError.USER_EMAIL_ERROR_CODES.keys()):
                 raise SailthruUserEmailError(
-                    '%s (%s)' % (api_error.message, api_error.code)
+                    '%s (%s)' % (api_error.message, api_error.code), code=api_error.code
                 )
             else:
                 raise SailthruApiError(
-                    '%s (%s)' % (api_error.message, api_error.code)
+                    '%s (%s)' % (api_error.message, api_error.code), code=api_error.code
                 )
 
-    def get_campaigns_in_range(self, start_date, end_date, list_name=None):
+    def get_campaigns_in_range(self, start_date, end_date, list_name=None, prefetch=0, email_types=None,
+                               publications=None, min_sent_count=None, fields=None):
         """
         Get sent campaign (blast) metadata based on date range and optionally
         only sent to a named list. In addition to data returned from sailthru
@@ -171,6 +161,13 @@ class DiveSailthruClient(SailthruClient):
         :param start_date: date or datetime
         :param end_date: date or datetime
         :param list_name: Optionally limit results to sends to one named list.
+        :param prefetch: see iter_campaigns_in_range
+        :param email_types: Optionally keep only campaigns with one of these dive_email_types.
+        :param publications: Optionally keep only campaigns of these publications (dive_brand).
+        :param min_sent_count: Optionally keep only campaigns sent to at least this many addresses.
+        :param fields: Optionally keep only these keys of each campaign (e.g. ['blast_id', 'name']).
+            The filters are applied to each page as it is parsed, so dropped campaigns and keys
+            are never held for the whole range.
         :return: list of dicts where each dict is one campaign (see below)
          { 'abtest': 'final',
           'abtest_segment': 'Final',
@@ -201,57 +198,120 @@ class DiveSailthruClient(SailthruClient):
           'status': 'sent',
           'subject': 'Utilities: Is your grid secure?'}
         """
-        campaigns = []
-        # Sailthru API does not appear able to handle requests for large
-        # numbers of campaigns, so we somewhat arbitrarily break down requests
-        # for "large" date ranges to multiple API requests and then stitch them
-        # together in this function.
-        page_size_in_days = 30
+        return list(self.iter_campaigns_in_range(start_date, end_date, list_name=list_name, prefetch=prefetch,
+                                                 email_types=email_types, publications=publications,
+                                                 min_sent_count=min_sent_count, fields=fields))
+
+    def iter_campaigns_in_range(self, start_date, end_date, list_name=None, prefetch=0, email_types=None,
+                                publications=None, min_sent_count=None, fields=None):
+        """
+        Generator version of get_campaigns_in_range: yields the same annotated campaign
+        dicts, in the same order, as each page of results arrives, so callers can process
+        (or index, see CampaignIndex) campaigns without holding the whole range in memory.
+
+        :param prefetch: number of pages to fetch ahead on worker threads. Each worker
+            fetches, decodes and classifies its page while earlier pages are being consumed,
+            so on long backfills the wall-clock time comes down to about the network time.
+            At most prefetch pages are in flight or waiting, so a slow consumer holds back
+            the fetching instead of piling up pages. 0 fetches one page at a time.
+
+        The other parameters are as for get_campaigns_in_range.
+        """
+        campaign_filter = CampaignFilter(email_types, publications, min_sent_count, fields)
+        windows = self._iter_date_windows(start_date, end_date)
+
+        def get_page(window):
+            return self._get_campaigns_page(window[0], window[1], list_name, campaign_filter=campaign_filter)
+
+        if not prefetch:
+            for window in windows:
+                for c in get_page(window):
+                    yield c
+            return
+
+        with ThreadPoolExecutor(max_workers=prefetch) as executor:
+            pending = collections.deque(executor.submit(get_page, window) for window in itertools.islice(windows, prefetch))
+            try:
+                while pending:
+                    page = pending.popleft().result()
+                    for window in itertools.islice(windows, 1):
+                        pending.append(executor.submit(get_page, window))
+                    for c in page:
+                        yield c
+            finally:
+                # stopped early (or a page failed): don't fetch pages nobody will read
+                for future in pending:
+                    future.cancel()
+
+    def _iter_date_windows(self, start_date, end_date, page_size_in_days=30):
+        """
+        Sailthru API does not appear able to handle requests for large
+        numbers of campaigns, so we somewhat arbitrarily break down requests
+        for "large" date ranges to multiple API requests and then stitch them
+        together. This yields the (page_start_date, page_end_date) windows to request.
+        """
         page_start_date = start_date
         while page_start_date < end_date:
             page_end_date = \
                 page_start_date + datetime.timedelta(days=page_size_in_days)
             if page_end_date > end_date:
                 page_end_date = end_date  # Don't go past the request end_date.
+            yield page_start_date, page_end_date
+            page_start_date = page_end_date
 
-            # Build api parameters. Dates must converted to strings.
-            api_params = {
-                'status': 'sent',
-                'start_date': page_start_date.strftime("%Y-%m-%d"),
-                'end_date': page_end_date.strftime("%Y-%m-%d"),
-                'limit': 999999,  # workaround for limited data returned, see TECH-1615.
-            }
-            if list_name is not None:
-                api_params['list'] = list_name
-
-            result = self.api_get('blast', api_params)
-
-            data = result.json
-            blasts = data.get('blasts', [])
-            filtered_count = data.get('filtered_count', 0)
-            # We discovered in TECH-1615 that Sailthru is (accidentally?) limiting number of results. So let's
-            # specifically raise an exception if the expected number of records doesn't match the actual returned.
-            if filtered_count != len(blasts):
-                raise SailthruApiError(
-                    "Incomplete 'blast' API data. Expected %d records, got %d" % (filtered_count, len(blasts))
-                )
-
-            # We reverse the results to keep everything in ascending
-            # chronological order.
-            for c in reversed(blasts):
-                c['dive_email_type'] = self._infer_dive_email_type(c)
-                # technically below gets the pub, but keeping key `dive_brand` for backwards compatability
-                c['dive_brand'] = self._infer_dive_publication(c)
-                campaigns.append(c)
+    def _get_campaigns_page(self, page_start_date, page_end_date, list_name=None, campaign_filter=None):
+        """
+        Request one window of sent campaigns from the 'blast' API endpoint.
 
-            page_start_date = page_end_date
+        :param campaign_filter: optional filters.CampaignFilter of campaigns and fields to keep
 
+        :return: list of annotated campaign dicts in ascending chronological order
+        :rtype: list[dict]
+        """
+        # Build api parameters. Dates must converted to strings.
+        api_params = {
+            'status': 'sent',
+            'start_date': page_start_date.strftime("%Y-%m-%d"),
+            'end_date': page_end_date.strftime("%Y-%m-%d"),
+            'limit': 999999,  # workaround for limited data returned, see TECH-1615.
+        }
+        if list_name is not None:
+            api_params['list'] = list_name
+
+        result = self.api_get('blast', api_params)
+
+        data = result.json
+        blasts = data.get('blasts', [])
+        filtered_count = data.get('filtered_count', 0)
+        # We discovered in TECH-1615 that Sailthru is (accidentally?) limiting number of results. So let's
+        # specifically raise an exception if the expected number of records doesn't match the actual returned.
+        if filtered_count != len(blasts):
+            raise SailthruApiError(
+                "Incomplete 'blast' API data. Expected %d records, got %d" % (filtered_count, len(blasts))
+            )
+
+        # We reverse the results to keep everything in ascending
+        # chronological order.
+        campaigns = []
+        for c in reversed(blasts):
+            if campaign_filter and not campaign_filter.keep_unclassified(c):
+                continue
+            # technically the second value is the pub, but keeping key `dive_brand` for backwards compatability
+            c['dive_email_type'], c['dive_brand'] = self.classifier.classify(c)
+            if campaign_filter:
+                if not campaign_filter.keep(c):
+                    continue
+                c = campaign_filter.project(c)
+            campaigns.append(c)
         return campaigns
 
     def get_campaign_stats(self, blast_id, include_clickmap=False,
                            include_subject=False, include_click_times=False,
-                           include_urls=False, include_device=False):
+                           include_urls=False, include_device=False, compact=False):
         """ blast stats (opens clicks etc) for a given blast_id
+            With compact=True, click_times is returned as a timeseries.ClickTimeSeries (sorted
+            int arrays instead of a dict of epoch strings) and device/urls as
+            timeseries.StatsTable objects, which are much smaller and faster to aggregate.
             Results look like the following (depending on options)
             { 'beacon': 2559,
               'click': 97,
@@ -339,6 +399,8 @@ class DiveSailthruClient(SailthruClient):
         result = self.stats_blast(blast_id=blast_id, options=options)
         self.raise_exception_if_error(result)
 
+        if compact:
+            return compact_campaign_stats(result.json)
         return result.json
 
     def get_campaign_data(self, blast_id):
@@ -455,6 +517,222 @@ class DiveSailthruClient(SailthruClient):
             raise SailthruApiError("Job '%s' ended with unexpected status '%s'", job_id, job_result_json['status'])
         return job_result_json
 
+    def iter_enriched_campaigns(self, campaigns, include_data=True, include_stats=True, stats_options=None,
+                                max_workers=8, max_pending=None, collapse_ab_tests=True):
+        """
+        Add each campaign's get_campaign_data and get_campaign_stats results to the campaign
+        dicts from get_campaigns_in_range (or iter_campaigns_in_range), fetching both for many
+        campaigns at once over the worker pool.
+
+            campaigns = sailthru_client.iter_campaigns_in_range(start_date, end_date, prefetch=4)
+            for c in sailthru_client.iter_enriched_campaigns(campaigns, stats_options={'include_clickmap': True}):
+                report(c['campaign_data']['content_html'], c['campaign_stats'])
+
+        Each blast_id is fetched and yielded only once, so a blast listed twice (e.g. in
+        overlapping ranges) costs no extra requests. An A/B test's final blast and the copy
+        named by its copy_blast_id are also only fetched once, as the final (the blast with
+        blast_id == final_blast_id), unless collapse_ab_tests is False; the test's segments
+        are enriched as campaigns of their own. Other blasts of an A/B test are held back
+        until their final shows up, as one of them may be its copy. Keep final_blast_id and
+        copy_blast_id if campaigns were fetched with fields. At most max_pending campaigns
+        are fetched ahead of the caller, so campaigns can be a generator over a long range.
+
+        :param campaigns: iterable of campaign dicts with a blast_id
+        :param include_data: add get_campaign_data's result as 'campaign_data'
+        :param include_stats: add get_campaign_stats's result as 'campaign_stats'
+        :param dict stats_options: keyword arguments for get_campaign_stats, e.g. include_clickmap
+        :param max_workers: number of concurrent requests
+        :param max_pending: number of campaigns in flight, defaults to 2 * max_workers
+        :param collapse_ab_tests: enrich and yield an A/B test's final blast and its copy only once
+        :return: the enriched campaign dicts, in the order they complete. Raises the first
+            error, if any, after cancelling requests not yet started.
+        :rtype: generator
+        """
+        fetchers = self._enrichment_fetchers(include_data, include_stats, stats_options or {})
+        max_pending = max_pending or 2 * max_workers
+        campaigns = _unique_blasts(campaigns, collapse_ab_tests)
+        if not fetchers:
+            for c in campaigns:
+                yield c
+            return
+        futures = {}  # future -> (campaign, key to store its result under)
+        outstanding = {}  # blast_id -> number of fetches not done yet
+
+        def fill(executor):
+            while len(outstanding) < max_pending:
+                c = next(campaigns, None)
+                if c is None:
+                    return
+                outstanding[c['blast_id']] = len(fetchers)
+                for key, fetch in fetchers:
+                    futures[executor.submit(fetch, c['blast_id'])] = (c, key)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                fill(executor)
+                while futures:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        c, key = futures.pop(future)
+                        c[key] = future.result()
+                        outstanding[c['blast_id']] -= 1
+                        if not outstanding[c['blast_id']]:
+                            del outstanding[c['blast_id']]
+                            yield c
+                    fill(executor)
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def _enrichment_fetchers(self, include_data, include_stats, stats_options):
+        """ :return: (campaign key, function of blast_id) for each result iter_enriched_campaigns adds """
+        fetchers = []
+        if include_data:
+            fetchers.append(('campaign_data', self.get_campaign_data))
+        if include_stats:
+            fetchers.append(('campaign_stats', lambda blast_id: self.get_campaign_stats(blast_id, **stats_options)))
+        return fetchers
+
+    def get_users(self, user_ids, fields=None, key='email', max_workers=8, batch_size=100, retries=2, retry_delay=1):
+        """
+        Fetch many users with concurrent 'user' GET requests over the pooled transport.
+
+        :param user_ids: iterable of user ids (of type key)
+        :param fields: optional list of user fields to return, e.g. ['vars', 'lists']
+        :param key: the type of id in user_ids (e.g. 'email', 'sid', 'extid')
+        :param max_workers: number of concurrent requests
+        :param batch_size: number of users submitted to the worker pool at a time
+        :param retries: how many more times to try users whose request failed with a retryable
+            error (see bulk.RETRYABLE)
+        :param retry_delay: seconds to wait before the first retry, doubling each time
+        :return: a UserResult for each user, in the same order as user_ids. Users that could
+            not be fetched have data None and the raised exception (e.g. SailthruUserEmailError)
+            as error; see UserResult.status and bulk.partition_results.
+        :rtype: list[UserResult]
+        """
+        options = {'key': key}
+        if fields:
+            options['fields'] = dict((f, 1) for f in fields)
+
+        def get_one(user_id):
+            return self.get_user(user_id, options=options).json
+
+        return self._run_per_user(get_one, user_ids, max_workers, batch_size, retries=retries, retry_delay=retry_delay)
+
+    def set_users_vars(self, users_vars, key='email', max_workers=8, batch_size=100, job_threshold=1000,
+                       block_until_complete=True, retries=2, retry_delay=1, suppressions=None):
+        """
+        Set vars on many users. Below job_threshold users this sends concurrent 'user' POST
+        requests; at or above it, it submits a single 'update' job instead (see update_job).
+
+        :param dict users_vars: maps user id (of type key) to a dict of vars to set
+        :param key: the type of id used in users_vars (e.g. 'email', 'sid', 'extid')
+        :param max_workers: number of concurrent requests
+        :param batch_size: number of users submitted to the worker pool at a time
+        :param job_threshold: number of users at which to switch to the 'update' job
+        :param block_until_complete: for the job path, whether to wait for the job to finish
+        :param retries: see get_users
+        :param retry_delay: see get_users
+        :param suppressions: optional bulk.SuppressionCache of users to skip; users failing
+            with a SailthruUserEmailError are added to it
+        :return: a UserResult for each user. On the job path every user shares the job result
+            as data, since Sailthru does not report job outcomes per user.
+        :rtype: list[UserResult]
+        """
+        if len(users_vars) >= job_threshold:
+            stream = io.StringIO()
+            for user_id, user_vars in users_vars.items():
+                if suppressions is None or user_id not in suppressions:
+                    stream.write(u'%s\n' % json.dumps({'id': user_id, 'key': key, 'vars': user_vars}))
+            stream.seek(0)
+            job_result_json = self.update_job(update_file_stream=stream, block_until_complete=block_until_complete)
+            return [self._suppressed_result(user_id, suppressions) if suppressions is not None and user_id in suppressions
+                    else UserResult(user_id, job_result_json, None)
+                    for user_id in users_vars]
+
+        def set_one(user_id):
+            return self.save_user(user_id, options={'key': key, 'vars': users_vars[user_id]}).json
+
+        return self._run_per_user(set_one, list(users_vars), max_workers, batch_size, retries=retries,
+                                  retry_delay=retry_delay, suppressions=suppressions)
+
+    def send_many(self, template, emails, vars_by_email=None, options=None, max_workers=8, batch_size=100,
+                  retries=2, retry_delay=1, suppressions=None):
+        """
+        Send a template to many addresses with concurrent 'send' POST requests, one per address,
+        so that every address gets its own outcome instead of one bad address failing the batch.
+
+        :param template: template name
+        :param emails: iterable of email addresses
+        :param dict vars_by_email: optional email -> dict of replacement vars for that send
+        :param dict options: send options (e.g. replyto, test), the same for every send
+        :param max_workers: number of concurrent requests
+        :param batch_size: number of sends submitted to the worker pool at a time
+        :param retries: how many more times to try addresses whose send provably never reached
+            Sailthru (see bulk.request_not_received): connect errors and rate limiting. Other
+            RETRYABLE failures (read timeouts, dropped connections, internal errors) may have
+            been sent, so they are not retried; check before sending those again.
+        :param retry_delay: see get_users
+        :param suppressions: optional bulk.SuppressionCache of addresses to skip; addresses
+            failing with a SailthruUserEmailError (invalid, opted out, hardbounce, ...) are added to it
+        :return: a UserResult for each address, in order, with the send API response as data
+        :rtype: list[UserResult]
+        """
+        vars_by_email = vars_by_email or {}
+
+        def send_one(email):
+            return self.send(template, email, _vars=vars_by_email.get(email), options=options).json
+
+        return self._run_per_user(send_one, emails, max_workers, batch_size, retries=retries,
+                                  retry_delay=retry_delay, suppressions=suppressions,
+                                  retry_if=lambda result: request_not_received(result.error))
+
+    @staticmethod
+    def _suppressed_result(user_id, suppressions):
+        code = suppressions.code(user_id)
+        error = SailthruSuppressedUserError('Suppressed: %s (%s)' % (
+            SailthruUserEmailError.USER_EMAIL_ERROR_CODES.get(code, 'User may not be emailed'), code), code=code)
+        return UserResult(user_id, None, error)
+
+    def _run_per_user(self, func, user_ids, max_workers, batch_size, retries=0, retry_delay=1, suppressions=None,
+                      retry_if=None):
+        """
+        Call func(user_id) concurrently for each user, collecting a UserResult for each.
+        Users failing with a retryable error (or for which retry_if(result) is true) are tried
+        again (up to retries more times) after everyone else has had their turn, so a few slow
+        failures don't hold up the batch.
+        """
+        retry_if = retry_if or (lambda result: result.status == RETRYABLE)
+
+        def run_one(user_id):
+            try:
+                return UserResult(user_id, func(user_id), None)
+            except SailthruClientError as e:
+                if suppressions is not None and isinstance(e, SailthruUserEmailError):
+                    suppressions.add(user_id, e.code)
+                return UserResult(user_id, None, e)
+
+        user_ids = list(user_ids)
+        results = [None] * len(user_ids)
+        pending = []  # indexes of the users to send requests for
+        for i, user_id in enumerate(user_ids):
+            if suppressions is not None and user_id in suppressions:
+                results[i] = self._suppressed_result(user_id, suppressions)
+            else:
+                pending.append(i)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for attempt in six.moves.range(retries + 1):
+                if attempt:
+                    time.sleep(retry_delay * 2 ** (attempt - 1))
+                for batch in chunks(pending, batch_size):
+                    for i, result in six.moves.zip(batch, executor.map(run_one, [user_ids[i] for i in batch])):
+                        results[i] = result
+                pending = [i for i in pending if retry_if(results[i])]
+                if not pending:
+                    break
+        return results
+
     def api_post_with_binary_stream(self, action, data, binary_stream):
         """
         A wrapper around _http_request that lets you pass in opened streams and doesn't assume
@@ -510,7 +788,8 @@ class DiveSailthruClient(SailthruClient):
                     # We want to retry connection timeout errors only. Sailthru client
                     #   smushes the original exception from Requests into a string arg
                     #   so we need to test for it with string matching here.
-                    pass
+                    if self.profiler is not None:
+                        self.profiler.record_retry('GET', kwargs.get('action', args[0] if args else None))
                 else:
                     # If it wasn't a ConnectTimeoutError than don't retry
                     raise
@@ -523,3 +802,31 @@ class DiveSailthruClient(SailthruClient):
         self.raise_exception_if_error(response)
 
         return response
+
+    def _http_request(self, action, data, method, file_data=None, headers=None):
+        """
+        Override to send requests through our pooled transport instead of opening a new
+        connection for every call.
+        """
+        url = self.api_url + '/' + action
+        if self.profiler is None:
+            response = self.transport.request(url, data, method, file_data or {}, headers, self.request_timeout)
+        else:
+            response = self._profiled_request(action, url, data, method, file_data, headers)
+        self.last_rate_limit_info.setdefault(action, {})[method] = response.get_rate_limit_headers()
+        return response
+
+    def _profiled_request(self, action, url, data, method, file_data, headers):
+        """ transport.request, recording the request in self.profiler """
+        request = _request_params(data)
+        bytes_sent = len(data.get('json', ''))
+        start = time.perf_counter()
+        try:
+            response = self.transport.request(url, data, method, file_data or {}, headers, self.request_timeout)
+        except SailthruClientError:
+            self.profiler.record(method, action, time.perf_counter() - start, request, bytes_sent=bytes_sent, error=True)
+            raise
+        self.profiler.record(method, action, time.perf_counter() - start, request, bytes_sent=bytes_sent,
+                             bytes_received=len(response.get_response().content),
+                             decode_seconds=getattr(response, 'decode_seconds', 0.0))
+        return response
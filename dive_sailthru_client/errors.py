@@ -8,9 +8,24 @@ class SailthruApiError(SailthruClientError):
         when response.is_ok() is False. Since this is a subclass of
         SailthruClientError, any handlers already set up for that will
         catch this too.
+
+        code is Sailthru's error code when the error came from an API response.
     """
-    # TODO: add accessor for response_error object
-    pass
+
+    # Error codes that mean the request may well succeed if sent again later
+    RETRYABLE_ERROR_CODES = {
+                0: 'Response could not be parsed (e.g. a gateway error page)',
+                9: 'Internal Error',
+                43: 'Too many requests this minute',
+    }
+
+    def __init__(self, *args, **kwargs):
+        self.code = kwargs.pop('code', None)
+        super(SailthruApiError, self).__init__(*args, **kwargs)
+
+    @property
+    def retryable(self):
+        return self.code in self.RETRYABLE_ERROR_CODES
 
 
 class SailthruUserEmailError(SailthruClientError):
@@ -18,6 +33,8 @@ class SailthruUserEmailError(SailthruClientError):
     Custom Exception class for errors related to user email being invalid or
     otherwise not being able to be emailed. A common usage is that the user
     will stop trying to email when the API returns an error of this class.
+
+    code is Sailthru's error code, one of USER_EMAIL_ERROR_CODES.
     """
 
     # Definition of the error codes from Sailthru that we consider to be a user/email related error
@@ -31,3 +48,16 @@ class SailthruUserEmailError(SailthruClientError):
                 35: 'Email is a known hardbounce',
                 37: 'Email will only accept basic templates',
     }
+
+    def __init__(self, *args, **kwargs):
+        self.code = kwargs.pop('code', None)
+        super(SailthruUserEmailError, self).__init__(*args, **kwargs)
+
+
+class SailthruSuppressedUserError(SailthruUserEmailError):
+    """
+    Reported by the bulk user helpers, without calling the API, for a user that a
+    SuppressionCache already knows cannot be emailed. code is the error code of the
+    failure that got them suppressed.
+    """
+    pass
@@ -0,0 +1,49 @@
+from __future__ import absolute_import
+
+
+class CampaignFilter(object):
+    """
+    Which campaigns (and which of their fields) to keep from the 'blast' API, applied to
+    each page of results as it is parsed so that everything else can be freed right away.
+    See DiveSailthruClient.get_campaigns_in_range.
+
+        campaign_filter = CampaignFilter(publications=['Utility Dive'], min_sent_count=1000,
+                                         fields=['blast_id', 'name', 'start_time', 'dive_email_type'])
+        kept = campaign_filter.apply(campaigns)
+    """
+
+    def __init__(self, email_types=None, publications=None, min_sent_count=None, fields=None):
+        """
+        :param email_types: keep only campaigns with one of these dive_email_types
+        :param publications: keep only campaigns with one of these publications (dive_brand)
+        :param min_sent_count: keep only campaigns sent to at least this many addresses
+        :param fields: keep only these keys of each campaign (after dive_email_type and
+            dive_brand are added, so they can be kept or dropped too)
+        """
+        self.email_types = frozenset(email_types) if email_types is not None else None
+        self.publications = frozenset(publications) if publications is not None else None
+        self.min_sent_count = min_sent_count
+        self.fields = tuple(fields) if fields is not None else None
+
+    def __bool__(self):
+        return any(value is not None for value in (self.email_types, self.publications, self.min_sent_count, self.fields))
+
+    __nonzero__ = __bool__
+
+    def keep_unclassified(self, campaign):
+        """ Checks that don't need dive_email_type/dive_brand, to skip classifying campaigns we'll drop anyway """
+        return self.min_sent_count is None or (campaign.get('sent_count') or 0) >= self.min_sent_count
+
+    def keep(self, campaign):
+        """ Checks on a classified campaign """
+        return (self.email_types is None or campaign.get('dive_email_type') in self.email_types) and \
+            (self.publications is None or campaign.get('dive_brand') in self.publications)
+
+    def project(self, campaign):
+        if self.fields is None:
+            return campaign
+        return dict((field, campaign[field]) for field in self.fields if field in campaign)
+
+    def apply(self, campaigns):
+        """ :return: the kept campaigns of an iterable of classified campaigns, projected """
+        return [self.project(c) for c in campaigns if self.keep_unclassified(c) and self.keep(c)]
@@ -0,0 +1,317 @@
+from __future__ import absolute_import
+import json
+import sqlite3
+import threading
+import time
+from .workers import register_after_fork
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS counters (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS blasts (
+    blast_id INTEGER PRIMARY KEY,
+    publication TEXT
+);
+CREATE INDEX IF NOT EXISTS blasts_publication ON blasts (publication);
+CREATE TABLE IF NOT EXISTS snapshots (
+    blast_id INTEGER NOT NULL,
+    taken_at INTEGER NOT NULL,
+    keyframe INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (blast_id, taken_at)
+) WITHOUT ROWID;
+'''
+
+
+def flatten_counters(stats, prefix=()):
+    """
+    Yield (path, value) for every integer counter in a get_campaign_stats result, where
+    path is a tuple of keys, e.g. (('total', 'open_total'), 3404). Clickmap entries are keyed
+    by 'url#ix' rather than list position. Strings and other non-counters are skipped.
+    """
+    if hasattr(stats, 'to_dict'):  # compact ClickTimeSeries / StatsTable
+        stats = stats.to_dict()
+    if isinstance(stats, dict):
+        for key, value in stats.items():
+            for item in flatten_counters(value, prefix + (str(key),)):
+                yield item
+    elif isinstance(stats, list):
+        for i, value in enumerate(stats):
+            key = '%s#%s' % (value['url'], value.get('ix', '')) if isinstance(value, dict) and 'url' in value else str(i)
+            for item in flatten_counters(value, prefix + (key,)):
+                yield item
+    elif isinstance(stats, int) and not isinstance(stats, bool):
+        yield prefix, stats
+
+
+def _unflatten(counters):
+    stats = {}
+    for path, value in counters.items():
+        node = stats
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = value
+    return stats
+
+
+def _encode(deltas):
+    """
+    Pack sorted (counter id, delta) pairs as varints: the gap from the previous counter id,
+    then the zigzag-encoded delta. Unchanged counters take no space at all.
+    """
+    data = bytearray()
+    previous_id = 0
+    for counter_id, delta in deltas:
+        for number in (counter_id - previous_id, delta * 2 if delta >= 0 else -delta * 2 - 1):
+            while number > 0x7f:
+                data.append((number & 0x7f) | 0x80)
+                number >>= 7
+            data.append(number)
+        previous_id = counter_id
+    return bytes(data)
+
+
+def _decode(data):
+    """ Inverse of _encode: yield (counter id, delta) """
+    numbers = []
+    number = shift = 0
+    for byte in bytearray(data):
+        number |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            numbers.append(number)
+            number = shift = 0
+    counter_id = 0
+    for gap, zigzag in zip(numbers[::2], numbers[1::2]):
+        counter_id += gap
+        yield counter_id, (zigzag >> 1) ^ -(zigzag & 1)
+
+
+def _path(path):
+    """
+    A dotted string path is split on its first and last dots only, so the key in between may
+    be a url: 'clickmap.https://www.utilitydive.com/news/#0.count'
+    """
+    if not isinstance(path, str):
+        return tuple(path)
+    keys = path.split('.')
+    if len(keys) > 3:
+        keys = [keys[0], '.'.join(keys[1:-1]), keys[-1]]
+    return tuple(keys)
+
+
+class StatsHistory(object):
+    """
+    Local store of repeated get_campaign_stats snapshots that keeps only what changed.
+
+        history = StatsHistory('stats_history.sqlite')
+        history.add(blast_id, sailthru_client.get_campaign_stats(blast_id), publication='Utility Dive')
+        ...
+        history.stats_at(blast_id, some_epoch)              # counters as of that time
+        history.growth(blast_id, 'total.open_total')        # [(taken_at, opens), ...]
+        history.publication_growth('Utility Dive', 'total.click_total', times)
+
+    Each snapshot is stored as the difference from the blast's previous one: (counter, delta)
+    pairs for the counters that changed, varint encoded, in a SQLite file. Counter paths are
+    stored once and referred to by id. Every keyframe_interval-th snapshot of a blast stores
+    all counters instead, so rebuilding any point in time reads at most that many rows.
+
+    Only integer counters are kept (not subjects or other strings), and reconstructed stats
+    are nested dicts of them; clickmap lists come back as dicts keyed by 'url#ix'. A counter
+    missing from a later snapshot reads as 0 until the next keyframe.
+    Snapshots of a blast must be added in time order. Safe to share between threads, and
+    forked processes reopen the database file; an in-memory (':memory:') history is private
+    to the process that made it and can't be used in a forked child.
+    """
+
+    keyframe_interval = 32
+
+    def __init__(self, path):
+        """ :param path: SQLite database file, created if missing (or ':memory:') """
+        self.path = path
+        self._lock = threading.RLock()
+        self._open()
+        register_after_fork(self)
+
+    @property
+    def _db(self):
+        if self._connection is None:
+            raise RuntimeError("StatsHistory(%r) was created in another process; an in-memory history can't be "
+                               "shared with forked processes, use a database file" % self.path)
+        return self._connection
+
+    def _open(self):
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._counter_ids = dict((tuple(json.loads(path)), counter_id)
+                                 for counter_id, path in self._db.execute('SELECT id, path FROM counters'))
+        self._counter_paths = dict((counter_id, path) for path, counter_id in self._counter_ids.items())
+        self._latest = {}  # blast_id -> (taken_at, snapshot count, {counter id: value}), recently added blasts
+
+    def _after_fork(self):
+        # SQLite connections must not be used across a fork
+        self._lock = threading.RLock()
+        if self.path in (':memory:', ''):
+            # reopening would give an empty database, silently losing the history
+            self._connection = None
+            self._latest = {}
+        else:
+            self._open()
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _counter_id(self, path):
+        counter_id = self._counter_ids.get(path)
+        if counter_id is None:
+            counter_id = self._db.execute('INSERT INTO counters (path) VALUES (?)', (json.dumps(path),)).lastrowid
+            self._counter_ids[path] = counter_id
+            self._counter_paths[counter_id] = path
+        return counter_id
+
+    def _replay(self, rows):
+        """ Counter values after applying rows of (keyframe, data), oldest first """
+        values = {}
+        for keyframe, data in rows:
+            if keyframe:
+                values = {}
+            for counter_id, delta in _decode(data):
+                values[counter_id] = values.get(counter_id, 0) + delta
+        return values
+
+    def _rows_until(self, blast_id, at):
+        """ Rows from the last keyframe at or before at through the last snapshot at or before at """
+        return self._db.execute(
+            'SELECT keyframe, data FROM snapshots WHERE blast_id = ? AND taken_at <= ? AND taken_at >= '
+            '(SELECT COALESCE(MAX(taken_at), 0) FROM snapshots WHERE blast_id = ? AND keyframe AND taken_at <= ?) '
+            'ORDER BY taken_at', (blast_id, at, blast_id, at)).fetchall()
+
+    def _latest_state(self, blast_id):
+        latest = self._latest.get(blast_id)
+        if latest is None:
+            taken_at, count = self._db.execute('SELECT MAX(taken_at), COUNT(*) FROM snapshots WHERE blast_id = ?',
+                                               (blast_id,)).fetchone()
+            values = self._replay(self._rows_until(blast_id, taken_at)) if count else {}
+            latest = (taken_at, count, values)
+        return latest
+
+    def add(self, blast_id, stats, taken_at=None, publication=None):
+        """
+        Record a snapshot of a blast's stats.
+
+        :param stats: get_campaign_stats result (plain or compact)
+        :param taken_at: epoch seconds of the snapshot, defaults to now
+        :param publication: the blast's publication (dive_brand), for publication_growth
+        :return: number of counters stored for this snapshot (those that changed, or all of them for a keyframe)
+        """
+        taken_at = int(time.time() if taken_at is None else taken_at)
+        with self._lock, self._db:
+            last_taken_at, count, previous = self._latest_state(blast_id)
+            if count and taken_at <= last_taken_at:
+                raise ValueError("Snapshot at %d for blast %s is not after its latest one (%d)"
+                                 % (taken_at, blast_id, last_taken_at))
+            values = dict((self._counter_id(path), value) for path, value in flatten_counters(stats))
+            keyframe = count % self.keyframe_interval == 0
+            if keyframe:
+                deltas = sorted(values.items())
+            else:
+                # counters missing from this snapshot go back to 0; new ones are stored even at 0
+                deltas = sorted((counter_id, values.get(counter_id, 0) - previous.get(counter_id, 0))
+                                for counter_id in set(values) | set(previous))
+                deltas = [(counter_id, delta) for counter_id, delta in deltas if delta or counter_id not in previous]
+            self._db.execute('INSERT INTO snapshots VALUES (?, ?, ?, ?)',
+                             (blast_id, taken_at, int(keyframe), sqlite3.Binary(_encode(deltas))))
+            if publication is not None or not count:
+                self._db.execute('INSERT OR REPLACE INTO blasts VALUES (?, ?)', (blast_id, publication))
+            if len(self._latest) >= 1000:
+                self._latest = {}
+            if not keyframe:
+                # what _replay would give: every counter since the keyframe, missing ones at 0
+                latest_values = dict.fromkeys(previous, 0)
+                latest_values.update(values)
+                values = latest_values
+            self._latest[blast_id] = (taken_at, count + 1, values)
+        return len(deltas)
+
+    def snapshot_times(self, blast_id):
+        """ :rtype: list[int] """
+        with self._lock:
+            return [row[0] for row in self._db.execute(
+                'SELECT taken_at FROM snapshots WHERE blast_id = ? ORDER BY taken_at', (blast_id,))]
+
+    def blasts(self, publication=None):
+        """ :return: ids of the blasts with snapshots, optionally only for one publication """
+        with self._lock:
+            if publication is None:
+                return [row[0] for row in self._db.execute('SELECT blast_id FROM blasts ORDER BY blast_id')]
+            return [row[0] for row in self._db.execute(
+                'SELECT blast_id FROM blasts WHERE publication = ? ORDER BY blast_id', (publication,))]
+
+    def stats_at(self, blast_id, at=None):
+        """
+        :param at: epoch seconds, defaults to the latest snapshot
+        :return: the blast's counters as of its last snapshot at or before at (as nested dicts
+            like get_campaign_stats), or None if there was none yet
+        :rtype: dict|None
+        """
+        with self._lock:
+            rows = self._rows_until(blast_id, at if at is not None else 1 << 62)
+            if not rows:
+                return None
+            values = self._replay(rows)
+            return _unflatten(dict((self._counter_paths[counter_id], value) for counter_id, value in values.items()))
+
+    def growth(self, blast_id, path):
+        """
+        :param path: counter path, as a tuple of keys or dotted string, e.g. 'total.open_total'
+            or 'clickmap.https://www.utilitydive.com/a#1.count'
+        :return: the counter's value at each snapshot
+        :rtype: list[tuple]
+        """
+        with self._lock:
+            counter_id = self._counter_ids.get(_path(path))
+            rows = self._db.execute('SELECT taken_at, keyframe, data FROM snapshots WHERE blast_id = ? ORDER BY taken_at',
+                                    (blast_id,)).fetchall()
+        curve = []
+        value = 0
+        for taken_at, keyframe, data in rows:
+            if keyframe:
+                value = 0
+            for row_counter_id, delta in _decode(data):
+                if row_counter_id == counter_id:
+                    value += delta
+            curve.append((taken_at, value))
+        return curve
+
+    def publication_growth(self, publication, path, times):
+        """
+        Sum a counter over all of a publication's blasts at each of the given times, using
+        every blast's latest snapshot at or before each time.
+
+        :param times: ascending epoch seconds
+        :return: [(time, total), ...]
+        :rtype: list[tuple]
+        """
+        times = list(times)
+        totals = [0] * len(times)
+        for blast_id in self.blasts(publication):
+            curve = self.growth(blast_id, path)
+            i = 0
+            value = 0
+            for t_index, t in enumerate(times):
+                while i < len(curve) and curve[i][0] <= t:
+                    value = curve[i][1]
+                    i += 1
+                totals[t_index] += value
+        return list(zip(times, totals))
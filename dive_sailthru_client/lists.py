@@ -0,0 +1,157 @@
+from __future__ import absolute_import
+from collections import namedtuple
+from .classification import infer_list_publication
+from .workers import register_after_fork
+import threading
+import time
+
+
+# What changed between two fetches of the list catalog. Each field is a sorted list of list names.
+ListChanges = namedtuple('ListChanges', ['added', 'removed', 'changed'])
+
+
+class ListCatalog(object):
+    """
+    Cached, indexed view of our primary lists (see DiveSailthruClient.get_primary_lists).
+
+    List metadata rarely changes, so instead of calling the 'list' endpoint every time we
+    keep the last result for ttl seconds. Once it is stale the next lookup kicks off a
+    refresh in a background thread and keeps serving the cached data until the refresh
+    finishes, so callers never wait on the API except for the very first load.
+
+    Usage:
+        catalog = ListCatalog(sailthru_client, ttl=3600)
+        if 'Utility Dive' in catalog:
+            sailthru_client.export_list('Utility Dive')
+        catalog.by_publication('Utility Dive')  # Utility Dive, its weekender, blast lists...
+    """
+
+    def __init__(self, sailthru_client, ttl=3600, background_refresh=True, on_change=None, ignore_fields=None):
+        """
+        :param DiveSailthruClient sailthru_client: client used to fetch the lists
+        :param ttl: seconds before the cached lists are considered stale
+        :param background_refresh: if False, stale lookups refresh synchronously instead
+        :param on_change: optional callable, called with a ListChanges whenever a refresh
+            finds that lists were added, removed or modified
+        :param ignore_fields: list fields whose changes don't count as the list being modified.
+            Defaults to the counters (email_count, valid_count and every other field ending in
+            _count), which change with every signup; pass () to compare every field.
+        """
+        self.sailthru_client = sailthru_client
+        self.ttl = ttl
+        self.background_refresh = background_refresh
+        self.on_change = on_change
+        self.ignore_fields = frozenset(ignore_fields) if ignore_fields is not None else None
+        self.last_refresh_time = None
+        self.last_refresh_error = None
+        # (lists_by_name, names_by_publication), swapped as a whole so readers never see a
+        # half-updated index
+        self._index = ({}, {})
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+        register_after_fork(self)
+
+    def _after_fork(self):
+        # The cached lists are still good in the child, but a refresh thread running in the
+        # parent at fork time does not exist here and may have been holding the lock.
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+
+    def _metadata(self, list_data):
+        """ list_data without the fields ignored when looking for changes """
+        if self.ignore_fields is None:
+            return dict((key, value) for key, value in list_data.items() if not key.endswith('_count'))
+        return dict((key, value) for key, value in list_data.items() if key not in self.ignore_fields)
+
+    def refresh(self):
+        """
+        Fetch the primary lists now and rebuild the indexes.
+
+        :return: what changed since the previous fetch (all lists are "added" on the first fetch)
+        :rtype: ListChanges
+        """
+        lists_by_name = dict((list_data['name'], list_data) for list_data in self.sailthru_client.get_primary_lists())
+        names_by_publication = {}
+        for name in lists_by_name:
+            names_by_publication.setdefault(infer_list_publication(name), []).append(name)
+        for names in names_by_publication.values():
+            names.sort()
+
+        with self._lock:
+            old_lists_by_name = self._index[0]
+            self._index = (lists_by_name, names_by_publication)
+            self.last_refresh_time = time.time()
+
+        changes = ListChanges(
+            added=sorted(set(lists_by_name) - set(old_lists_by_name)),
+            removed=sorted(set(old_lists_by_name) - set(lists_by_name)),
+            changed=sorted(name for name in set(lists_by_name) & set(old_lists_by_name)
+                           if self._metadata(lists_by_name[name]) != self._metadata(old_lists_by_name[name])),
+        )
+        if self.on_change and (changes.added or changes.removed or changes.changed):
+            self.on_change(changes)
+        return changes
+
+    def is_stale(self):
+        return self.last_refresh_time is None or time.time() - self.last_refresh_time >= self.ttl
+
+    def _ensure_fresh(self):
+        if not self.is_stale():
+            return
+        if self.last_refresh_time is None or not self.background_refresh:
+            # nothing cached yet (or caller wants fresh data), so we have to wait
+            self.refresh()
+            return
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self._background_refresh, name='ListCatalog-refresh')
+            self._refresh_thread.daemon = True
+            self._refresh_thread.start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            # Keep serving the cached lists; the next stale lookup will try again.
+            self.last_refresh_error = e
+
+    def get(self, list_name):
+        """
+        :return: the Sailthru list data dict for list_name, or None if it isn't a primary list
+        :rtype: dict|None
+        """
+        self._ensure_fresh()
+        return self._index[0].get(list_name)
+
+    def __contains__(self, list_name):
+        return self.get(list_name) is not None
+
+    def __len__(self):
+        self._ensure_fresh()
+        return len(self._index[0])
+
+    def names(self):
+        """ :rtype: list[string] """
+        self._ensure_fresh()
+        return sorted(self._index[0])
+
+    def lists(self):
+        """ :rtype: list[dict] """
+        self._ensure_fresh()
+        lists_by_name = self._index[0]
+        return [lists_by_name[name] for name in sorted(lists_by_name)]
+
+    def publications(self):
+        """ :return: all publications inferred from the list names (see infer_list_publication) """
+        self._ensure_fresh()
+        return sorted(publication for publication in self._index[1] if publication is not None)
+
+    def by_publication(self, publication):
+        """
+        :return: the list data dicts of all lists whose inferred publication is publication
+        :rtype: list[dict]
+        """
+        self._ensure_fresh()
+        lists_by_name, names_by_publication = self._index
+        return [lists_by_name[name] for name in names_by_publication.get(publication, [])]
@@ -0,0 +1,197 @@
+from __future__ import absolute_import
+import heapq
+import json
+import math
+import threading
+
+
+def percentile(sorted_values, fraction):
+    """ Nearest-rank percentile of an ascending sequence, e.g. percentile(latencies, 0.95) """
+    if not sorted_values:
+        return None
+    rank = int(math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+class LatencyHistogram(object):
+    """
+    Latencies in logarithmic buckets 1% wide, each with its count and sum, so percentiles
+    are within about 1% of the true value while memory depends only on the range of
+    latencies seen (a few hundred buckets from milliseconds to minutes), not on how many
+    there were.
+    """
+    _LOG_BUCKET_WIDTH = math.log(1.01)
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = None
+        self._buckets = {}  # bucket number -> [count, sum of latencies]
+
+    def add(self, seconds):
+        bucket = int(math.floor(math.log(max(seconds, 1e-9)) / self._LOG_BUCKET_WIDTH))
+        entry = self._buckets.get(bucket)
+        if entry is None:
+            entry = self._buckets[bucket] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+        self.count += 1
+        self.total += seconds
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def percentile(self, fraction):
+        """ Nearest-rank percentile, as the mean latency of the bucket it falls in """
+        if not self.count:
+            return None
+        rank = min(max(int(math.ceil(fraction * self.count)), 1), self.count)
+        for bucket in sorted(self._buckets):
+            count, total = self._buckets[bucket]
+            rank -= count
+            if rank <= 0:
+                return total / count
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class _ActionStats(object):
+    """ What RequestProfiler collects for one (method, action) """
+
+    def __init__(self):
+        self.latencies = LatencyHistogram()
+        self.errors = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.decode_seconds = 0.0
+        self.slowest = []  # min-heap of (seconds, sequence number, request description)
+
+
+class RequestProfiler(object):
+    """
+    Collects per-request timings from a DiveSailthruClient over a run and summarizes them
+    per API action: latency percentiles, bytes sent and received, JSON decode time, retries,
+    errors, and outliers (single requests far slower than is usual for their action).
+
+        profiler = RequestProfiler()
+        sailthru_client = DiveSailthruClient(api_key, secret, profiler=profiler)
+        ...nightly job...
+        print(profiler.format_report())
+        profiler.dump('profile.json')
+
+    Requests are described by their JSON parameters (e.g. a 'blast' window's dates and list,
+    or a 'stats' blast_id), so outliers point at the window, list or blast that was slow.
+    Latency is measured around the transport call, so it includes connection setup,
+    download and decoding. Memory stays bounded however long the run (see LatencyHistogram).
+    Safe to share between threads and clients. A pickled copy (e.g. a client sent to a worker
+    process) has the same settings but starts with nothing recorded.
+    """
+
+    def __init__(self, outlier_factor=5.0, min_outlier_seconds=1.0, max_outliers=10):
+        """
+        :param outlier_factor: a request is an outlier if it took this many times its action's median
+        :param min_outlier_seconds: ...and at least this long
+        :param max_outliers: slowest requests kept per action to report outliers from
+        """
+        self.outlier_factor = outlier_factor
+        self.min_outlier_seconds = min_outlier_seconds
+        self.max_outliers = max_outliers
+        self._actions = {}
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # the lock can't be pickled, so send only our settings to other processes
+        return {'outlier_factor': self.outlier_factor, 'min_outlier_seconds': self.min_outlier_seconds,
+                'max_outliers': self.max_outliers}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _stats(self, method, action):
+        key = '%s %s' % (method.upper(), action)
+        stats = self._actions.get(key)
+        if stats is None:
+            stats = self._actions[key] = _ActionStats()
+        return stats
+
+    def record(self, method, action, seconds, request=None, bytes_sent=0, bytes_received=0, decode_seconds=0.0,
+               error=False):
+        """
+        Record one request. Called by DiveSailthruClient._http_request.
+
+        :param request: description of the request for outlier reports, e.g. its JSON parameters
+        :param error: whether the request failed without a response (e.g. a connection error)
+        """
+        with self._lock:
+            stats = self._stats(method, action)
+            stats.latencies.add(seconds)
+            stats.errors += bool(error)
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+            stats.decode_seconds += decode_seconds or 0.0
+            self._sequence += 1
+            entry = (seconds, self._sequence, request)
+            if len(stats.slowest) < self.max_outliers:
+                heapq.heappush(stats.slowest, entry)
+            elif seconds > stats.slowest[0][0]:
+                heapq.heapreplace(stats.slowest, entry)
+
+    def record_retry(self, method, action):
+        with self._lock:
+            self._stats(method, action).retries += 1
+
+    def reset(self):
+        with self._lock:
+            self._actions = {}
+
+    def report(self):
+        """
+        :return: '<METHOD> <action>' -> summary dict, with latencies in seconds
+        :rtype: dict
+        """
+        with self._lock:
+            actions = list(self._actions.items())
+        report = {}
+        for key, stats in sorted(actions):
+            latencies = stats.latencies
+            median = latencies.percentile(0.5)
+            threshold = max((median or 0) * self.outlier_factor, self.min_outlier_seconds)
+            report[key] = {
+                'requests': latencies.count,
+                'errors': stats.errors,
+                'retries': stats.retries,
+                'seconds': {
+                    'total': latencies.total,
+                    'p50': median,
+                    'p95': latencies.percentile(0.95),
+                    'p99': latencies.percentile(0.99),
+                    'max': latencies.max,
+                },
+                'bytes_sent': stats.bytes_sent,
+                'bytes_received': stats.bytes_received,
+                'decode_seconds': stats.decode_seconds,
+                'outliers': [{'seconds': seconds, 'request': request}
+                             for seconds, _, request in sorted(stats.slowest, reverse=True) if seconds >= threshold],
+            }
+        return report
+
+    def dump(self, path):
+        """ Write report() to path as JSON """
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2, sort_keys=True)
+
+    def format_report(self):
+        """ :return: report() as a plain text table, slowest actions (by total time) first """
+        report = self.report()
+        lines = ['%-24s %8s %6s %7s %8s %8s %8s %8s %10s %8s' % (
+            'action', 'requests', 'errors', 'retries', 'total s', 'p50 s', 'p95 s', 'p99 s', 'MB in', 'decode s')]
+        for key, summary in sorted(report.items(), key=lambda item: -item[1]['seconds']['total']):
+            seconds = summary['seconds']
+            lines.append('%-24s %8d %6d %7d %8.1f %8.3f %8.3f %8.3f %10.2f %8.2f' % (
+                key, summary['requests'], summary['errors'], summary['retries'], seconds['total'],
+                seconds['p50'] or 0, seconds['p95'] or 0, seconds['p99'] or 0,
+                summary['bytes_received'] / 1e6, summary['decode_seconds']))
+            for outlier in summary['outliers']:
+                lines.append('    outlier %.2fs %s' % (outlier['seconds'], json.dumps(outlier['request'], sort_keys=True)))
+        return '\n'.join(lines)
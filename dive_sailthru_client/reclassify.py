@@ -0,0 +1,198 @@
+from __future__ import absolute_import
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+import gzip
+import io
+import itertools
+import json
+import os
+from .classification import RuleClassifier
+
+# Lines per task sent to the worker processes: big enough that pickling and scheduling are
+# noise next to the JSON work, small enough to keep every process busy on a single file
+DEFAULT_BATCH_LINES = 10000
+
+# The current worker process's classifier and the rules it was built from, so that it is
+# built once per process rather than once per task (ProcessPoolExecutor only has an
+# initializer from Python 3.7)
+_worker_classifier = (None, None)
+
+
+def _get_classifier(rules):
+    global _worker_classifier
+    if _worker_classifier[0] is None or _worker_classifier[1] != rules:
+        _worker_classifier = (RuleClassifier(rules), rules)
+    return _worker_classifier[0]
+
+
+def _open(path, mode, compressed):
+    return gzip.open(path, mode) if compressed else open(path, mode)
+
+
+def _gzip(data):
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=6) as f:
+        f.write(data)
+    return buf.getvalue()
+
+
+def _read_batches(paths, batch_lines):
+    """ Yield (index of the file in paths, list of lines) for every batch_lines lines of every file """
+    for index, path in enumerate(paths):
+        with _open(path, 'rb', path.endswith('.gz')) as f:
+            while True:
+                lines = list(itertools.islice(f, batch_lines))
+                if not lines:
+                    break
+                yield index, lines
+
+
+def _reclassify_batch(rules, index, lines, compress):
+    """
+    Reclassify a batch of archive lines. Runs in a worker process. Lines whose classification
+    didn't change (and blank lines) are passed through byte for byte; changed campaigns keep
+    their key order.
+
+    :return: (index, output bytes (a gzip member if compress), campaigns, publication changes,
+        Counter of (old, new) email type changes)
+    """
+    classifier = _get_classifier(rules)
+    transitions = Counter()
+    campaigns = publication_changes = 0
+    out_lines = []
+    for line in lines:
+        if line.strip():
+            campaigns += 1
+            campaign = json.loads(line)
+            old_type, old_brand = campaign.get('dive_email_type'), campaign.get('dive_brand')
+            new_type, new_brand = classifier.classify(campaign)
+            if (new_type, new_brand) != (old_type, old_brand):
+                transitions[(old_type, new_type)] += new_type != old_type
+                publication_changes += new_brand != old_brand
+                campaign['dive_email_type'], campaign['dive_brand'] = new_type, new_brand
+                line = json.dumps(campaign).encode('utf-8') + (b'\n' if line.endswith(b'\n') else b'')
+        out_lines.append(line)
+    data = b''.join(out_lines)
+    return index, _gzip(data) if compress else data, campaigns, publication_changes, +transitions
+
+
+def _map_in_order(executor, func, tasks, window):
+    """
+    Like executor.map(func, *zip(*tasks)), but with at most window tasks submitted ahead of
+    the results consumed, so tasks (and the files behind them) are read only as needed
+    """
+    pending = deque()
+    try:
+        for args in tasks:
+            if len(pending) >= window:
+                yield pending.popleft().result()
+            pending.append(executor.submit(func, *args))
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _output_paths(paths, output_dir):
+    out_paths = [os.path.join(output_dir, os.path.basename(path)) for path in paths]
+    in_paths = set(os.path.abspath(path) for path in paths)
+    seen_out_paths = set()
+    for path, out_path in zip(paths, out_paths):
+        if os.path.abspath(out_path) in in_paths:
+            raise ValueError("Output %s would overwrite an input" % out_path)
+        if out_path in seen_out_paths:
+            raise ValueError("More than one input is named %s; reclassify them into different output "
+                             "directories" % os.path.basename(path))
+        seen_out_paths.add(out_path)
+    return out_paths
+
+
+class _PartFiles(object):
+    """ Writes output files one after the other as '.part' files, renamed by commit() """
+
+    def __init__(self, out_paths):
+        self.out_paths = out_paths
+        self.part_paths = [out_path + '.part' for out_path in out_paths]
+        self._file = None
+        self._current = -1  # index of the file being written
+
+    def _switch_to(self, index):
+        while self._current < index:
+            self._close()
+            self._current += 1
+            self._file = open(self.part_paths[self._current], 'wb')
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def write(self, index, data):
+        self._switch_to(index)
+        self._file.write(data)
+
+    def commit(self):
+        self._switch_to(len(self.out_paths) - 1)  # files with no lines at all come out empty too
+        self._close()
+        for part_path, out_path in zip(self.part_paths, self.out_paths):
+            os.replace(part_path, out_path)
+
+    def discard(self):
+        self._close()
+        for part_path in self.part_paths:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+
+def reclassify_archives(paths, output_dir, rules=None, processes=None, batch_lines=DEFAULT_BATCH_LINES):
+    """
+    Rewrite JSON lines campaign archives with dive_email_type and dive_brand recomputed by
+    the given rules, spreading the work over a pool of processes.
+
+        report = reclassify_archives(glob.glob('archive/*.jsonl.gz'), 'reclassified/',
+                                     rules=json.load(open('rules.json')))
+
+    This process reads (and decompresses) the archives and hands out batches of batch_lines
+    lines; the workers parse, classify, re-serialize and, for gzipped archives, compress
+    them, and the results are written in input order. So even a single big gzipped archive
+    keeps every process busy. Output files keep their input's name and compression (gzipped
+    output is one gzip member per batch, which gzip readers treat as one stream). They are
+    written to temporary '.part' files, renamed once everything succeeded and removed if not.
+    The campaigns need the fields the rules look at (name, list, subject, labels).
+
+    :param paths: archive files (.jsonl, or .jsonl.gz), with different file names
+    :param output_dir: directory to write the reclassified files to (not the input directory)
+    :param rules: rule table (see classification.DEFAULT_RULES), defaults to the built in rules
+    :param processes: number of worker processes, defaults to the number of CPUs
+    :param batch_lines: lines per task
+    :return: {'campaigns': n, 'email_type_changed': n, 'publication_changed': n,
+        'transitions': {(old email type, new email type): n}}
+    :rtype: dict
+    """
+    paths = list(paths)
+    out_paths = _output_paths(paths, output_dir)
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    report = {'campaigns': 0, 'email_type_changed': 0, 'publication_changed': 0, 'transitions': Counter()}
+    part_files = _PartFiles(out_paths)
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            tasks = ((rules, index, lines, paths[index].endswith('.gz'))
+                     for index, lines in _read_batches(paths, batch_lines))
+            # enough tasks in flight for every worker to have the next one queued
+            window = 2 * (processes or os.cpu_count() or 1)
+            for index, data, campaigns, publication_changes, transitions in _map_in_order(
+                    executor, _reclassify_batch, tasks, window):
+                part_files.write(index, data)
+                report['campaigns'] += campaigns
+                report['publication_changed'] += publication_changes
+                report['transitions'].update(transitions)
+        part_files.commit()
+    except BaseException:
+        part_files.discard()
+        raise
+
+    report['email_type_changed'] = sum(report['transitions'].values())
+    report['transitions'] = dict(report['transitions'])
+    return report
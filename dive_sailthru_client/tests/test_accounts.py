@@ -0,0 +1,102 @@
+from __future__ import absolute_import
+from unittest import TestCase
+from dive_sailthru_client.accounts import AccountPool, RateLimiter
+from sailthru.sailthru_response import SailthruResponse
+from mock import patch
+from nose.plugins.attrib import attr
+import datetime
+import json
+import requests
+import threading
+
+
+class FakeAccounts(object):
+    """ Shared transport answering 'blast' list requests with one campaign per account and window """
+
+    def __init__(self):
+        self.api_keys = []
+        self._lock = threading.Lock()
+
+    def request(self, url, data, method, file_data=None, headers=None, request_timeout=10):
+        params = json.loads(data['json'])
+        with self._lock:
+            self.api_keys.append(data['api_key'])
+        send_hour = 9 if data['api_key'] == 'dive-key' else 8
+        blast = {'blast_id': len(self.api_keys), 'name': '%s-blast-x' % data['api_key'], 'list': 'Utility Dive Blast List',
+                 'start_time': '%s %02d:00:00 -0000' % (
+                     datetime.datetime.strptime(params['start_date'], '%Y-%m-%d').strftime('%a, %d %b %Y'), send_hour)}
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({'blasts': [blast], 'filtered_count': 1}).encode('utf-8')
+        return SailthruResponse(response)
+
+
+@attr('unittest')
+class TestAccountPool(TestCase):
+
+    def setUp(self):
+        self.transport = FakeAccounts()
+        self.pool = AccountPool({
+            'dive': {'api_key': 'dive-key', 'secret': 'a'},
+            'events': {'api_key': 'events-key', 'secret': 'b', 'rate_limit': 1000},
+        }, transport=self.transport)
+        self.addCleanup(self.pool.close)
+
+    def test_clients_share_transport(self):
+        self.assertEqual(self.pool.accounts(), ['dive', 'events'])
+        self.assertIs(self.pool.client('dive').transport.transport, self.transport)
+        self.assertIs(self.pool.client('events').transport.transport, self.transport)
+        self.assertIsNone(self.pool.client('dive').transport.limiter.rate)
+        self.assertEqual(self.pool.client('events').transport.limiter.rate, 1000)
+
+    def test_get_campaigns_in_range_merges_accounts_by_send_time(self):
+        campaigns = self.pool.get_campaigns_in_range(datetime.date(2020, 1, 1), datetime.date(2020, 3, 1))
+        self.assertEqual(sorted(self.transport.api_keys), ['dive-key', 'dive-key', 'events-key', 'events-key'])
+        self.assertEqual([(c['account'], c['start_time']) for c in campaigns], [
+            ('events', 'Wed, 01 Jan 2020 08:00:00 -0000'),
+            ('dive', 'Wed, 01 Jan 2020 09:00:00 -0000'),
+            ('events', 'Fri, 31 Jan 2020 08:00:00 -0000'),
+            ('dive', 'Fri, 31 Jan 2020 09:00:00 -0000'),
+        ])
+        self.assertEqual(campaigns[0]['dive_email_type'], 'blast')
+
+    def test_limited_account_does_not_hold_up_others(self):
+        transport = FakeAccounts()
+        pool = AccountPool({
+            'a-limited': {'api_key': 'limited-key', 'secret': 'a', 'rate_limit': 10},
+            'b-free': {'api_key': 'free-key', 'secret': 'b'},
+        }, max_workers=2, transport=transport)
+        self.addCleanup(pool.close)
+        campaigns = pool.get_campaigns_in_range(datetime.date(2020, 1, 1), datetime.date(2020, 7, 1))
+        self.assertEqual(len(campaigns), 14)
+        # the limited account's 7 windows take 0.6s of waiting, but only in its own worker:
+        # the other account's windows all went out while it waited
+        self.assertEqual(sorted(transport.api_keys[:2]), ['free-key', 'limited-key'])
+        self.assertEqual(transport.api_keys[-6:], ['limited-key'] * 6)
+
+    def test_map(self):
+        results = self.pool.map(lambda account, client: client.api_key, accounts=['events'])
+        self.assertEqual(results, {'events': 'events-key'})
+
+
+@attr('unittest')
+class TestRateLimiter(TestCase):
+
+    @patch('dive_sailthru_client.accounts.time')
+    def test_spaces_requests_after_burst(self, mock_time):
+        mock_time.monotonic.return_value = 100.0
+        limiter = RateLimiter(rate=10, burst=2)
+        for _ in range(4):
+            limiter.acquire('GET', 'blast')
+        self.assertEqual([round(call[0][0], 3) for call in mock_time.sleep.call_args_list], [0.1, 0.2])
+
+    @patch('dive_sailthru_client.accounts.time')
+    def test_waits_for_sailthru_reset(self, mock_time):
+        mock_time.monotonic.return_value = 100.0
+        mock_time.time.return_value = 1500000000.0
+        limiter = RateLimiter()
+        limiter.update('GET', 'blast', {'limit': 40, 'remaining': 0, 'reset': 1500000030})
+        limiter.acquire('POST', 'user')
+        self.assertFalse(mock_time.sleep.called)
+        limiter.acquire('GET', 'blast')
+        mock_time.sleep.assert_called_once_with(30.0)
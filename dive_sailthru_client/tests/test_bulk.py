@@ -0,0 +1,158 @@
+from __future__ import absolute_import
+from unittest import TestCase
+from dive_sailthru_client.bulk import API_ERROR, OK, RETRYABLE, SUPPRESSED, USER_EMAIL, SuppressionCache, \
+    partition_results, request_not_received
+from dive_sailthru_client.client import DiveSailthruClient
+from dive_sailthru_client.errors import SailthruApiError, SailthruUserEmailError
+from sailthru.sailthru_error import SailthruClientError
+from mock import patch, MagicMock
+from nose.plugins.attrib import attr
+import json
+import os
+import shutil
+import tempfile
+
+
+def _response(json_data):
+    response = MagicMock()
+    response.json = json_data
+    return response
+
+
+@attr('unittest')
+class TestBulkUsers(TestCase):
+
+    def setUp(self):
+        self.sailthru_client = DiveSailthruClient('abc', 'def')
+
+    def test_get_users_reports_each_user_in_order(self):
+        def fake_get_user(user_id, options=None):
+            if user_id == 'bad@example.com':
+                raise SailthruUserEmailError('Invalid Email (11)')
+            return _response({'keys': {'email': user_id}, 'options': options})
+
+        ids = ['a@example.com', 'bad@example.com', 'c@example.com']
+        with patch.object(self.sailthru_client, 'get_user', side_effect=fake_get_user):
+            results = self.sailthru_client.get_users(ids, fields=['vars'], max_workers=2, batch_size=2)
+
+        self.assertEqual([r.user_id for r in results], ids)
+        self.assertEqual(results[0].data['keys']['email'], 'a@example.com')
+        self.assertEqual(results[0].data['options'], {'key': 'email', 'fields': {'vars': 1}})
+        self.assertIsNone(results[0].error)
+        self.assertIsNone(results[1].data)
+        self.assertIsInstance(results[1].error, SailthruUserEmailError)
+        self.assertIsNone(results[2].error)
+
+    def test_set_users_vars_below_threshold_uses_user_api(self):
+        users_vars = {'a@example.com': {'x': 1}, 'b@example.com': {'x': 2}}
+        with patch.object(self.sailthru_client, 'save_user', return_value=_response({'ok': True})) as save_user, \
+                patch.object(self.sailthru_client, 'update_job') as update_job:
+            results = self.sailthru_client.set_users_vars(users_vars, job_threshold=3)
+
+        self.assertFalse(update_job.called)
+        self.assertEqual(save_user.call_count, 2)
+        save_user.assert_any_call('b@example.com', options={'key': 'email', 'vars': {'x': 2}})
+        self.assertEqual(sorted(r.user_id for r in results), sorted(users_vars))
+
+    def test_set_users_vars_above_threshold_uses_update_job(self):
+        users_vars = {'a@example.com': {'x': 1}, 'b@example.com': {'x': 2}}
+        sent_lines = []
+
+        def fake_update_job(update_file_stream=None, block_until_complete=True):
+            sent_lines.extend(json.loads(line) for line in update_file_stream.read().splitlines())
+            return {'job_id': '123', 'status': 'completed'}
+
+        with patch.object(self.sailthru_client, 'save_user') as save_user, \
+                patch.object(self.sailthru_client, 'update_job', side_effect=fake_update_job):
+            results = self.sailthru_client.set_users_vars(users_vars, job_threshold=2)
+
+        self.assertFalse(save_user.called)
+        self.assertIn({'id': 'a@example.com', 'key': 'email', 'vars': {'x': 1}}, sent_lines)
+        self.assertEqual(len(sent_lines), 2)
+        self.assertEqual([r.data['job_id'] for r in results], ['123', '123'])
+
+    def test_send_many_partitions_outcomes_and_retries(self):
+        attempts = {}
+
+        def fake_send(template, email, _vars=None, options=None):
+            attempts[email] = attempts.get(email, 0) + 1
+            if email == 'flaky@example.com' and attempts[email] == 1:
+                raise SailthruClientError("HTTPSConnectionPool(host='api.sailthru.com', port=443): Max retries exceeded "
+                                          "with url: /send (Caused by ConnectTimeoutError(...))")
+            if email == 'slow@example.com':
+                # may have been sent before the response timed out, so must not be sent again
+                raise SailthruClientError("HTTPSConnectionPool(host='api.sailthru.com', port=443): "
+                                          "Read timed out. (read timeout=10)")
+            if email == 'busy@example.com':
+                raise SailthruApiError('Too many requests (43)', code=43)
+            if email == 'optout@example.com':
+                raise SailthruUserEmailError('Email has opted out of delivery from client (32)', code=32)
+            if email == 'bad-vars@example.com':
+                raise SailthruApiError('Invalid vars (99)', code=99)
+            return _response({'send_id': email, 'vars': _vars})
+
+        emails = ['a@example.com', 'flaky@example.com', 'busy@example.com', 'optout@example.com',
+                  'bad-vars@example.com', 'slow@example.com']
+        with patch.object(self.sailthru_client, 'send', side_effect=fake_send), \
+                patch('dive_sailthru_client.client.time.sleep') as sleep:
+            results = self.sailthru_client.send_many('welcome', emails, vars_by_email={'a@example.com': {'x': 1}},
+                                                     retries=2, retry_delay=5)
+
+        self.assertEqual([r.user_id for r in results], emails)
+        self.assertEqual([r.status for r in results], [OK, OK, RETRYABLE, USER_EMAIL, API_ERROR, RETRYABLE])
+        self.assertEqual(results[0].data['vars'], {'x': 1})
+        self.assertEqual(attempts, {'a@example.com': 1, 'flaky@example.com': 2, 'busy@example.com': 3,
+                                    'optout@example.com': 1, 'bad-vars@example.com': 1, 'slow@example.com': 1})
+        self.assertEqual([call[0][0] for call in sleep.call_args_list], [5, 10])
+        partitions = partition_results(results)
+        self.assertEqual([r.user_id for r in partitions[USER_EMAIL]], ['optout@example.com'])
+        self.assertEqual(partitions[SUPPRESSED], [])
+
+    def test_request_not_received(self):
+        self.assertTrue(request_not_received(SailthruClientError(
+            "HTTPSConnectionPool(host='api.sailthru.com', port=443): Max retries exceeded with url: /send "
+            "(Caused by NewConnectionError('Failed to establish a new connection: [Errno 111] Connection refused'))")))
+        self.assertTrue(request_not_received(SailthruApiError('Too many requests (43)', code=43)))
+        self.assertFalse(request_not_received(SailthruClientError("('Connection aborted.', RemoteDisconnected())")))
+        self.assertFalse(request_not_received(SailthruApiError('Internal Error (9)', code=9)))
+        self.assertFalse(request_not_received(SailthruUserEmailError('Invalid Email (11)', code=11)))
+        self.assertFalse(request_not_received(None))
+
+    def test_suppression_cache_skips_known_bad_addresses(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'suppressed.jsonl')
+
+        def fake_send(template, email, _vars=None, options=None):
+            if email == 'hardbounce@example.com':
+                raise SailthruUserEmailError('Email is a known hardbounce (35)', code=35)
+            return _response({'send_id': email})
+
+        with patch.object(self.sailthru_client, 'send', side_effect=fake_send) as send:
+            self.sailthru_client.send_many('t', ['a@example.com', 'hardbounce@example.com'],
+                                           suppressions=SuppressionCache(path))
+            suppressions = SuppressionCache(path)  # reloaded from disk
+            results = self.sailthru_client.send_many('t', ['a@example.com', 'HardBounce@example.com'],
+                                                     suppressions=suppressions)
+
+        self.assertEqual(send.call_count, 3)
+        self.assertEqual(len(suppressions), 1)
+        self.assertEqual([r.status for r in results], [OK, SUPPRESSED])
+        self.assertEqual(results[1].error.code, 35)
+        self.assertIsInstance(results[1].error, SailthruUserEmailError)
+
+    def test_set_users_vars_update_job_skips_suppressed_users(self):
+        suppressions = SuppressionCache()
+        suppressions.add('b@example.com', 11)
+        sent_lines = []
+
+        def fake_update_job(update_file_stream=None, block_until_complete=True):
+            sent_lines.extend(json.loads(line) for line in update_file_stream.read().splitlines())
+            return {'job_id': '123', 'status': 'completed'}
+
+        with patch.object(self.sailthru_client, 'update_job', side_effect=fake_update_job):
+            results = self.sailthru_client.set_users_vars({'a@example.com': {'x': 1}, 'b@example.com': {'x': 2}},
+                                                          job_threshold=1, suppressions=suppressions)
+
+        self.assertEqual([line['id'] for line in sent_lines], ['a@example.com'])
+        self.assertEqual(dict((r.user_id, r.status) for r in results), {'a@example.com': OK, 'b@example.com': SUPPRESSED})
@@ -0,0 +1,64 @@
+from __future__ import absolute_import
+from unittest import TestCase
+from dive_sailthru_client.campaign_index import CampaignIndex, campaign_send_day
+from dive_sailthru_client.classification import DiveEmailTypes
+from nose.plugins.attrib import attr
+import datetime
+
+
+def _campaign(blast_id, brand, email_type, start_time, count=100, open_total=10, click_total=2,
+              optout=1, hardbounce=1, softbounce=2):
+    return {
+        'blast_id': blast_id,
+        'dive_brand': brand,
+        'dive_email_type': email_type,
+        'start_time': start_time,
+        'stats': {'total': {'count': count, 'open_total': open_total, 'click_total': click_total,
+                            'optout': optout, 'hardbounce': hardbounce, 'softbounce': softbounce}},
+    }
+
+
+@attr('unittest')
+class TestCampaignIndex(TestCase):
+
+    def setUp(self):
+        self.index = CampaignIndex()
+        self.index.add_many([
+            _campaign(1, 'Utility Dive', DiveEmailTypes.Blast, 'Thu, 06 Aug 2015 15:28:17 -0400'),
+            _campaign(2, 'Utility Dive', DiveEmailTypes.Blast, 'Thu, 06 Aug 2015 18:00:00 -0400', count=50),
+            _campaign(3, 'Utility Dive', DiveEmailTypes.Newsletter, 'Fri, 07 Aug 2015 07:00:00 -0400'),
+            _campaign(4, 'HR Dive', DiveEmailTypes.Blast, 'Mon, 10 Aug 2015 09:00:00 -0400'),
+        ])
+
+    def test_campaign_send_day_uses_reported_timezone(self):
+        self.assertEqual(campaign_send_day({'start_time': 'Thu, 06 Aug 2015 23:28:17 -0400'}),
+                         datetime.date(2015, 8, 6))
+        self.assertEqual(campaign_send_day({'schedule_time': 'Fri, 07 Aug 2015 01:00:00 -0400'}),
+                         datetime.date(2015, 8, 7))
+        self.assertIsNone(campaign_send_day({}))
+
+    def test_totals(self):
+        self.assertEqual(self.index.totals(publication='Utility Dive', email_type=DiveEmailTypes.Blast), {
+            'campaigns': 2, 'count': 150, 'open_total': 20, 'click_total': 4, 'optout': 2, 'bounces': 6,
+        })
+        self.assertEqual(self.index.totals(email_type=DiveEmailTypes.Blast)['campaigns'], 3)
+        self.assertEqual(self.index.totals()['count'], 350)
+        self.assertEqual(self.index.publications(), {'Utility Dive', 'HR Dive'})
+        self.assertEqual(self.index.email_types('Utility Dive'), {DiveEmailTypes.Blast, DiveEmailTypes.Newsletter})
+
+    def test_date_range(self):
+        totals = self.index.totals(start_date=datetime.date(2015, 8, 7), end_date=datetime.date(2015, 8, 10))
+        self.assertEqual(totals['campaigns'], 1)
+        by_day = self.index.totals_by_day(publication='Utility Dive')
+        self.assertEqual(sorted(by_day), [datetime.date(2015, 8, 6), datetime.date(2015, 8, 7)])
+        self.assertEqual(by_day[datetime.date(2015, 8, 6)]['campaigns'], 2)
+
+    def test_re_adding_a_campaign_replaces_it(self):
+        self.index.add(_campaign(4, 'HR Dive', DiveEmailTypes.Blast, 'Mon, 10 Aug 2015 09:00:00 -0400', count=70))
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(self.index.totals(publication='HR Dive'), {
+            'campaigns': 1, 'count': 70, 'open_total': 10, 'click_total': 2, 'optout': 1, 'bounces': 3,
+        })
+        # reclassified campaigns move buckets
+        self.index.add(_campaign(4, 'HR Dive', DiveEmailTypes.HalfBlast, 'Mon, 10 Aug 2015 09:00:00 -0400'))
+        self.assertEqual(self.index.email_types('HR Dive'), {DiveEmailTypes.HalfBlast})
@@ -0,0 +1,86 @@
+from __future__ import absolute_import
+from unittest import TestCase
+from dive_sailthru_client.classification import DiveEmailTypes, RuleClassifier, RuleError, get_default_classifier
+from dive_sailthru_client.client import DiveSailthruClient
+from nose.plugins.attrib import attr
+import json
+import os
+import shutil
+import tempfile
+
+CUSTOM_RULES = {
+    'email_types': [
+        {'type': 'promo', 'when': {'all': [
+            {'name': {'istartswith': 'promo:'}},
+            {'not': {'labels': {'has': 'internal'}}},
+        ]}},
+        {'type': DiveEmailTypes.Newsletter, 'when': {'any': [
+            {'list': {'iequals': 'daily'}},
+            {'subject': {'endswith': '[daily]'}},
+        ]}},
+    ],
+    'default_email_type': 'other',
+    'publications': [
+        {'types': ['promo'], 'strip': r' Promo List$'},
+        {'types': [DiveEmailTypes.Newsletter], 'when': {'list': {'contains': 'Dive'}}},
+    ],
+}
+
+
+@attr('unittest')
+class TestRuleClassifier(TestCase):
+
+    def setUp(self):
+        self.classifier = RuleClassifier(CUSTOM_RULES)
+
+    def test_first_matching_rule_wins(self):
+        self.assertEqual(self.classifier.email_type({'name': 'PROMO: spring', 'list': 'daily'}), 'promo')
+        self.assertEqual(self.classifier.email_type({'name': 'Promo: spring', 'list': 'Daily',
+                                                     'labels': ['internal']}),
+                         DiveEmailTypes.Newsletter)
+        self.assertEqual(self.classifier.email_type({'name': 'x', 'subject': 'News [daily]'}),
+                         DiveEmailTypes.Newsletter)
+        self.assertEqual(self.classifier.email_type({}), 'other')
+
+    def test_publication(self):
+        self.assertEqual(self.classifier.classify({'name': 'promo: a', 'list': 'Retail Dive Promo List'}),
+                         ('promo', 'Retail Dive'))
+        self.assertEqual(self.classifier.classify({'list': 'daily'}), (DiveEmailTypes.Newsletter, None))
+        # an existing dive_email_type is used rather than inferred
+        self.assertEqual(self.classifier.publication({'dive_email_type': DiveEmailTypes.Newsletter,
+                                                      'list': 'Retail Dive'}),
+                         'Retail Dive')
+
+    def test_from_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'rules.json')
+        with open(path, 'w') as f:
+            json.dump(CUSTOM_RULES, f)
+        classifier = RuleClassifier.from_file(path)
+        self.assertEqual(classifier.classify({'name': 'promo: a', 'list': 'A Promo List'}), ('promo', 'A'))
+
+    def test_default_rules(self):
+        classifier = get_default_classifier()
+        self.assertIs(classifier, get_default_classifier())
+        self.assertEqual(classifier.classify({'labels': ['Blast'], 'list': 'Utility Dive Blast List',
+                                              'name': 'Acme-blast-UD'}),
+                         (DiveEmailTypes.Blast, 'Utility Dive'))
+
+    def test_malformed_rules(self):
+        bad_rules = [
+            {'email_types': [{'type': 'x'}]},
+            {'email_types': [{'type': 'x', 'when': {'body': {'contains': 'x'}}}]},
+            {'email_types': [{'type': 'x', 'when': {'name': {'matches': 'x'}}}]},
+            {'email_types': [{'type': 'x', 'when': {'name': {'contains': ''}}}]},
+            {'email_types': [{'type': 'x', 'when': {'labels': {'contains': 'x'}}}]},
+            {'email_types': [{'type': 'x', 'when': {'any': [], 'all': []}}]},
+        ]
+        for rules in bad_rules:
+            with self.assertRaises(RuleError):
+                RuleClassifier(rules)
+
+    def test_client_uses_custom_classifier(self):
+        sailthru_client = DiveSailthruClient('API_KEY', 'API_SECRET', classifier=self.classifier)
+        self.assertEqual(sailthru_client._infer_dive_email_type({'name': 'promo: a'}), 'promo')
+        self.assertEqual(sailthru_client._infer_dive_publication({'name': 'promo: a', 'list': 'B Promo List'}), 'B')
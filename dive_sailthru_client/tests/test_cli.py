@@ -0,0 +1,168 @@
+from __future__ import absolute_import
+from unittest import TestCase, skipIf
+from dive_sailthru_client import cli
+from dive_sailthru_client.client import DiveSailthruClient
+from mock import patch
+from nose.plugins.attrib import attr
+import datetime
+import json
+import os
+import shutil
+import tempfile
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+def fake_campaigns_page(self, page_start_date, page_end_date, list_name=None, campaign_filter=None):
+    """ two campaigns per window (a blast and a newsletter), with blast ids derived from the window start """
+    base = page_start_date.toordinal() * 10
+    campaigns = [{'blast_id': base + i, 'dive_brand': 'Utility Dive', 'dive_email_type': email_type, 'sent_count': 100}
+                 for i, email_type in enumerate(['blast', 'newsletter'])]
+    return campaign_filter.apply(campaigns) if campaign_filter else campaigns
+
+
+@attr('unittest')
+class TestCli(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.output = os.path.join(self.tmp_dir, 'out.jsonl')
+        self.checkpoint = os.path.join(self.tmp_dir, 'run.ckpt')
+        self.base_args = ['--api-key', 'abc', '--api-secret', 'def']
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _read_output(self):
+        with open(self.output) as f:
+            return [json.loads(line) for line in f]
+
+    @patch.object(DiveSailthruClient, '_get_campaigns_page', fake_campaigns_page)
+    def test_campaigns(self):
+        argv = self.base_args + ['campaigns', '--start', '2020-01-01', '--end', '2020-03-01', '-o', self.output, '-q']
+        self.assertEqual(cli.main(argv), 0)
+        self.assertEqual(len(self._read_output()), 4)
+
+    @patch.object(DiveSailthruClient, '_get_campaigns_page', fake_campaigns_page)
+    def test_campaigns_filtered(self):
+        argv = self.base_args + ['campaigns', '--start', '2020-01-01', '--end', '2020-03-01', '-o', self.output, '-q',
+                                 '--email-type', 'newsletter', '--field', 'blast_id', '--field', 'dive_email_type']
+        self.assertEqual(cli.main(argv), 0)
+        self.assertEqual([sorted(c.items()) for c in self._read_output()],
+                         [[('blast_id', datetime.date(2020, 1, 1).toordinal() * 10 + 1), ('dive_email_type', 'newsletter')],
+                          [('blast_id', datetime.date(2020, 1, 31).toordinal() * 10 + 1), ('dive_email_type', 'newsletter')]])
+
+    def test_killed_run_resumes_without_duplicates(self):
+        calls = []
+
+        def flaky_page(client, page_start_date, page_end_date, list_name=None, campaign_filter=None):
+            calls.append(page_start_date)
+            if page_start_date == datetime.date(2020, 3, 1) and len(calls) < 5:
+                raise KeyboardInterrupt()
+            return fake_campaigns_page(client, page_start_date, page_end_date, list_name, campaign_filter)
+
+        argv = self.base_args + ['campaigns', '--start', '2020-01-01', '--end', '2020-05-01', '-o', self.output,
+                                 '--checkpoint', self.checkpoint, '--workers', '1', '-q']
+        with patch.object(DiveSailthruClient, '_get_campaigns_page', flaky_page):
+            self.assertEqual(cli.main(argv), 130)
+            first_run = self._read_output()
+            self.assertEqual(len(first_run), 4)  # two windows made it
+            # simulate a write that happened after the last checkpoint
+            with open(self.output, 'a') as f:
+                f.write('{"partial": true}\n')
+            self.assertEqual(cli.main(argv), 0)
+
+        records = self._read_output()
+        # windows start Jan 1, Jan 31, Mar 1, Mar 31 and Apr 30, with two campaigns each
+        self.assertEqual(len(records), 10)
+        self.assertEqual(len(set(r['blast_id'] for r in records)), 10)
+        self.assertEqual(records[:4], first_run)
+        # the finished windows were not fetched again
+        self.assertEqual(calls.count(datetime.date(2020, 1, 1)), 1)
+
+    @patch.object(DiveSailthruClient, '_get_campaigns_page', fake_campaigns_page)
+    def test_stats(self):
+        def fake_stats(client, blast_id, **kwargs):
+            self.assertTrue(kwargs['include_clickmap'])
+            return {'count': 5}
+
+        argv = self.base_args + ['stats', '--start', '2020-01-01', '--end', '2020-01-15', '--clickmap',
+                                 '-o', self.output, '--checkpoint', self.checkpoint, '-q']
+        with patch.object(DiveSailthruClient, 'get_campaign_stats', fake_stats):
+            self.assertEqual(cli.main(argv), 0)
+        records = sorted(self._read_output(), key=lambda r: r['blast_id'])
+        self.assertEqual([r['count'] for r in records], [5, 5])
+        self.assertEqual(records[0]['dive_brand'], 'Utility Dive')
+
+    def test_stats_fetches_blasts_in_two_windows_once(self):
+        def boundary_page(client, page_start_date, page_end_date, list_name=None, campaign_filter=None):
+            # blast 7 went out on the day the first window ends and the second starts
+            return [{'blast_id': page_start_date.toordinal()}, {'blast_id': 7}]
+
+        argv = self.base_args + ['stats', '--start', '2020-01-01', '--end', '2020-03-01', '-o', self.output, '-q']
+        with patch.object(DiveSailthruClient, '_get_campaigns_page', boundary_page), \
+                patch.object(DiveSailthruClient, 'get_campaign_stats', side_effect=lambda *args, **kwargs: {'count': 5}) \
+                as get_campaign_stats:
+            self.assertEqual(cli.main(argv), 0)
+        self.assertEqual(get_campaign_stats.call_count, 3)
+        self.assertEqual(sorted(r['blast_id'] for r in self._read_output()),
+                         sorted([7, datetime.date(2020, 1, 1).toordinal(), datetime.date(2020, 1, 31).toordinal()]))
+
+    @patch.object(DiveSailthruClient, '_get_campaigns_page', fake_campaigns_page)
+    def test_stats_checkpoint_appends_per_blast(self):
+        argv = self.base_args + ['stats', '--start', '2020-01-01', '--end', '2020-03-01',
+                                 '-o', self.output, '--checkpoint', self.checkpoint, '-q', '--workers', '1']
+        with patch.object(DiveSailthruClient, 'get_campaign_stats', return_value={'count': 5}):
+            self.assertEqual(cli.main(argv), 0)
+        with open(self.checkpoint) as f:
+            lines = [json.loads(line) for line in f]
+        # header, the campaign list's file name, then one short line per blast
+        self.assertEqual(lines[0]['command'], 'stats')
+        self.assertEqual(lines[1], {'stored': 'campaigns'})
+        self.assertEqual([sorted(line) for line in lines[2:]], [['output_offset', 'unit']] * 4)
+        with open(self.checkpoint + '.campaigns') as f:
+            self.assertEqual(len(json.load(f)), 4)
+
+        # a kill while appending leaves a partial line, which a resumed run ignores
+        with open(self.checkpoint, 'a') as f:
+            f.write('{"unit": 1, "outp')
+        with patch.object(DiveSailthruClient, 'get_campaign_stats', side_effect=AssertionError('refetched')), \
+                patch.object(DiveSailthruClient, '_get_campaigns_page', side_effect=AssertionError('refetched')):
+            self.assertEqual(cli.main(argv), 0)
+        self.assertEqual(len(self._read_output()), 4)
+        with open(self.checkpoint) as f:
+            self.assertEqual(len(f.readlines()), 6)
+
+    @patch.object(DiveSailthruClient, '_get_campaigns_page', fake_campaigns_page)
+    def test_resume_without_output_file_is_rejected(self):
+        argv = self.base_args + ['campaigns', '--start', '2020-01-01', '--end', '2020-03-01', '-o', self.output,
+                                 '--checkpoint', self.checkpoint, '-q']
+        self.assertEqual(cli.main(argv), 0)
+        os.remove(self.output)
+        with self.assertRaises(SystemExit):
+            cli.main(argv)
+
+    @skipIf(pyarrow is None, "pyarrow is not installed")
+    @patch.object(DiveSailthruClient, '_get_campaigns_page')
+    def test_campaigns_parquet_keeps_every_key(self, get_campaigns_page):
+        get_campaigns_page.return_value = [{'blast_id': 1, 'name': 'a'},
+                                           {'blast_id': 2, 'name': 'b', 'copy_blast_id': 1, 'labels': ['x']}]
+        argv = self.base_args + ['campaigns', '--start', '2020-01-01', '--end', '2020-01-15', '-o', self.tmp_dir,
+                                 '--format', 'parquet', '-q']
+        self.assertEqual(cli.main(argv), 0)
+        file_names = [name for name in os.listdir(self.tmp_dir) if name.endswith('.parquet')]
+        self.assertEqual(len(file_names), 1)
+        rows = pyarrow.parquet.read_table(os.path.join(self.tmp_dir, file_names[0])).to_pylist()
+        self.assertEqual(rows, [{'blast_id': 1, 'copy_blast_id': None, 'labels': None, 'name': 'a'},
+                                {'blast_id': 2, 'copy_blast_id': 1, 'labels': '["x"]', 'name': 'b'}])
+
+    def test_checkpoint_from_other_arguments_is_rejected(self):
+        with open(self.checkpoint, 'w') as f:
+            f.write(json.dumps({'command': 'campaigns', 'params': {}}) + '\n')
+        argv = self.base_args + ['campaigns', '--start', '2020-01-01', '--end', '2020-02-01', '-o', self.output,
+                                 '--checkpoint', self.checkpoint]
+        with self.assertRaises(SystemExit):
+            cli.main(argv)
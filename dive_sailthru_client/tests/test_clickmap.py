@@ -0,0 +1,74 @@
+from __future__ import absolute_import
+from unittest import TestCase
+from dive_sailthru_client.clickmap import ClickmapAggregator, SpaceSaving
+from nose.plugins.attrib import attr
+import random
+
+# clickmap from the get_campaign_stats docstring
+CLICKMAP_STATS = {
+    'clickmap': [
+        {'count': 15, 'ix': '1', 'url': 'http://www.utilitydive.com/signup/'},
+        {'count': 1, 'ix': '4', 'url': 'http://svy.mk/1SoQww1'},
+        {'count': 18, 'ix': '2', 'url': 'http://svy.mk/1SoQww1'},
+        {'count': 11, 'ix': '1', 'url': 'http://www.utilitydive.com/about/privacy/'},
+        {'count': 59, 'ix': '3', 'url': 'http://svy.mk/1SoQww1'},
+        {'count': 4, 'ix': '2', 'url': 'http://www.utilitydive.com/about/privacy/'},
+        {'count': 2, 'ix': '2', 'url': 'http://www.utilitydive.com/signup/'},
+        {'count': 55, 'ix': '1', 'url': 'http://svy.mk/1SoQww1'},
+    ],
+}
+URLS_STATS = {
+    'urls': {
+        'http://svy.mk/1SoQww1': {'click': 93, 'click_total': 133, 'count': 16796},
+        'http://www.hrdive.com/': {'click': 6, 'click_total': 200, 'count': 16796},
+    },
+}
+
+
+@attr('unittest')
+class TestClickmapAggregator(TestCase):
+
+    def test_totals_by_url_position_and_publication(self):
+        aggregator = ClickmapAggregator()
+        aggregator.add(CLICKMAP_STATS, publication='Utility Dive')
+        aggregator.add(URLS_STATS, publication='HR Dive')
+
+        self.assertEqual(aggregator.top_urls(2), [('http://svy.mk/1SoQww1', 266), ('http://www.hrdive.com/', 200)])
+        self.assertEqual(aggregator.top_urls(1, publication='Utility Dive'), [('http://svy.mk/1SoQww1', 133)])
+        self.assertEqual(aggregator.top_urls(5, publication='HR Dive')[1], ('http://svy.mk/1SoQww1', 133))
+        self.assertEqual(aggregator.top_positions(2), [(1, 81), (3, 59)])
+        # the urls section has no positions
+        self.assertEqual(aggregator.top_positions(publication='HR Dive'), [])
+        self.assertEqual(aggregator.publications(), {'Utility Dive', 'HR Dive'})
+        self.assertEqual(aggregator.url(aggregator.url_id('http://svy.mk/1SoQww1')), 'http://svy.mk/1SoQww1')
+        self.assertEqual(aggregator.blast_count, 2)
+
+    def test_sketch_mode_finds_heavy_hitters(self):
+        exact = ClickmapAggregator()
+        sketched = ClickmapAggregator(sketch_size=50)
+        rng = random.Random(42)
+        for _ in range(200):
+            clickmap = [{'url': 'http://heavy.com/%d' % i, 'ix': '1', 'count': 100} for i in range(5)]
+            clickmap += [{'url': 'http://tail.com/%d' % rng.randint(0, 10000), 'ix': '2', 'count': 1}
+                         for _ in range(20)]
+            exact.add({'clickmap': clickmap}, publication='Pub')
+            sketched.add({'clickmap': clickmap}, publication='Pub')
+
+        self.assertEqual(set(url for url, _ in sketched.top_urls(5)), set(url for url, _ in exact.top_urls(5)))
+        self.assertEqual(set(url for url, _ in sketched.top_urls(5, publication='Pub')),
+                         set('http://heavy.com/%d' % i for i in range(5)))
+        self.assertLessEqual(len(sketched._url_sketch.counts), 50)
+        self.assertEqual(sketched.top_positions(1), exact.top_positions(1))
+
+
+@attr('unittest')
+class TestSpaceSaving(TestCase):
+
+    def test_counts_are_exact_until_full(self):
+        sketch = SpaceSaving(3)
+        for key in 'aabbbc':
+            sketch.add(key)
+        self.assertEqual(sketch.top(3), [('b', 3), ('a', 2), ('c', 1)])
+        # d replaces c (the minimum) and inherits its count
+        sketch.add('d')
+        self.assertEqual(sketch.counts, {'a': 2, 'b': 3, 'd': 2})
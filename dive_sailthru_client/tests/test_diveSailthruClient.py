@@ -2,8 +2,11 @@ from __future__ import absolute_import
 from unittest import TestCase
 from dive_sailthru_client.client import DiveSailthruClient, DiveEmailTypes
 from dive_sailthru_client.errors import SailthruApiError, SailthruUserEmailError
-from mock import patch
+from mock import patch, MagicMock
 from nose.plugins.attrib import attr
+import datetime
+import threading
+import time
 
 
 @attr('unittest')
@@ -376,6 +379,132 @@ class TestDiveSailthruClient(TestCase):
             output_publication = self.sailthru_client._infer_dive_publication(test_campaign['input'])
             self.assertEqual(output_publication, test_campaign['expected_publication'])
 
+    def test_get_campaigns_in_range_pages_by_30_days(self):
+        """
+        Test that long ranges are requested in 30 day windows and come back annotated and
+        in ascending chronological order.
+        """
+        def fake_api_get(action, params):
+            response = MagicMock()
+            blasts = [  # Sailthru returns newest first
+                {'blast_id': 2, 'name': 'Issue: %s' % params['end_date'], 'list': 'Utility Dive'},
+                {'blast_id': 1, 'name': 'x-blast-y', 'list': 'Utility Dive Blast List'},
+            ]
+            response.json = {'blasts': blasts, 'filtered_count': 2}
+            return response
+
+        with patch.object(self.sailthru_client, 'api_get', side_effect=fake_api_get) as api_get:
+            campaigns = self.sailthru_client.get_campaigns_in_range(datetime.date(2020, 1, 1), datetime.date(2020, 3, 1))
+
+        self.assertEqual([call[0][1]['start_date'] for call in api_get.call_args_list],
+                         ['2020-01-01', '2020-01-31'])
+        self.assertEqual([c['blast_id'] for c in campaigns], [1, 2, 1, 2])
+        self.assertEqual(campaigns[0]['dive_email_type'], DiveEmailTypes.Blast)
+        self.assertEqual(campaigns[0]['dive_brand'], 'Utility Dive')
+        self.assertEqual(campaigns[3]['name'], 'Issue: 2020-03-01')
+
+    def test_get_campaigns_in_range_prefetch_overlaps_pages(self):
+        """
+        Test that with prefetch, pages are fetched concurrently but come back in the same
+        order as without.
+        """
+        lock = threading.Lock()
+        in_flight = [0, 0]  # current, max
+
+        def fake_api_get(action, params):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            time.sleep(0.02)
+            with lock:
+                in_flight[0] -= 1
+            response = MagicMock()
+            response.json = {'blasts': [{'blast_id': params['start_date'], 'name': 'x', 'list': 'y'}], 'filtered_count': 1}
+            return response
+
+        start_date, end_date = datetime.date(2020, 1, 1), datetime.date(2020, 12, 31)
+        with patch.object(self.sailthru_client, 'api_get', side_effect=fake_api_get):
+            sequential = self.sailthru_client.get_campaigns_in_range(start_date, end_date)
+            self.assertEqual(in_flight[1], 1)
+            pipelined = self.sailthru_client.get_campaigns_in_range(start_date, end_date, prefetch=4)
+
+        self.assertEqual(len(sequential), 13)
+        self.assertEqual(pipelined, sequential)
+        self.assertGreater(in_flight[1], 1)
+        self.assertLessEqual(in_flight[1], 4)
+
+    def test_iter_enriched_campaigns(self):
+        campaigns = [{'blast_id': blast_id, 'name': 'c%d' % blast_id} for blast_id in (1, 2, 3, 2, 4)]
+        with patch.object(self.sailthru_client, 'get_campaign_data', side_effect=lambda b: {'content_html': b}) as data, \
+                patch.object(self.sailthru_client, 'get_campaign_stats', side_effect=lambda b, **kw: dict(kw, count=b)) as stats:
+            enriched = list(self.sailthru_client.iter_enriched_campaigns(
+                iter(campaigns), stats_options={'include_clickmap': True}, max_workers=2, max_pending=2))
+
+        self.assertEqual(sorted(c['blast_id'] for c in enriched), [1, 2, 3, 4])
+        self.assertEqual(sorted(call[0][0] for call in data.call_args_list), [1, 2, 3, 4])
+        self.assertEqual(stats.call_count, 4)
+        for c in enriched:
+            self.assertEqual(c['campaign_data'], {'content_html': c['blast_id']})
+            self.assertEqual(c['campaign_stats'], {'include_clickmap': True, 'count': c['blast_id']})
+
+    def test_iter_enriched_campaigns_collapses_ab_test_copies(self):
+        campaigns = [
+            {'blast_id': 10, 'abtest_segment': 'A', 'final_blast_id': 12},
+            {'blast_id': 11, 'abtest_segment': 'B', 'final_blast_id': 12},
+            {'blast_id': 12, 'abtest_segment': 'Final', 'final_blast_id': 12, 'copy_blast_id': 13},
+            {'blast_id': 13, 'copy_blast_id': 12},
+            {'blast_id': 20},
+            {'blast_id': 20},
+        ]
+        with patch.object(self.sailthru_client, 'get_campaign_stats', side_effect=lambda b: {'count': b}):
+            # the segments and the final are kept, whichever order the blasts come in
+            for order in (campaigns, campaigns[::-1], [campaigns[3]] + campaigns[:3] + campaigns[4:]):
+                enriched = list(self.sailthru_client.iter_enriched_campaigns(order, include_data=False))
+                self.assertEqual(sorted(c['blast_id'] for c in enriched), [10, 11, 12, 20])
+            # segments whose final is outside the range still come out, at the end
+            enriched = list(self.sailthru_client.iter_enriched_campaigns(campaigns[:2], include_data=False))
+            self.assertEqual(sorted(c['blast_id'] for c in enriched), [10, 11])
+            enriched = list(self.sailthru_client.iter_enriched_campaigns(campaigns, include_data=False,
+                                                                         collapse_ab_tests=False))
+            self.assertEqual(sorted(c['blast_id'] for c in enriched), [10, 11, 12, 13, 20])
+
+    def test_iter_enriched_campaigns_raises_errors(self):
+        campaigns = [{'blast_id': 1}, {'blast_id': 404}]
+
+        def fake_get_campaign_stats(blast_id):
+            if blast_id == 404:
+                raise SailthruApiError('Blast not found (99)', code=99)
+            return {'count': 1}
+
+        with patch.object(self.sailthru_client, 'get_campaign_stats', side_effect=fake_get_campaign_stats):
+            with self.assertRaises(SailthruApiError):
+                list(self.sailthru_client.iter_enriched_campaigns(campaigns, include_data=False))
+
+    def test_get_campaigns_in_range_filters_each_page(self):
+        response = MagicMock()
+        response.json = {'filtered_count': 3, 'blasts': [
+            {'blast_id': 3, 'name': 'x-blast-y', 'list': 'HR Dive Blast List', 'sent_count': 5000},
+            {'blast_id': 2, 'name': 'x-blast-y', 'list': 'Utility Dive Blast List', 'sent_count': 10},
+            {'blast_id': 1, 'name': 'x-blast-y', 'list': 'Utility Dive Blast List', 'sent_count': 5000},
+        ]}
+        with patch.object(self.sailthru_client, 'api_get', return_value=response), \
+                patch.object(self.sailthru_client.classifier, 'classify',
+                             wraps=self.sailthru_client.classifier.classify) as classify:
+            campaigns = self.sailthru_client.get_campaigns_in_range(
+                datetime.date(2020, 1, 1), datetime.date(2020, 1, 2), publications=['Utility Dive'],
+                min_sent_count=1000, fields=['blast_id', 'dive_email_type'])
+
+        self.assertEqual(campaigns, [{'blast_id': 1, 'dive_email_type': DiveEmailTypes.Blast}])
+        # the campaign sent to too few addresses was dropped before classifying it
+        self.assertEqual(classify.call_count, 2)
+
+    def test_get_campaigns_in_range_raises_on_incomplete_page(self):
+        response = MagicMock()
+        response.json = {'blasts': [{'blast_id': 1}], 'filtered_count': 2}
+        with patch.object(self.sailthru_client, 'api_get', return_value=response):
+            with self.assertRaises(SailthruApiError):
+                self.sailthru_client.get_campaigns_in_range(datetime.date(2020, 1, 1), datetime.date(2020, 1, 2))
+
     @patch('sailthru.sailthru_response.SailthruResponse')
     @patch('sailthru.sailthru_response.SailthruResponseError')
     def test_raise_exception_if_error(self, mock_response, mock_error):
@@ -399,6 +528,8 @@ class TestDiveSailthruClient(TestCase):
             self.sailthru_client.raise_exception_if_error(mock_response)
 
         self.assertEqual(str(cm.exception), 'this is the error (1234)')
+        self.assertEqual(cm.exception.code, 1234)
+        self.assertFalse(cm.exception.retryable)
         self.assertTrue(mock_response.get_error.called)
 
     @patch('sailthru.sailthru_response.SailthruResponse')
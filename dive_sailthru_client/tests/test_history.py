@@ -0,0 +1,102 @@
+from __future__ import absolute_import
+from unittest import TestCase
+from dive_sailthru_client.history import StatsHistory, flatten_counters
+from dive_sailthru_client.timeseries import compact_campaign_stats
+from nose.plugins.attrib import attr
+import copy
+import os
+import shutil
+import tempfile
+
+T0 = 1438889100
+
+
+def _stats(opens, clicks, android_opens, click_times, link_clicks):
+    return {
+        'subject': 'Utilities: Is your grid secure?',
+        'total': {'count': 16796, 'open_total': opens, 'click_total': clicks, 'beacon': 0},
+        'device': {'Android': {'open_total': android_opens, 'click': 0}},
+        'click_times': click_times,
+        'clickmap': [{'url': 'https://www.utilitydive.com/a', 'ix': 1, 'count': link_clicks}],
+    }
+
+
+@attr('unittest')
+class TestStatsHistory(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'history.sqlite')
+        self.history = StatsHistory(self.path)
+        self.snapshots = [
+            _stats(100, 10, 20, {str(T0): 10}, 4),
+            _stats(250, 12, 45, {str(T0): 10, str(T0 + 300): 2}, 5),
+            _stats(300, 12, 45, {str(T0): 10, str(T0 + 300): 2}, 5),
+        ]
+        self.stored = [self.history.add(1, stats, taken_at=T0 + i * 3600, publication='Utility Dive')
+                       for i, stats in enumerate(self.snapshots)]
+        self.history.add(2, _stats(7, 1, 1, {}, 1), taken_at=T0 + 1800, publication='Utility Dive')
+        self.history.add(3, _stats(1000, 100, 1, {}, 1), taken_at=T0, publication='HR Dive')
+
+    def tearDown(self):
+        self.history.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_flatten_counters(self):
+        counters = dict(flatten_counters(self.snapshots[0]))
+        self.assertEqual(counters[('total', 'open_total')], 100)
+        self.assertEqual(counters[('clickmap', 'https://www.utilitydive.com/a#1', 'count')], 4)
+        self.assertEqual(counters[('clickmap', 'https://www.utilitydive.com/a#1', 'ix')], 1)
+        self.assertNotIn(('subject',), counters)
+        compact = compact_campaign_stats(copy.deepcopy(self.snapshots[1]))
+        self.assertEqual(dict(flatten_counters(compact))[('click_times', str(T0 + 300))], 2)
+
+    def test_only_changes_are_stored(self):
+        # the first snapshot stores every counter, then only the ones that moved
+        self.assertEqual(self.stored, [9, 5, 1])
+
+    def test_stats_at(self):
+        self.assertIsNone(self.history.stats_at(1, T0 - 1))
+        for i, snapshot in enumerate(self.snapshots):
+            stats = self.history.stats_at(1, T0 + i * 3600 + 60)
+            self.assertEqual(stats['total'], snapshot['total'])
+            self.assertEqual(stats['device'], snapshot['device'])
+            self.assertEqual(stats['click_times'], snapshot['click_times'])
+            self.assertEqual(stats['clickmap']['https://www.utilitydive.com/a#1']['count'], snapshot['clickmap'][0]['count'])
+        self.assertEqual(self.history.stats_at(1)['total']['open_total'], 300)
+
+    def test_keyframes(self):
+        self.history.keyframe_interval = 2
+        for i in range(3, 7):
+            self.history.add(1, _stats(300 + i, 12, 45, {}, 5), taken_at=T0 + i * 3600)
+        reopened = StatsHistory(self.path)
+        self.addCleanup(reopened.close)
+        self.assertEqual(reopened.stats_at(1, T0 + 2 * 3600)['click_times'], self.snapshots[2]['click_times'])
+        self.assertEqual(reopened.stats_at(1, T0 + 5 * 3600)['total']['open_total'], 305)
+        # snapshot 4 is a keyframe without any click_times, so they are gone rather than 0
+        self.assertNotIn('click_times', reopened.stats_at(1, T0 + 5 * 3600))
+
+    def test_memory_history_is_not_usable_after_fork(self):
+        history = StatsHistory(':memory:')
+        history.add(1, _stats(1, 1, 1, {}, 1), taken_at=T0)
+        history._after_fork()  # what the child of a fork gets
+        with self.assertRaises(RuntimeError):
+            history.stats_at(1)
+
+    def test_growth_of_clickmap_url(self):
+        self.assertEqual(self.history.growth(1, 'clickmap.https://www.utilitydive.com/a#1.count'),
+                         [(T0, 4), (T0 + 3600, 5), (T0 + 7200, 5)])
+
+    def test_growth(self):
+        self.assertEqual(self.history.growth(1, 'total.open_total'),
+                         [(T0, 100), (T0 + 3600, 250), (T0 + 7200, 300)])
+        self.assertEqual(self.history.growth(1, ('device', 'Android', 'open_total')),
+                         [(T0, 20), (T0 + 3600, 45), (T0 + 7200, 45)])
+        self.assertEqual(self.history.publication_growth('Utility Dive', 'total.open_total', [T0, T0 + 3600, T0 + 7200]),
+                         [(T0, 100), (T0 + 3600, 257), (T0 + 7200, 307)])
+        self.assertEqual(self.history.blasts('HR Dive'), [3])
+
+    def test_snapshots_must_be_in_order(self):
+        with self.assertRaises(ValueError):
+            self.history.add(1, self.snapshots[0], taken_at=T0 + 3600)
+        self.assertEqual(self.history.snapshot_times(1), [T0, T0 + 3600, T0 + 7200])
@@ -0,0 +1,30 @@
+from __future__ import absolute_import
+from unittest import TestCase, skipIf
+from nose.plugins.attrib import attr
+import subprocess
+import sys
+
+# Modules that make up the HTTP stack and should only be loaded when a client is needed
+HEAVY_MODULES = ('sailthru', 'requests', 'simplejson')
+
+
+@attr('unittest')
+class TestLazyImports(TestCase):
+
+    def _loaded_heavy_modules(self, statement):
+        """ Run statement in a fresh interpreter and return which heavy modules it loaded """
+        code = "%s\nimport sys\nprint(' '.join(m for m in %r if m in sys.modules))" % (statement, HEAVY_MODULES)
+        output = subprocess.check_output([sys.executable, '-c', code])
+        return output.decode('utf-8').split()
+
+    def test_package_import_does_not_load_http_stack(self):
+        self.assertEqual(self._loaded_heavy_modules("import dive_sailthru_client"), [])
+
+    def test_classifier_import_does_not_load_http_stack(self):
+        statement = "from dive_sailthru_client import DiveEmailTypes, infer_dive_email_type"
+        self.assertEqual(self._loaded_heavy_modules(statement), [])
+
+    @skipIf(sys.version_info < (3, 7), "module __getattr__ needs Python 3.7")
+    def test_client_attribute_loads_http_stack(self):
+        statement = "import dive_sailthru_client\ndive_sailthru_client.DiveSailthruClient"
+        self.assertEqual(self._loaded_heavy_modules(statement), list(HEAVY_MODULES))
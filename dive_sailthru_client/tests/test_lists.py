@@ -0,0 +1,76 @@
+from __future__ import absolute_import
+from unittest import TestCase
+from dive_sailthru_client.classification import infer_list_publication
+from dive_sailthru_client.lists import ListCatalog, ListChanges
+from mock import MagicMock, patch
+from nose.plugins.attrib import attr
+
+
+@attr('unittest')
+class TestListCatalog(TestCase):
+
+    def setUp(self):
+        self.sailthru_client = MagicMock()
+        self.sailthru_client.get_primary_lists.return_value = [
+            {'name': 'Utility Dive', 'email_count': 10},
+            {'name': 'Utility Dive Weekender', 'email_count': 5},
+            {'name': 'Utility Dive Blast List', 'email_count': 8},
+            {'name': 'HR Dive Half Blast List - Group A', 'email_count': 3},
+        ]
+
+    def test_infer_list_publication(self):
+        self.assertEqual(infer_list_publication('Utility Dive Weekender'), 'Utility Dive')
+        self.assertEqual(infer_list_publication('Utility Dive and sub pubs Blast List'), 'Utility Dive')
+        self.assertEqual(infer_list_publication('Healthcare Dive TWO Third Blast List - Group B'), 'Healthcare Dive')
+        self.assertEqual(infer_list_publication('Education Dive: Higher Ed'), 'Education Dive: Higher Ed')
+        self.assertIsNone(infer_list_publication(''))
+
+    def test_lookups(self):
+        catalog = ListCatalog(self.sailthru_client)
+        self.assertIn('Utility Dive', catalog)
+        self.assertNotIn('Nope', catalog)
+        self.assertEqual(catalog.get('Utility Dive')['email_count'], 10)
+        self.assertEqual(len(catalog), 4)
+        self.assertEqual(catalog.publications(), ['HR Dive', 'Utility Dive'])
+        self.assertEqual([lst['name'] for lst in catalog.by_publication('Utility Dive')],
+                         ['Utility Dive', 'Utility Dive Blast List', 'Utility Dive Weekender'])
+        # everything above was served from one fetch
+        self.assertEqual(self.sailthru_client.get_primary_lists.call_count, 1)
+
+    def test_stale_catalog_refreshes_and_reports_changes(self):
+        on_change = MagicMock()
+        catalog = ListCatalog(self.sailthru_client, ttl=60, background_refresh=False, on_change=on_change)
+        with patch('dive_sailthru_client.lists.time.time', return_value=1000):
+            catalog.names()
+        on_change.reset_mock()
+
+        self.sailthru_client.get_primary_lists.return_value = [
+            {'name': 'Utility Dive', 'email_count': 11, 'valid_count': 11},  # only counters changed
+            {'name': 'Utility Dive Weekender', 'email_count': 5, 'vars': ['company']},
+            {'name': 'Utility Dive Blast List', 'email_count': 8},
+            {'name': 'CFO Dive', 'email_count': 1},
+        ]
+        with patch('dive_sailthru_client.lists.time.time', return_value=1030):
+            self.assertNotIn('CFO Dive', catalog)  # still fresh
+        with patch('dive_sailthru_client.lists.time.time', return_value=1061):
+            self.assertIn('CFO Dive', catalog)
+
+        on_change.assert_called_once_with(ListChanges(
+            added=['CFO Dive'], removed=['HR Dive Half Blast List - Group A'], changed=['Utility Dive Weekender']))
+
+    def test_ignore_fields(self):
+        catalog = ListCatalog(self.sailthru_client, ignore_fields=())
+        catalog.refresh()
+        self.sailthru_client.get_primary_lists.return_value = [
+            dict(list_data, email_count=list_data['email_count'] + 1)
+            for list_data in self.sailthru_client.get_primary_lists.return_value]
+        self.assertEqual(len(catalog.refresh().changed), 4)
+
+    def test_background_refresh_serves_cached_lists(self):
+        catalog = ListCatalog(self.sailthru_client, ttl=0)
+        catalog.refresh()
+        self.sailthru_client.get_primary_lists.side_effect = Exception('API down')
+        self.assertIn('Utility Dive', catalog)
+        catalog._refresh_thread.join()
+        self.assertIn('API down', str(catalog.last_refresh_error))
+        self.assertIn('Utility Dive', catalog)
@@ -0,0 +1,102 @@
+from __future__ import absolute_import
+from unittest import TestCase
+from dive_sailthru_client.client import DiveSailthruClient
+from dive_sailthru_client.profiling import LatencyHistogram, RequestProfiler, percentile
+from sailthru.sailthru_error import SailthruClientError
+from sailthru.sailthru_response import SailthruResponse
+from nose.plugins.attrib import attr
+import json
+import os
+import pickle
+import random
+import requests
+import shutil
+import tempfile
+
+
+class FlakyTransport(object):
+    """ Answers every request, after failing the first 'blast' request with a connect timeout """
+
+    def __init__(self):
+        self.failed = False
+
+    def request(self, url, data, method, file_data=None, headers=None, request_timeout=10):
+        if url.endswith('/blast') and not self.failed:
+            self.failed = True
+            raise SailthruClientError('ConnectTimeoutError: timed out')
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({'blasts': [], 'filtered_count': 0}).encode('utf-8')
+        return SailthruResponse(response)
+
+
+@attr('unittest')
+class TestRequestProfiler(TestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.95), 95)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([7], 0.99), 7)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_histogram_percentiles_are_close_and_memory_bounded(self):
+        rng = random.Random(7)
+        latencies = [rng.lognormvariate(-1, 1) for _ in range(100000)]
+        histogram = LatencyHistogram()
+        for seconds in latencies:
+            histogram.add(seconds)
+        latencies.sort()
+        for fraction in (0.5, 0.95, 0.99):
+            exact = percentile(latencies, fraction)
+            self.assertAlmostEqual(histogram.percentile(fraction) / exact, 1, delta=0.01)
+        self.assertEqual(histogram.max, latencies[-1])
+        self.assertAlmostEqual(histogram.total, sum(latencies))
+        # one bucket per 1% step in the range seen, not one entry per request
+        self.assertLess(len(histogram), 2000)
+
+    def test_report_and_outliers(self):
+        profiler = RequestProfiler(outlier_factor=5, min_outlier_seconds=1, max_outliers=3)
+        for i in range(100):
+            profiler.record('get', 'stats', 0.5, {'blast_id': i}, bytes_received=1000, decode_seconds=0.001)
+        profiler.record('GET', 'stats', 30.0, {'blast_id': 'slow'}, bytes_received=1000)
+        profiler.record('GET', 'stats', 2.0, {'blast_id': 'slowish'})
+        profiler.record('POST', 'user', 0.1, {'id': 'a'}, bytes_sent=20, error=True)
+
+        report = profiler.report()
+        self.assertEqual(sorted(report), ['GET stats', 'POST user'])
+        stats = report['GET stats']
+        self.assertEqual(stats['requests'], 102)
+        self.assertEqual(stats['seconds']['p50'], 0.5)
+        self.assertEqual(stats['seconds']['max'], 30.0)
+        self.assertEqual(stats['bytes_received'], 101000)
+        self.assertAlmostEqual(stats['decode_seconds'], 0.1)
+        # 2.0s is slower than usual but under 5x the median
+        self.assertEqual(stats['outliers'], [{'seconds': 30.0, 'request': {'blast_id': 'slow'}}])
+        self.assertEqual(report['POST user']['errors'], 1)
+        self.assertIn("outlier 30.00s {\"blast_id\": \"slow\"}", profiler.format_report())
+
+    def test_client_records_requests_and_retries(self):
+        profiler = RequestProfiler()
+        sailthru_client = DiveSailthruClient('abc', 'def', transport=FlakyTransport(), profiler=profiler)
+        sailthru_client.api_get('blast', {'status': 'sent', 'start_date': '2020-01-01'})
+
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'profile.json')
+        profiler.dump(path)
+        with open(path) as f:
+            report = json.load(f)
+        blast = report['GET blast']
+        self.assertEqual((blast['requests'], blast['errors'], blast['retries']), (2, 1, 1))
+        self.assertEqual(blast['bytes_received'], len(b'{"blasts": [], "filtered_count": 0}'))
+        self.assertGreater(blast['bytes_sent'], 0)
+
+    def test_client_with_profiler_can_be_pickled(self):
+        profiler = RequestProfiler(max_outliers=3)
+        profiler.record('GET', 'blast', 0.5)
+        copy = pickle.loads(pickle.dumps(DiveSailthruClient('abc', 'def', profiler=profiler)))
+        self.assertEqual(copy.profiler.max_outliers, 3)
+        self.assertEqual(copy.profiler.report(), {})
+        copy.profiler.record('GET', 'blast', 0.5)
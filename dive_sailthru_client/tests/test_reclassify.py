@@ -0,0 +1,82 @@
+from __future__ import absolute_import
+from unittest import TestCase
+from dive_sailthru_client.reclassify import reclassify_archives
+from nose.plugins.attrib import attr
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+RULES = {
+    'email_types': [
+        {'type': 'promo', 'when': {'name': {'istartswith': 'promo:'}}},
+        {'type': 'newsletter', 'when': {'list': {'iequals': 'daily'}}},
+    ],
+    'default_email_type': 'other',
+}
+
+
+def _campaign(i):
+    name = 'Promo: sale %d' % i if i % 3 == 0 else 'Issue %d' % i
+    return {'blast_id': i, 'name': name, 'list': 'Daily', 'subject': 's', 'labels': [],
+            'dive_email_type': 'newsletter', 'dive_brand': None}
+
+
+@attr('unittest')
+class TestReclassifyArchives(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.lines = [json.dumps(_campaign(i), sort_keys=True).encode('utf-8') + b'\n' for i in range(30)]
+        self.plain_path = os.path.join(self.tmp_dir, 'campaigns.jsonl')
+        with open(self.plain_path, 'wb') as f:
+            f.writelines(self.lines)
+        self.gz_path = os.path.join(self.tmp_dir, 'campaigns-2019.jsonl.gz')
+        with gzip.open(self.gz_path, 'wb') as f:
+            f.writelines(self.lines)
+
+    def test_reclassify(self):
+        output_dir = os.path.join(self.tmp_dir, 'out')
+        # small batches, so each file is split across several tasks
+        report = reclassify_archives([self.plain_path, self.gz_path], output_dir, rules=RULES, processes=2,
+                                     batch_lines=4)
+        self.assertEqual(report, {
+            'campaigns': 60, 'email_type_changed': 20, 'publication_changed': 0,
+            'transitions': {('newsletter', 'promo'): 20},
+        })
+        with open(os.path.join(output_dir, 'campaigns.jsonl'), 'rb') as f:
+            plain_lines = f.readlines()
+        with gzip.open(os.path.join(output_dir, 'campaigns-2019.jsonl.gz'), 'rb') as f:
+            gz_lines = f.readlines()
+        self.assertEqual(plain_lines, gz_lines)
+        self.assertEqual(sorted(os.listdir(output_dir)), ['campaigns-2019.jsonl.gz', 'campaigns.jsonl'])
+        for i, line in enumerate(plain_lines):
+            if i % 3:
+                # unchanged campaigns are copied as they were
+                self.assertEqual(line, self.lines[i])
+            else:
+                self.assertEqual(json.loads(line), dict(_campaign(i), dive_email_type='promo'))
+
+    def test_failure_leaves_no_partial_output(self):
+        with open(self.plain_path, 'ab') as f:
+            f.write(b'{"blast_id": 31, "name": \n')
+        output_dir = os.path.join(self.tmp_dir, 'out')
+        with self.assertRaises(ValueError):
+            reclassify_archives([self.gz_path, self.plain_path], output_dir, rules=RULES, processes=2, batch_lines=4)
+        self.assertEqual(os.listdir(output_dir), [])
+
+    def test_refuses_to_overwrite_input(self):
+        with self.assertRaises(ValueError):
+            reclassify_archives([self.plain_path], self.tmp_dir, rules=RULES, processes=1)
+
+    def test_refuses_inputs_with_the_same_name(self):
+        other_dir = os.path.join(self.tmp_dir, '2020')
+        os.makedirs(other_dir)
+        shutil.copy(self.plain_path, other_dir)
+        output_dir = os.path.join(self.tmp_dir, 'out')
+        with self.assertRaises(ValueError):
+            reclassify_archives([self.plain_path, os.path.join(other_dir, 'campaigns.jsonl')], output_dir,
+                                rules=RULES, processes=1)
+        self.assertFalse(os.path.exists(output_dir))
@@ -0,0 +1,81 @@
+from __future__ import absolute_import
+from unittest import TestCase
+from dive_sailthru_client.client import DiveSailthruClient
+from dive_sailthru_client.timeseries import ClickTimeSeries, StatsTable, DEVICE_COLUMNS
+from mock import patch, MagicMock
+from nose.plugins.attrib import attr
+
+
+@attr('unittest')
+class TestClickTimeSeries(TestCase):
+
+    def setUp(self):
+        self.click_times = {'1438889400': 3, '1438889100': 58, '1438890000': 1, '1438889700': 1}
+
+    def test_from_click_times_sorts_numerically(self):
+        series = ClickTimeSeries.from_click_times(self.click_times)
+        self.assertEqual(list(series.times), [1438889100, 1438889400, 1438889700, 1438890000])
+        self.assertEqual(list(series.counts), [58, 3, 1, 1])
+        self.assertEqual(series.total(), 63)
+        self.assertEqual(series.to_dict(), self.click_times)
+        self.assertEqual(len(ClickTimeSeries.from_click_times(None)), 0)
+
+    def test_resample(self):
+        series = ClickTimeSeries.from_click_times(self.click_times)
+        # 1438887600 is an hour boundary, and all our clicks fall in that hour
+        self.assertEqual(list(series.resample(3600)), [(1438887600, 63)])
+        self.assertEqual(list(series.resample(600)), [(1438888800, 58), (1438889400, 4), (1438890000, 1)])
+        self.assertEqual(list(series.resample(600, origin=300)), [(1438889100, 61), (1438889700, 2)])
+
+    def test_merge_and_shift(self):
+        first = ClickTimeSeries([100, 200], [1, 2])
+        second = ClickTimeSeries([150, 200, 300], [5, 5, 5])
+        merged = ClickTimeSeries.merge([first, second])
+        self.assertEqual(list(merged), [(100, 1), (150, 5), (200, 7), (300, 5)])
+        self.assertEqual(list(merged.shift(-100).times), [0, 50, 100, 200])
+
+
+@attr('unittest')
+class TestStatsTable(TestCase):
+
+    def setUp(self):
+        self.device = {
+            'Android': {'beacon': 93, 'click': 0, 'confirmed_opens': 93, 'count': 93, 'estopens': 93, 'open_total': 131},
+            'Android Tablet': {'beacon': 3, 'click': 1, 'count': 3, 'open_total': 4, 'new_counter': 7},
+        }
+
+    def test_from_breakdown(self):
+        table = StatsTable.from_breakdown(self.device, DEVICE_COLUMNS)
+        self.assertEqual(table.columns, DEVICE_COLUMNS + ('new_counter',))
+        self.assertEqual(table.keys, ['Android', 'Android Tablet'])
+        self.assertEqual(list(table.column('open_total')), [131, 4])
+        self.assertEqual(table.row('Android Tablet')['estopens'], 0)
+        self.assertEqual(table.totals()['beacon'], 96)
+
+    def test_merge(self):
+        table = StatsTable.from_breakdown(self.device, DEVICE_COLUMNS)
+        other = StatsTable.from_breakdown({'Android': {'click': 5}, 'iPhone': {'click': 2}}, ('click',))
+        merged = StatsTable.merge([table, other])
+        self.assertEqual(merged.keys, ['Android', 'Android Tablet', 'iPhone'])
+        self.assertEqual(merged.row('Android')['click'], 5)
+        self.assertEqual(merged.row('iPhone')['open_total'], 0)
+        self.assertEqual(merged.columns, table.columns)
+        self.assertEqual(merged.to_dict(), {
+            'Android': dict(self.device['Android'], click=5, new_counter=0),
+            'Android Tablet': dict((column, self.device['Android Tablet'].get(column, 0)) for column in table.columns),
+            'iPhone': dict((column, 2 if column == 'click' else 0) for column in table.columns),
+        })
+        self.assertEqual(len(StatsTable.merge([])), 0)
+
+    def test_get_campaign_stats_compact(self):
+        sailthru_client = DiveSailthruClient('abc', 'def')
+        response = MagicMock()
+        response.json = {'count': 10, 'click_times': {'100': 1}, 'device': self.device,
+                         'urls': {'http://a.com': {'click': 1, 'click_total': 2, 'count': 10}}}
+        with patch.object(sailthru_client, 'stats_blast', return_value=response):
+            stats = sailthru_client.get_campaign_stats(1, include_click_times=True, include_device=True,
+                                                       include_urls=True, compact=True)
+        self.assertEqual(stats['count'], 10)
+        self.assertEqual(stats['click_times'], ClickTimeSeries([100], [1]))
+        self.assertEqual(stats['device'].row('Android')['open_total'], 131)
+        self.assertEqual(list(stats['urls'].column('click_total')), [2])
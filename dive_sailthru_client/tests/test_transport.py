@@ -0,0 +1,90 @@
+from __future__ import absolute_import
+from unittest import TestCase
+from dive_sailthru_client.client import DiveSailthruClient
+from dive_sailthru_client.errors import SailthruApiError
+from dive_sailthru_client.transport import RecordingTransport, ReplayTransport
+from sailthru.sailthru_error import SailthruClientError
+from sailthru.sailthru_response import SailthruResponse
+from mock import patch
+from nose.plugins.attrib import attr
+import gzip
+import json
+import os
+import requests
+import shutil
+import tempfile
+
+
+class FakeSailthru(object):
+    """ Transport answering 'stats' requests; blast_id 0 is a connection error, 404 an API error """
+
+    def __init__(self):
+        self.requests = 0
+
+    def request(self, url, data, method, file_data=None, headers=None, request_timeout=10):
+        self.requests += 1
+        blast_id = json.loads(data['json'])['blast_id']
+        if blast_id == 0:
+            raise SailthruClientError('ConnectionError: nope')
+        response = requests.Response()
+        response.status_code = 200
+        response.headers['X-Rate-Limit-Remaining'] = '99'
+        if blast_id == 404:
+            response._content = json.dumps({'error': 99, 'errormsg': 'Blast not found'}).encode('utf-8')
+        else:
+            response._content = json.dumps({'blast_id': blast_id, 'count': self.requests}).encode('utf-8')
+        return SailthruResponse(response)
+
+
+@attr('unittest')
+class TestRecordReplay(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cassette = os.path.join(self.tmp_dir, 'cassette.jsonl.gz')
+        fake = FakeSailthru()
+        with RecordingTransport(fake, self.cassette) as transport:
+            sailthru_client = DiveSailthruClient('abc', 'def', transport=transport)
+            self.recorded = [sailthru_client.get_campaign_stats(1), sailthru_client.get_campaign_stats(1),
+                             sailthru_client.get_campaign_stats(2)]
+            with self.assertRaises(SailthruApiError):
+                sailthru_client.get_campaign_stats(404)
+            with self.assertRaises(SailthruClientError):
+                sailthru_client.get_campaign_stats(0)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_cassette_has_no_credentials(self):
+        with gzip.open(self.cassette, 'rt') as f:
+            contents = f.read()
+        entries = [json.loads(line) for line in contents.splitlines()]
+        self.assertEqual(len(entries), 5)
+        self.assertNotIn('abc', contents)
+        self.assertEqual(entries[0]['method'], 'GET')
+        self.assertEqual(entries[0]['url'], 'https://api.sailthru.com/stats')
+        self.assertEqual(entries[0]['params'], {'blast_id': 1, 'stat': 'blast'})
+
+    def test_replay(self):
+        # different credentials still match, since requests are keyed on their parameters only
+        sailthru_client = DiveSailthruClient('other', 'creds', transport=ReplayTransport(self.cassette))
+        replayed = [sailthru_client.get_campaign_stats(1), sailthru_client.get_campaign_stats(1),
+                    sailthru_client.get_campaign_stats(2)]
+        self.assertEqual(replayed, self.recorded)
+        # repeated requests past what was recorded get the last recorded response
+        self.assertEqual(sailthru_client.get_campaign_stats(1), self.recorded[1])
+        self.assertEqual(sailthru_client.get_last_rate_limit_info('stats', 'GET'), None)
+        with self.assertRaises(SailthruApiError):
+            sailthru_client.get_campaign_stats(404)
+        with self.assertRaises(SailthruClientError):
+            sailthru_client.get_campaign_stats(0)
+        with self.assertRaises(SailthruClientError):
+            sailthru_client.get_campaign_stats(3)  # never recorded
+
+    def test_realtime_replay_sleeps_for_recorded_duration(self):
+        transport = ReplayTransport(self.cassette, realtime=True, speed=2.0)
+        sailthru_client = DiveSailthruClient('abc', 'def', transport=transport)
+        with patch('dive_sailthru_client.transport.time.sleep') as sleep:
+            sailthru_client.get_campaign_stats(2)
+        self.assertEqual(sleep.call_count, 1)
+        self.assertGreaterEqual(sleep.call_args[0][0], 0)
@@ -0,0 +1,100 @@
+from __future__ import absolute_import
+from unittest import TestCase, skipUnless
+from concurrent.futures import ThreadPoolExecutor
+from dive_sailthru_client.client import DiveSailthruClient
+from dive_sailthru_client.workers import ClientFactory
+from mock import MagicMock
+from nose.plugins.attrib import attr
+import json
+import multiprocessing
+import os
+import pickle
+import threading
+
+
+class FakeTransport(object):
+    """ Answers 'stats' requests with the requested blast_id, waiting until several threads are in flight """
+
+    def __init__(self, concurrent_requests):
+        self.barrier = threading.Barrier(concurrent_requests, timeout=5)
+
+    def request(self, url, data, method, file_data=None, headers=None, request_timeout=10):
+        blast_id = json.loads(data['json'])['blast_id']
+        self.barrier.wait()  # proves the requests really overlap
+        response = MagicMock()
+        response.json = {'blast_id': blast_id, 'count': blast_id * 10}
+        response.is_ok.return_value = True
+        response.get_rate_limit_headers.return_value = {'limit': 100, 'remaining': 99, 'reset': 0}
+        return response
+
+
+# Set before forking so the child inherits the client itself rather than a pickled copy
+_inherited_client = None
+
+
+def _child_transport_state():
+    transport = _inherited_client.transport
+    return os.getpid(), transport.session_pid
+
+
+@attr('unittest')
+class TestSharedClient(TestCase):
+
+    def test_one_client_serves_many_threads(self):
+        sailthru_client = DiveSailthruClient('abc', 'def', transport=FakeTransport(8))
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(sailthru_client.get_campaign_stats, range(1, 65)))
+        self.assertEqual([r['blast_id'] for r in results], list(range(1, 65)))
+        self.assertEqual([r['count'] for r in results], [i * 10 for i in range(1, 65)])
+        self.assertEqual(sailthru_client.get_last_rate_limit_info('stats', 'GET')['remaining'], 99)
+
+    @skipUnless(hasattr(os, 'fork'), 'requires fork')
+    def test_forked_process_rebuilds_connection_pool(self):
+        global _inherited_client
+        sailthru_client = _inherited_client = DiveSailthruClient('abc', 'def')
+        parent_session = sailthru_client.transport.session
+        pool = multiprocessing.get_context('fork').Pool(1)
+        try:
+            child_pid, session_pid = pool.apply(_child_transport_state)
+        finally:
+            pool.close()
+            pool.join()
+            _inherited_client = None
+        self.assertNotEqual(child_pid, os.getpid())
+        # the child built its own session...
+        self.assertEqual(session_pid, child_pid)
+        # ...and the parent's is untouched
+        self.assertIs(sailthru_client.transport.session, parent_session)
+        self.assertEqual(sailthru_client.transport.session_pid, os.getpid())
+
+    def test_client_can_be_pickled(self):
+        sailthru_client = DiveSailthruClient('abc', 'def', request_timeout=5)
+        copy = pickle.loads(pickle.dumps(sailthru_client))
+        self.assertEqual((copy.api_key, copy.secret, copy.request_timeout), ('abc', 'def', 5))
+        self.assertIsNot(copy.transport.session, sailthru_client.transport.session)
+
+
+@attr('unittest')
+class TestClientFactory(TestCase):
+
+    def test_one_client_per_process_by_default(self):
+        factory = ClientFactory('abc', 'def', request_timeout=5)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            clients = list(executor.map(lambda _: factory.get(), range(8)))
+        self.assertEqual(len(set(id(c) for c in clients)), 1)
+        self.assertEqual(clients[0].request_timeout, 5)
+
+    def test_per_thread_clients(self):
+        factory = ClientFactory('abc', 'def', per_thread=True)
+        clients = []
+        threads = [threading.Thread(target=lambda: clients.append(factory())) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(id(c) for c in clients)), 3)
+
+    def test_factory_can_be_pickled(self):
+        factory = pickle.loads(pickle.dumps(ClientFactory('abc', 'def', per_thread=True, request_timeout=5)))
+        self.assertEqual(factory.get().request_timeout, 5)
+        self.assertTrue(factory.per_thread)
@@ -0,0 +1,235 @@
+from __future__ import absolute_import
+from array import array
+import heapq
+import itertools
+
+# Columns we expect in the stats API's per-device and per-url breakdowns. Any other
+# counters Sailthru sends are kept as extra columns after these.
+DEVICE_COLUMNS = ('beacon', 'click', 'confirmed_opens', 'count', 'estopens', 'open_total')
+URL_COLUMNS = ('click', 'click_total', 'count')
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("numpy is required for to_numpy(); install it with 'pip install numpy'")
+    return numpy
+
+
+class ClickTimeSeries(object):
+    """
+    Compact click_times series: two parallel arrays of epoch seconds (sorted ascending) and
+    click counts, instead of the stats API's dict of epoch strings to counts.
+
+        series = ClickTimeSeries.from_click_times(stats['click_times'])
+        hourly = series.resample(3600)
+        everything = ClickTimeSeries.merge(all_series)
+    """
+    __slots__ = ('times', 'counts')
+
+    def __init__(self, times=(), counts=()):
+        """
+        :param times: epoch seconds, sorted ascending and unique
+        :param counts: clicks for each time
+        """
+        self.times = array('q', times)
+        self.counts = array('q', counts)
+        if len(self.times) != len(self.counts):
+            raise ValueError("times and counts must be the same length")
+
+    @classmethod
+    def from_click_times(cls, click_times):
+        """
+        :param dict click_times: the stats API's click_times, e.g. {'1438889100': 58, '1438889400': 3}
+        :rtype: ClickTimeSeries
+        """
+        pairs = sorted((int(epoch), int(count)) for epoch, count in (click_times or {}).items())
+        return cls((epoch for epoch, _ in pairs), (count for _, count in pairs))
+
+    def __len__(self):
+        return len(self.times)
+
+    def __iter__(self):
+        """ Iterate over (epoch, count) pairs """
+        return zip(self.times, self.counts)
+
+    def __eq__(self, other):
+        return isinstance(other, ClickTimeSeries) and self.times == other.times and self.counts == other.counts
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'ClickTimeSeries(%d points, %d clicks)' % (len(self), self.total())
+
+    def total(self):
+        return sum(self.counts)
+
+    def to_dict(self):
+        """ :return: the stats API's click_times format """
+        return dict((str(epoch), count) for epoch, count in self)
+
+    def to_numpy(self):
+        """
+        :return: (times, counts) as int64 numpy arrays (requires numpy)
+        """
+        numpy = _numpy()
+        return numpy.frombuffer(self.times, dtype=numpy.int64), numpy.frombuffer(self.counts, dtype=numpy.int64)
+
+    def shift(self, seconds):
+        """
+        :return: a new series with every time moved by seconds, e.g. shift(-send_epoch)
+            to get clicks by seconds since the send for click-decay analysis.
+        :rtype: ClickTimeSeries
+        """
+        return ClickTimeSeries((epoch + seconds for epoch in self.times), self.counts)
+
+    def resample(self, bucket_seconds, origin=0):
+        """
+        Sum counts into fixed-size buckets.
+
+        :param bucket_seconds: bucket width, e.g. 3600 for hourly
+        :param origin: epoch that bucket boundaries are aligned to
+        :return: new series where each time is the start of its bucket
+        :rtype: ClickTimeSeries
+        """
+        times = array('q')
+        counts = array('q')
+        for epoch, count in self:
+            bucket = epoch - (epoch - origin) % bucket_seconds
+            if times and times[-1] == bucket:
+                counts[-1] += count
+            else:
+                times.append(bucket)
+                counts.append(count)
+        return ClickTimeSeries(times, counts)
+
+    @classmethod
+    def merge(cls, series_list):
+        """
+        Sum several series (e.g. one per campaign) into one.
+
+        :rtype: ClickTimeSeries
+        """
+        times = array('q')
+        counts = array('q')
+        for epoch, count in heapq.merge(*series_list):
+            if times and times[-1] == epoch:
+                counts[-1] += count
+            else:
+                times.append(epoch)
+                counts.append(count)
+        return cls(times, counts)
+
+
+class StatsTable(object):
+    """
+    Fixed-schema table for the stats API's nested breakdowns ('device', 'urls'): one row
+    per key (device name or url), one int array per counter column.
+
+        table = StatsTable.from_breakdown(stats['device'], DEVICE_COLUMNS)
+        table.column('open_total')  # array of open_total for every device, in table.keys order
+        table.row('Android')        # {'beacon': 93, 'click': 0, ...}
+    """
+    __slots__ = ('columns', 'keys', '_column_data', '_row_index')
+
+    def __init__(self, columns, keys, column_data):
+        """
+        :param columns: column names
+        :param keys: row keys
+        :param column_data: one sequence of ints per column, each as long as keys
+        """
+        self.columns = tuple(columns)
+        self.keys = list(keys)
+        self._column_data = [array('q', values) for values in column_data]
+        self._row_index = dict((key, i) for i, key in enumerate(self.keys))
+
+    @classmethod
+    def from_breakdown(cls, breakdown, columns=()):
+        """
+        :param dict breakdown: e.g. {'Android': {'beacon': 93, 'click': 0, ...}, ...}
+        :param columns: expected columns; counters not listed are added as extra columns and
+            missing ones are stored as 0
+        :rtype: StatsTable
+        """
+        breakdown = breakdown or {}
+        extra_columns = set(itertools.chain.from_iterable(breakdown.values())) - set(columns)
+        columns = tuple(columns) + tuple(sorted(extra_columns))
+        keys = sorted(breakdown)
+        column_data = [[int(breakdown[key].get(column, 0)) for key in keys] for column in columns]
+        return cls(columns, keys, column_data)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self._row_index
+
+    def __repr__(self):
+        return 'StatsTable(%d rows x %d columns)' % (len(self.keys), len(self.columns))
+
+    def column(self, name):
+        """ :rtype: array """
+        return self._column_data[self.columns.index(name)]
+
+    def row(self, key):
+        """ :rtype: dict """
+        i = self._row_index[key]
+        return dict((column, values[i]) for column, values in zip(self.columns, self._column_data))
+
+    def totals(self):
+        """ :return: each column summed over all rows """
+        return dict((column, sum(values)) for column, values in zip(self.columns, self._column_data))
+
+    def to_dict(self):
+        """ :return: the stats API's nested dict format """
+        return dict((key, self.row(key)) for key in self.keys)
+
+    def to_numpy(self):
+        """
+        :return: 2d int64 numpy array, one row per key and one column per column (requires numpy)
+        """
+        numpy = _numpy()
+        return numpy.array([numpy.frombuffer(values, dtype=numpy.int64) for values in self._column_data]).T
+
+    @classmethod
+    def merge(cls, tables):
+        """
+        Sum several tables (e.g. one per campaign) into one, matching rows by key and
+        columns by name. Works column by column on the int arrays; rows are never built.
+
+        :rtype: StatsTable
+        """
+        tables = list(tables)
+        columns = []
+        column_index = {}
+        for table in tables:
+            for column in table.columns:
+                if column not in column_index:
+                    column_index[column] = len(columns)
+                    columns.append(column)
+        keys = sorted(set(itertools.chain.from_iterable(table.keys for table in tables)))
+        key_index = dict((key, i) for i, key in enumerate(keys))
+        column_data = [array('q', [0]) * len(keys) for _ in columns]
+        for table in tables:
+            positions = [key_index[key] for key in table.keys]
+            for column, values in zip(table.columns, table._column_data):
+                totals = column_data[column_index[column]]
+                for position, value in zip(positions, values):
+                    totals[position] += value
+        return cls(columns, keys, column_data)
+
+
+def compact_campaign_stats(stats):
+    """
+    Replace the click_times, device and urls sections of a get_campaign_stats result (when
+    present) with ClickTimeSeries / StatsTable objects. Modifies and returns stats.
+    """
+    if 'click_times' in stats:
+        stats['click_times'] = ClickTimeSeries.from_click_times(stats['click_times'])
+    if 'device' in stats:
+        stats['device'] = StatsTable.from_breakdown(stats['device'], DEVICE_COLUMNS)
+    if 'urls' in stats:
+        stats['urls'] = StatsTable.from_breakdown(stats['urls'], URL_COLUMNS)
+    return stats
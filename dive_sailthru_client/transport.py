@@ -0,0 +1,205 @@
+from __future__ import absolute_import
+import base64
+import collections
+import gzip
+import json
+import os
+import platform
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from sailthru.sailthru_error import SailthruClientError
+from sailthru.sailthru_http import flatten_nested_hash
+from sailthru.sailthru_response import SailthruResponse
+from .workers import register_after_fork
+
+
+def _sailthru_response(http_response):
+    """ Wrap (and JSON decode) a requests response, noting how long decoding took as decode_seconds """
+    start = time.perf_counter()
+    response = SailthruResponse(http_response)
+    response.decode_seconds = time.perf_counter() - start
+    return response
+
+
+class HttpTransport(object):
+    """
+    Sends Sailthru API requests over a pooled requests.Session.
+
+    The stock sailthru client calls requests.request() for every API call, which opens
+    a new connection (and TLS handshake) each time. This keeps connections alive and
+    lets up to pool_maxsize requests run concurrently, which matters for the bulk and
+    concurrent helpers on DiveSailthruClient.
+
+    A transport is safe to share between threads: requests' connection pool hands each
+    concurrent request its own connection, and we never touch session state (cookies,
+    default headers) after building it. It is also fork-safe: pooled sockets would be
+    shared with the parent process after a fork, so the child builds a new session.
+    """
+
+    def __init__(self, pool_maxsize=10):
+        self.pool_maxsize = pool_maxsize
+        self._reset()
+        register_after_fork(self)
+
+    def _reset(self):
+        self.session = self._build_session()
+        self.session_pid = os.getpid()
+
+    def _after_fork(self):
+        self._reset()
+
+    def __getstate__(self):
+        # Sessions hold sockets and locks, so send only our settings to other processes
+        return {'pool_maxsize': self.pool_maxsize}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _build_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def request(self, url, data, method, file_data=None, headers=None, request_timeout=10):
+        """
+        Perform an HTTP GET / POST / DELETE request. Mirrors sailthru_http.sailthru_http_request.
+
+        :return: the response
+        :rtype: SailthruResponse
+        """
+        data = flatten_nested_hash(data)
+        method = method.upper()
+        params, data = (None, data) if method == 'POST' else (data, None)
+        request_headers = dict(headers) if headers and isinstance(headers, dict) else {}
+        request_headers['User-Agent'] = 'Sailthru API Python Client %s; Python Version: %s' % \
+            ('2.3.5', platform.python_version())
+        if self.session_pid != os.getpid():
+            # forked without os.register_at_fork support (python < 3.7)
+            self._reset()
+        try:
+            response = self.session.request(method, url, params=params, data=data, files=file_data,
+                                            headers=request_headers, timeout=request_timeout)
+        except requests.RequestException as e:
+            raise SailthruClientError(str(e))
+        return _sailthru_response(response)
+
+
+def _request_params(data):
+    """ A request's JSON parameters, without the api_key/sig wrapped around them """
+    try:
+        return json.loads(data.get('json', '{}'))
+    except ValueError:
+        return data.get('json')
+
+
+def _request_key(method, url, params):
+    return method.upper(), url, json.dumps(params, sort_keys=True)
+
+
+class RecordingTransport(object):
+    """
+    Wraps another transport and records every request/response pair (with how long the
+    request took) to a gzipped JSON lines cassette, for replay with ReplayTransport.
+
+        transport = RecordingTransport(HttpTransport(), 'blasts.jsonl.gz')
+        sailthru_client = DiveSailthruClient(api_key, secret, transport=transport)
+        sailthru_client.get_campaigns_in_range(start_date, end_date)
+        transport.close()
+
+    Only the request's JSON parameters are stored, never the api key or signature. Responses
+    are stored as received, so treat cassettes of user data as sensitive.
+    """
+
+    def __init__(self, transport, cassette_path):
+        self.transport = transport
+        self.cassette_path = cassette_path
+        self._file = gzip.open(cassette_path, 'wt', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def request(self, url, data, method, file_data=None, headers=None, request_timeout=10):
+        entry = {'method': method.upper(), 'url': url, 'params': _request_params(data)}
+        start = time.time()
+        try:
+            response = self.transport.request(url, data, method, file_data, headers, request_timeout)
+        except SailthruClientError as e:
+            entry.update(elapsed=time.time() - start, error=str(e))
+            self._write(entry)
+            raise
+        entry['elapsed'] = time.time() - start
+        http_response = response.get_response()
+        entry['status_code'] = http_response.status_code
+        entry['headers'] = dict(http_response.headers)
+        try:
+            entry['body'] = http_response.content.decode('utf-8')
+        except UnicodeDecodeError:
+            entry['body_base64'] = base64.b64encode(http_response.content).decode('ascii')
+        self._write(entry)
+        return response
+
+    def _write(self, entry):
+        line = json.dumps(entry) + '\n'
+        with self._lock:
+            self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ReplayTransport(object):
+    """
+    Answers requests from a cassette written by RecordingTransport, without any network.
+
+        transport = ReplayTransport('blasts.jsonl.gz', realtime=True)
+        sailthru_client = DiveSailthruClient('key', 'secret', transport=transport)
+        sailthru_client.get_campaigns_in_range(start_date, end_date)  # same responses, same timing
+
+    Requests are matched by method, url and JSON parameters. Identical requests recorded more
+    than once are replayed in recorded order, and the last one is repeated after that. By
+    default responses come back as fast as possible; realtime=True sleeps for each request's
+    recorded duration (divided by speed), for profiling with production-like latency.
+    Recorded connection errors are raised again as SailthruClientError.
+    """
+
+    def __init__(self, cassette_path, realtime=False, speed=1.0):
+        self.cassette_path = cassette_path
+        self.realtime = realtime
+        self.speed = speed
+        self._entries = {}
+        with gzip.open(cassette_path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                key = _request_key(entry['method'], entry['url'], entry['params'])
+                self._entries.setdefault(key, collections.deque()).append(entry)
+        self._lock = threading.Lock()
+
+    def request(self, url, data, method, file_data=None, headers=None, request_timeout=10):
+        key = _request_key(method, url, _request_params(data))
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise SailthruClientError("No recorded response in %s for request %s" % (self.cassette_path, ' '.join(key)))
+            entry = entries.popleft() if len(entries) > 1 else entries[0]
+        if self.realtime:
+            time.sleep(entry['elapsed'] / self.speed)
+        if 'error' in entry:
+            raise SailthruClientError(entry['error'])
+        response = requests.Response()
+        response.status_code = entry['status_code']
+        response.headers.update(entry['headers'])
+        response.url = url
+        if 'body_base64' in entry:
+            response._content = base64.b64decode(entry['body_base64'])
+        else:
+            response._content = entry['body'].encode('utf-8')
+        return _sailthru_response(response)
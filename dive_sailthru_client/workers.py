@@ -0,0 +1,103 @@
+from __future__ import absolute_import
+import os
+import threading
+import weakref
+
+# Objects holding per-process state (connection pools, locks, background threads) register
+# here and get their _after_fork() method called in the child right after a fork, before
+# any other code runs there.
+_fork_aware_objects = weakref.WeakSet()
+
+
+def register_after_fork(obj):
+    """
+    Have obj._after_fork() called in child processes after os.fork() (multiprocessing's
+    default start method on Linux, celery prefork workers, gunicorn, ...).
+    """
+    _fork_aware_objects.add(obj)
+
+
+def _reset_after_fork():
+    for obj in list(_fork_aware_objects):
+        obj._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class ClientFactory(object):
+    """
+    Hands out DiveSailthruClient instances to workers.
+
+    A single DiveSailthruClient is safe to share between threads, and forked processes
+    rebuild its connection pool automatically, so sharing one client is fine. This factory
+    is for worker pools that would rather build their client lazily, inside the worker:
+    by default each process gets its own client (created on first use), and with
+    per_thread=True each thread does.
+
+    Usage:
+        factory = ClientFactory(api_key, secret)
+
+        def work(blast_id):  # e.g. a celery task or a multiprocessing.Pool function
+            return factory.get().get_campaign_stats(blast_id)
+
+    The factory only holds credentials until get() is called, so it can be pickled and sent
+    to spawned processes.
+    """
+
+    def __init__(self, api_key, secret, per_thread=False, **client_kwargs):
+        """
+        :param per_thread: give every thread its own client instead of every process
+        :param client_kwargs: passed on to DiveSailthruClient (api_url, request_timeout, ...)
+        """
+        self.api_key = api_key
+        self.secret = secret
+        self.per_thread = per_thread
+        self.client_kwargs = client_kwargs
+        self._reset()
+        register_after_fork(self)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._process_client = None
+        self._process_client_pid = None
+
+    def _after_fork(self):
+        # Give the child its own clients, and a fresh lock in case a parent thread held it
+        # at fork time.
+        self._reset()
+
+    def __getstate__(self):
+        return {'api_key': self.api_key, 'secret': self.secret, 'per_thread': self.per_thread,
+                'client_kwargs': self.client_kwargs}
+
+    def __setstate__(self, state):
+        self.__init__(state['api_key'], state['secret'], per_thread=state['per_thread'], **state['client_kwargs'])
+
+    def create(self):
+        """ Build a new client, never shared """
+        # imported here so that importing this module does not load the HTTP stack
+        from .client import DiveSailthruClient
+        return DiveSailthruClient(self.api_key, self.secret, **self.client_kwargs)
+
+    def get(self):
+        """
+        :return: the client for the current process (or thread, if per_thread)
+        :rtype: DiveSailthruClient
+        """
+        if self.per_thread:
+            client = getattr(self._local, 'client', None)
+            if client is None:
+                client = self._local.client = self.create()
+            return client
+        pid = os.getpid()
+        if self._process_client is None or self._process_client_pid != pid:
+            with self._lock:
+                if self._process_client is None or self._process_client_pid != pid:
+                    self._process_client = self.create()
+                    self._process_client_pid = pid
+        return self._process_client
+
+    __call__ = get
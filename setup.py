@@ -16,6 +16,12 @@ setup(
         'six~=1.12'
         # Note that sailthru-client installs requests and simplejson
     ],
+    extras_require={
+        'parquet': ['pyarrow'],
+    },
+    entry_points={
+        'console_scripts': ['dive-sailthru = dive_sailthru_client.cli:main'],
+    },
     test_suite='nose.collector',
     tests_require=['nose', 'mock']
 )